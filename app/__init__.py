@@ -0,0 +1,11 @@
+# =========================
+# LOAD .env cho mọi entry point
+# =========================
+# Chạy trước mọi module trong app/ (cả `python -m app.recipe_stats`, `python -m
+# app.images`... không import main.py) => CLI dùng cùng DATABASE_URL với server.
+# Biến đã đặt sẵn trong môi trường vẫn được ưu tiên (load_dotenv không ghi đè).
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
@@ -0,0 +1,152 @@
+"""
+Static asset có fingerprint + nén sẵn.
+
+- Lúc startup (hoặc `python -m app.assets`): mỗi file css/js trong static/ được
+  băm nội dung, chép thành static/build/css/style.<hash>.css kèm bản .gz và .br.
+- /static/build/... do PrecompressedStaticFiles phục vụ: chọn .br / .gz theo
+  Accept-Encoding, Cache-Control immutable 1 năm (nội dung đổi => URL đổi).
+- Template dùng {{ asset_url('css/style.css') }}; file không có trong manifest
+  (hoặc ASSET_FINGERPRINT=0, mặc định khi APP_ENV=dev) => trả về
+  /static/css/style.css như cũ.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli không bắt buộc: khi thiếu chỉ có bản .gz
+    brotli = None
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+BUILD_DIR = STATIC_DIR / "build"
+ASSET_DIRS = ("css", "js")
+ASSET_EXTS = {".css", ".js", ".svg", ".json"}
+HASH_LEN = 12
+MIN_COMPRESS_SIZE = 512  # byte; file nhỏ hơn nén không đáng
+
+# APP_ENV=dev: mặc định tắt (build chỉ chạy lúc startup, sửa css/js phải thấy ngay)
+_DEV_MODE = os.getenv("APP_ENV", "production").lower() in ("dev", "development")  # = templating.DEV_MODE
+ASSET_FINGERPRINT = os.getenv("ASSET_FINGERPRINT", "0" if _DEV_MODE else "1") == "1"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+# "css/style.css" -> "css/style.3f2a9c1b7d4e.css"
+_manifest: dict[str, str] = {}
+
+
+def _compress(path: Path, data: bytes) -> None:
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+    # mtime=0 => cùng nội dung cho ra cùng file .gz
+    gz = path.with_name(path.name + ".gz")
+    if not gz.exists():
+        gz.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        br = path.with_name(path.name + ".br")
+        if not br.exists():
+            br.write_bytes(brotli.compress(data, quality=11))
+
+
+def build_assets() -> dict[str, str]:
+    """Tạo file fingerprint + .gz/.br, xóa bản build cũ. Trả về manifest."""
+    manifest: dict[str, str] = {}
+    keep: set[Path] = set()
+
+    for d in ASSET_DIRS:
+        root = STATIC_DIR / d
+        if not root.is_dir():
+            continue
+        for src in sorted(root.rglob("*")):
+            if not src.is_file() or src.suffix not in ASSET_EXTS:
+                continue
+            data = src.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+            rel = src.relative_to(STATIC_DIR).as_posix()
+            out_rel = f"{rel[: -len(src.suffix)]}.{digest}{src.suffix}"
+            out = BUILD_DIR / out_rel
+
+            if not out.exists():
+                out.parent.mkdir(parents=True, exist_ok=True)
+                tmp = out.with_name(out.name + ".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, out)
+            _compress(out, data)
+
+            manifest[rel] = out_rel
+            keep.update({out, out.with_name(out.name + ".gz"), out.with_name(out.name + ".br")})
+
+    # dọn file build của phiên bản cũ
+    if BUILD_DIR.is_dir():
+        for p in BUILD_DIR.rglob("*"):
+            if p.is_file() and p not in keep:
+                p.unlink(missing_ok=True)
+
+    _manifest.clear()
+    _manifest.update(manifest)
+    return manifest
+
+
+def asset_url(path: str) -> str:
+    """Jinja helper: 'css/style.css' -> '/static/build/css/style.<hash>.css'."""
+    path = path.lstrip("/")
+    if path.startswith("static/"):
+        path = path[len("static/"):]
+    built = _manifest.get(path) if ASSET_FINGERPRINT else None
+    return f"/static/build/{built}" if built else f"/static/{path}"
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """'gzip, deflate, br;q=0' -> {'gzip', 'deflate'} (bỏ các encoding q=0)."""
+    result = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            result.add(name.strip())
+    return result
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Phục vụ static/build: ưu tiên file .br / .gz có sẵn, cache immutable."""
+
+    async def get_response(self, path: str, scope) -> Response:
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accepted or path.endswith((".br", ".gz")):
+                continue
+            full_path, stat = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat is not None:
+                response = FileResponse(
+                    full_path,
+                    stat_result=stat,
+                    # media type theo file gốc (.css / .js), không theo .br
+                    media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+                    headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+                )
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE
+                return response
+
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+if __name__ == "__main__":
+    m = build_assets()
+    print(f"assets: {len(m)} file -> {BUILD_DIR} (brotli: {'có' if brotli else 'không'})")
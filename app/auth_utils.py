@@ -1,15 +1,105 @@
+"""
+Hash mật khẩu (pbkdf2_sha256).
+
+- Hash / verify tốn CPU => chạy trong process pool riêng (PASSWORD_HASH_WORKERS
+  process), không chiếm threadpool đang phục vụ request đọc recipe.
+- Hàng đợi có giới hạn: quá PASSWORD_HASH_MAX_PENDING việc đang chờ thì
+  HashPoolBusy (route trả 503) thay vì xếp hàng vô hạn.
+- Số vòng: PASSWORD_HASH_ROUNDS. Tăng số này thì hash cũ (ít vòng hơn) được
+  hash lại khi user đăng nhập đúng (verify_and_update).
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from passlib.context import CryptContext
 
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))  # mặc định của passlib
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(
+    os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 16))
+)
+
 # Dùng pbkdf2_sha256 thay cho bcrypt
 pwd_context = CryptContext(
     schemes=["pbkdf2_sha256"],
-    deprecated="auto"
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    # hash ít vòng hơn => needs_update() = True
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
 )
 
 
+class HashPoolBusy(Exception):
+    """Quá nhiều việc hash đang chờ."""
+
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str | None) -> tuple[bool, str | None]:
+    if not hashed_password:
+        # user không tồn tại: vẫn tốn đúng 1 lần hash => không đoán được email qua thời gian phản hồi
+        pwd_context.dummy_verify()
+        return False, None
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# =========================
+# PROCESS POOL
+# =========================
+_pool: ProcessPoolExecutor | None = None
+_pending = 0
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _pool
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HashPoolBusy()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str | None
+) -> tuple[bool, str | None]:
+    """
+    (đúng mật khẩu?, hash mới nếu hash cũ cần nâng cấp / None).
+    hashed_password=None (không có user) vẫn chạy 1 lần hash giả.
+    """
+    return await _run(_verify_and_update, plain_password, hashed_password)
+
+
+def hash_pool_stats() -> dict:
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "pending": _pending,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "rounds": PASSWORD_HASH_ROUNDS,
+    }
+
+
+def shutdown_hash_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
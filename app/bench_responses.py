@@ -0,0 +1,87 @@
+"""
+Benchmark encode JSON + kích thước trên đường truyền cho các endpoint list.
+
+    python -m app.bench_responses                 # dùng DATABASE_URL hiện tại
+    python -m app.bench_responses --repeat 200 --path /api/recipes/
+
+So sánh cho từng endpoint:
+  - encode: jsonable_encoder + json.dumps (mặc định cũ) vs orjson.dumps
+  - bytes: không nén / gzip / brotli (mức dùng trong CompressionMiddleware)
+  - thời gian cả request qua app (TestClient) với từng Accept-Encoding
+"""
+import argparse
+import gzip
+import json
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from .compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+
+DEFAULT_PATHS = [
+    "/api/recipes/",
+    "/default-recipes/",
+    "/api/shop/orders?limit=100",
+    "/api/shop/products",
+]
+
+
+def best_of(fn, repeat: int) -> float:
+    """Thời gian nhỏ nhất của 1 lần gọi (ms), ít nhiễu hơn trung bình."""
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def bench_path(client: TestClient, path: str, repeat: int) -> dict:
+    r = client.get(path, headers={"Accept-Encoding": "identity"})
+    r.raise_for_status()
+    data = r.json()
+
+    raw = orjson.dumps(data)
+    row = {
+        "path": path,
+        "items": len(data) if isinstance(data, list) else len(data.get("orders") or data.get("items") or []),
+        "stdlib_ms": best_of(lambda: json.dumps(jsonable_encoder(data)).encode(), repeat),
+        "orjson_ms": best_of(lambda: orjson.dumps(data), repeat),
+        "raw_bytes": len(raw),
+        "gzip_bytes": len(gzip.compress(raw, compresslevel=GZIP_LEVEL)),
+        "br_bytes": len(brotli.compress(raw, quality=BROTLI_QUALITY)) if brotli else None,
+    }
+    for enc in ("identity", "gzip", "br"):
+        if enc == "br" and brotli is None:
+            continue
+        row[f"req_{enc}_ms"] = best_of(
+            lambda: client.get(path, headers={"Accept-Encoding": enc}), max(1, repeat // 10)
+        )
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark JSON encode + nén cho các endpoint list")
+    parser.add_argument("--path", action="append", help="endpoint (lặp lại được); mặc định các list chính")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    from .main import app
+
+    with TestClient(app) as client:
+        rows = [bench_path(client, p, args.repeat) for p in (args.path or DEFAULT_PATHS)]
+
+    for row in rows:
+        print(f"\n{row['path']}  ({row['items']} item)")
+        print(f"  encode   stdlib {row['stdlib_ms']:8.3f} ms   orjson {row['orjson_ms']:8.3f} ms"
+              f"   x{row['stdlib_ms'] / max(row['orjson_ms'], 1e-9):.1f}")
+        br = f"{row['br_bytes']:>9}" if row["br_bytes"] is not None else "        -"
+        print(f"  bytes    raw {row['raw_bytes']:>9}   gzip {row['gzip_bytes']:>9}   br {br}")
+        reqs = "   ".join(f"{k[4:-3]} {v:7.2f} ms" for k, v in row.items() if k.startswith("req_"))
+        print(f"  request  {reqs}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Nén response theo Accept-Encoding (brotli nếu có, rồi gzip).
+
+- Chỉ nén kiểu nội dung dạng text (JSON, NDJSON, HTML, CSS, JS...) và khi body
+  >= COMPRESS_MIN_SIZE byte; ảnh / file đã nén thì bỏ qua.
+- Response đã có Content-Encoding (vd /static/build phục vụ .br sẵn) giữ nguyên.
+- Response 206 / có Content-Range (tải theo Range) giữ nguyên; ETag mạnh của
+  response được nén đổi thành ETag yếu (W/...) => route trả 304 phải so sánh
+  bằng etag_matches() (bỏ W/), không so chuỗi trực tiếp.
+- Response streaming (NDJSON đơn hàng) được nén theo từng chunk, có flush
+  để client nhận dần dữ liệu.
+"""
+import gzip
+import io
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .assets import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # không có brotli => chỉ gzip
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+# quality 4-5: gần bằng gzip 6 về tốc độ, nhỏ hơn rõ (11 chỉ dành cho nén sẵn)
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    If-None-Match có khớp ETag không, so sánh yếu (RFC 9110 13.1.2): bỏ W/ ở cả
+    2 phía => ETag bị middleware này đổi thành W/"..." vẫn được 304.
+    Hỗ trợ danh sách nhiều ETag cách nhau dấu phẩy và "*".
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = _opaque_tag(etag)
+    return any(_opaque_tag(t) == target for t in if_none_match.split(","))
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._buf = io.BytesIO()
+            self._gz = gzip.GzipFile(
+                mode="wb", fileobj=self._buf, compresslevel=GZIP_LEVEL, mtime=0
+            )
+
+    def _drain(self) -> bytes:
+        data = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate()
+        return data
+
+    def chunk(self, data: bytes) -> bytes:
+        """Nén 1 phần body và flush để client đọc được ngay."""
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        self._gz.write(data)
+        self._gz.flush(zlib.Z_SYNC_FLUSH)
+        return self._drain()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        self._gz.write(data)
+        self._gz.close()
+        return self._drain()
+
+
+class CompressionMiddleware:
+    """ASGI middleware thuần (không bọc BaseHTTPMiddleware => streaming vẫn chạy)."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: _Compressor | None = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or message["status"] in (204, 206, 304)
+                    # Range: Content-Range tính theo byte chưa nén => không được nén
+                    or "content-range" in headers
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # chờ chunk body đầu tiên để biết kích thước
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    # body nhỏ: nén không đáng
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # body đã khác bản gốc => ETag mạnh thành ETag yếu (304 vẫn khớp)
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    # streaming: không biết trước độ dài
+                    del headers["Content-Length"]
+                    await send(start_message)
+                    await send(
+                        {"type": "http.response.body", "body": compressor.chunk(body), "more_body": True}
+                    )
+                else:
+                    data = compressor.finish(body)
+                    headers["Content-Length"] = str(len(data))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": data})
+                return
+
+            if more_body:
+                await send(
+                    {"type": "http.response.body", "body": compressor.chunk(body), "more_body": True}
+                )
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, wrapped_send)
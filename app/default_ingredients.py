@@ -0,0 +1,90 @@
+# Dữ liệu dinh dưỡng nguyên liệu (trên 100g, giá trị tham khảo gần đúng)
+# Dùng để seed bảng ingredient_nutrients khi bảng còn trống.
+# default_grams: lượng dùng khi công thức không ghi số lượng
+# piece_grams: khối lượng 1 quả / củ / cây / miếng / tép...
+#
+# cột: name, aliases, default_grams, piece_grams,
+#      calories, protein, carbs, fat, fiber, sugar, sodium(mg)
+_ROWS = [
+    ("Cá hồi", "salmon", 150, 150, 208, 20.4, 0, 13.4, 0, 0, 59),
+    ("Cá", "cá basa, cá rô phi, cá lóc, phi lê cá", 150, 200, 110, 20, 0, 3, 0, 0, 60),
+    ("Cá thu", "", 150, 150, 205, 18.6, 0, 13.9, 0, 0, 90),
+    ("Thịt bò", "bò, thăn bò", 150, 100, 250, 26, 0, 15, 0, 0, 72),
+    ("Thịt heo", "thịt lợn, heo, lợn, thịt nạc", 150, 100, 242, 27, 0, 14, 0, 0, 62),
+    ("Thịt ba chỉ", "ba chỉ, ba rọi", 150, 100, 518, 9.3, 0, 53, 0, 0, 32),
+    ("Sườn heo", "sườn, sườn non", 200, 100, 277, 18, 0, 23, 0, 0, 81),
+    ("Thịt gà", "gà, đùi gà, cánh gà", 150, 200, 239, 27, 0, 14, 0, 0, 82),
+    ("Ức gà", "lườn gà", 150, 200, 165, 31, 0, 3.6, 0, 0, 74),
+    ("Tôm", "tôm sú, tôm thẻ", 150, 15, 99, 24, 0.2, 0.3, 0, 0, 111),
+    ("Mực", "mực ống", 150, 100, 92, 15.6, 3.1, 1.4, 0, 0, 44),
+    ("Trứng gà", "trứng, trứng vịt", 100, 50, 155, 13, 1.1, 11, 0, 1.1, 124),
+    ("Đậu hũ", "đậu phụ, tàu hũ, đậu hủ", 150, 150, 76, 8, 1.9, 4.8, 0.3, 0.6, 7),
+    ("Xúc xích", "lạp xưởng", 100, 50, 301, 12, 2, 27, 0, 1, 1000),
+    ("Gạo", "gạo tẻ, gạo lứt", 100, 100, 365, 7.1, 80, 0.7, 1.3, 0.1, 5),
+    ("Cơm", "cơm trắng", 200, 200, 130, 2.7, 28, 0.3, 0.4, 0.1, 1),
+    ("Bún", "bánh phở, phở, miến, hủ tiếu", 200, 200, 109, 1.7, 25, 0.2, 0.9, 0, 3),
+    ("Mì", "mì ý, pasta, nui", 200, 200, 158, 5.8, 31, 0.9, 1.8, 0.6, 1),
+    ("Mì gói", "mì tôm, mì ăn liền", 75, 75, 440, 9, 60, 18, 2, 2, 1200),
+    ("Bánh mì", "", 80, 80, 265, 9, 49, 3.2, 2.7, 5, 491),
+    ("Bột mì", "bột", 50, 50, 364, 10, 76, 1, 2.7, 0.3, 2),
+    ("Yến mạch", "oats", 50, 50, 389, 16.9, 66, 6.9, 10.6, 0, 2),
+    ("Khoai tây", "", 150, 150, 77, 2, 17, 0.1, 2.2, 0.8, 6),
+    ("Khoai lang", "", 200, 200, 86, 1.6, 20, 0.1, 3, 4.2, 55),
+    ("Cà chua", "", 100, 100, 18, 0.9, 3.9, 0.2, 1.2, 2.6, 5),
+    ("Cà tím", "", 150, 250, 25, 1, 6, 0.2, 3, 3.5, 2),
+    ("Cà rốt", "", 80, 80, 41, 0.9, 9.6, 0.2, 2.8, 4.7, 69),
+    ("Hành lá", "hành ngò", 10, 5, 32, 1.8, 7.3, 0.2, 2.6, 2.3, 16),
+    ("Hành tây", "", 75, 150, 40, 1.1, 9.3, 0.1, 1.7, 4.2, 4),
+    ("Hành tím", "hành khô, hành phi", 10, 10, 72, 2.5, 17, 0.1, 3.2, 7.9, 12),
+    ("Tỏi", "tỏi phi", 10, 5, 149, 6.4, 33, 0.5, 2.1, 1, 17),
+    ("Gừng", "", 5, 10, 80, 1.8, 18, 0.8, 2, 1.7, 13),
+    ("Sả", "", 10, 15, 99, 1.8, 25, 0.5, 0, 0, 6),
+    ("Ớt", "ớt sừng, ớt hiểm", 5, 5, 40, 1.9, 8.8, 0.4, 1.5, 5.3, 9),
+    ("Nấm", "nấm rơm, nấm kim châm, nấm hương, nấm đùi gà", 100, 20, 22, 3.1, 3.3, 0.3, 1, 2, 5),
+    ("Rau cải", "cải, cải xanh, cải ngọt, cải thìa", 150, 150, 13, 1.5, 2.2, 0.2, 1, 1.2, 65),
+    ("Rau muống", "", 200, 200, 19, 2.6, 3.1, 0.2, 2.1, 0, 113),
+    ("Bắp cải", "cải bắp", 150, 500, 25, 1.3, 5.8, 0.1, 2.5, 3.2, 18),
+    ("Dưa leo", "dưa chuột", 100, 150, 15, 0.7, 3.6, 0.1, 0.5, 1.7, 2),
+    ("Giá đỗ", "giá sống", 100, 100, 30, 3, 5.9, 0.2, 1.8, 4.1, 6),
+    ("Rau thơm", "rau mùi, ngò, húng quế, rau răm, thì là", 10, 5, 23, 2.1, 3.7, 0.5, 2.8, 0.9, 46),
+    ("Chanh", "nước cốt chanh", 15, 50, 29, 1.1, 9.3, 0.3, 2.8, 2.5, 2),
+    ("Me", "nước me", 20, 20, 239, 2.8, 62.5, 0.6, 5.1, 57, 28),
+    ("Chuối", "", 120, 120, 89, 1.1, 23, 0.3, 2.6, 12, 1),
+    ("Đậu phộng", "lạc", 20, 20, 567, 25.8, 16, 49, 8.5, 4.7, 18),
+    ("Nước mắm", "mắm", 15, 15, 35, 5.1, 3.6, 0, 0, 3.6, 7851),
+    ("Nước tương", "xì dầu, tương", 15, 15, 53, 8.1, 4.9, 0.6, 0.8, 0.4, 5493),
+    ("Dầu hào", "", 15, 15, 51, 1.4, 11, 0.3, 0.3, 0, 2733),
+    ("Dầu ăn", "dầu, dầu oliu, mỡ", 15, 15, 884, 0, 0, 100, 0, 0, 0),
+    ("Muối", "", 3, 3, 0, 0, 0, 0, 0, 0, 38758),
+    ("Đường", "đường trắng, đường phèn", 10, 10, 387, 0, 100, 0, 0, 100, 1),
+    ("Hạt nêm", "bột ngọt, bột nêm", 5, 5, 200, 10, 30, 2, 0, 10, 17000),
+    ("Tiêu", "hạt tiêu", 2, 2, 251, 10, 64, 3.3, 25, 0.6, 20),
+    ("Sữa tươi", "sữa", 200, 200, 61, 3.2, 4.8, 3.3, 0, 5.1, 43),
+    ("Sữa chua", "", 100, 100, 61, 3.5, 4.7, 3.3, 0, 4.7, 46),
+    # không dùng tên "Bơ": bỏ dấu thành "bo" trùng alias "bò" của Thịt bò
+    ("Bơ lạt", "bơ động vật, bơ thực vật, bơ nhạt, butter", 10, 10, 717, 0.9, 0.1, 81, 0, 0.1, 11),
+    ("Phô mai", "cheese", 30, 20, 402, 25, 1.3, 33, 0, 0.5, 621),
+]
+
+# tên cũ -> tên mới: DB đã seed trước khi đổi tên được cập nhật lúc startup
+RENAMED_INGREDIENTS = {"Bơ": "Bơ lạt"}
+
+default_ingredients = [
+    {
+        "name": name,
+        "aliases": aliases,
+        "default_grams": default_grams,
+        "piece_grams": piece_grams,
+        "calories": calories,
+        "protein": protein,
+        "carbs": carbs,
+        "fat": fat,
+        "fiber": fiber,
+        "sugar": sugar,
+        "sodium": sodium,
+    }
+    for (
+        name, aliases, default_grams, piece_grams,
+        calories, protein, carbs, fat, fiber, sugar, sodium,
+    ) in _ROWS
+]
@@ -1,20 +1,138 @@
-default_recipes = [
-    {
-        "id": 1,
-        "title": "Cá hồi",
-        "ingredients": "Cá hồi; Hành lá; Nước mắm; Dầu ăn",
-        "steps": "1. chiên cá...\n2. Phi hành...\n3. trọn cá và hành...",
-        "note": "Thời gian: 20 phút, độ khó: Dễ",
-        "category": "chiên",
-        "image": "/static/default/comchien.jpg",
-    },
-    {
-        "id": 2,
-        "title": "Lẩu thái",
-        "ingredients": "Tôm; Mực; Thịt bò; Nấm; Bún",
-        "steps": "1. Nấu nước...\n2. Trụng thịt...\n3. lấy bún...",
-        "note": "20 phút, dễ",
-        "category": "canh",
-        "image": "/static/default/raucai.jpg",
-    },
-]
+"""
+Công thức gợi ý (default recipes): đọc từ file dữ liệu, giữ trong bộ nhớ dạng
+đã index.
+
+- File: app/data/default_recipes.json (mảng JSON) hoặc .jsonl (mỗi dòng 1 món),
+  đổi bằng biến môi trường DEFAULT_RECIPES_FILE.
+- Mỗi lần nạp dựng 1 DefaultCatalog bất biến: map id, index category, index
+  token (đã bỏ dấu) => tra cứu không phụ thuộc số món.
+- Hot reload: get_catalog() kiểm tra mtime file (tối đa 1 lần / RELOAD_CHECK_SECONDS);
+  file đổi thì dựng catalog mới rồi thay cả object (atomic). File lỗi => giữ bản cũ.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from .recipe_search import fold_text, tokenize
+
+DATA_FILE = Path(
+    os.getenv(
+        "DEFAULT_RECIPES_FILE",
+        Path(__file__).resolve().parent / "data" / "default_recipes.json",
+    )
+)
+RELOAD_CHECK_SECONDS = float(os.getenv("DEFAULT_RECIPES_RELOAD_SECONDS", "2"))
+
+
+def load_file(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = json.load(f)
+    if not isinstance(rows, list):
+        raise ValueError("file công thức gợi ý phải là mảng JSON hoặc JSONL")
+    return rows
+
+
+class DefaultCatalog:
+    def __init__(self, recipes: list[dict], mtime: float = 0.0):
+        self.mtime = mtime
+        self.recipes: list[dict] = []
+        self.by_id: dict[int, dict] = {}
+        self.by_category: dict[str, list[int]] = {}
+        # token -> id (theo thứ tự catalog); vocab sắp xếp để tìm theo tiền tố
+        self.postings: dict[str, list[int]] = {}
+
+        for r in recipes:
+            rid = int(r["id"])
+            if rid in self.by_id:
+                raise ValueError(f"trùng id công thức gợi ý: {rid}")
+            self.recipes.append(r)
+            self.by_id[rid] = r
+            self.by_category.setdefault(fold_text(r.get("category")), []).append(rid)
+
+            for t in dict.fromkeys(tokenize(r.get("title")) + tokenize(r.get("ingredients"))):
+                self.postings.setdefault(t, []).append(rid)
+
+        self.vocab = sorted(self.postings)
+        self.position = {int(r["id"]): i for i, r in enumerate(self.recipes)}
+
+    def get(self, recipe_id: int) -> dict | None:
+        return self.by_id.get(recipe_id)
+
+    def get_many(self, ids) -> list[dict]:
+        return [self.by_id[i] for i in ids if i in self.by_id]
+
+    def _prefix_ids(self, prefix: str) -> set[int]:
+        ids: set[int] = set()
+        i = bisect.bisect_left(self.vocab, prefix)
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix):
+            ids.update(self.postings[self.vocab[i]])
+            i += 1
+        return ids
+
+    def search(self, q: str | None = None, category: str | None = None) -> list[dict]:
+        """
+        Mọi token của `q` (không dấu) phải là tiền tố của 1 từ trong title hoặc
+        ingredients ("ca ho" khớp "Cá hồi"), giống /api/recipes/search.
+        category so khớp không phân biệt hoa thường / dấu. Giữ thứ tự trong file.
+        """
+        ids: set[int] | None = None
+
+        if category:
+            ids = set(self.by_category.get(fold_text(category), ()))
+
+        for t in tokenize(q):
+            found = self._prefix_ids(t)
+            ids = found if ids is None else ids & found
+            if not ids:
+                return []
+
+        if ids is None:
+            return list(self.recipes)
+        return [self.by_id[i] for i in sorted(ids, key=self.position.__getitem__)]
+
+
+_catalog = DefaultCatalog([])
+_reload_lock = threading.Lock()
+_next_check = 0.0
+_failed_mtime: float | None = None  # file lỗi: không parse lại tới khi file đổi tiếp
+
+
+def reload_catalog(force: bool = False) -> DefaultCatalog:
+    """Nạp lại nếu file đổi (hoặc force). Lỗi đọc / parse => giữ catalog đang dùng."""
+    global _catalog, _failed_mtime
+
+    with _reload_lock:
+        try:
+            mtime = DATA_FILE.stat().st_mtime
+        except FileNotFoundError:
+            print(f"Không thấy file công thức gợi ý: {DATA_FILE}")
+            return _catalog
+
+        if not force and mtime in (_catalog.mtime, _failed_mtime):
+            return _catalog
+        try:
+            catalog = DefaultCatalog(load_file(DATA_FILE), mtime)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Lỗi nạp {DATA_FILE}, giữ dữ liệu cũ: {e}")
+            _failed_mtime = mtime
+            return _catalog
+
+        # request đang chạy vẫn giữ object cũ; request mới thấy object mới
+        _catalog = catalog
+        return catalog
+
+
+def get_catalog() -> DefaultCatalog:
+    global _next_check
+
+    now = time.monotonic()
+    if now >= _next_check:
+        _next_check = now + RELOAD_CHECK_SECONDS
+        return reload_catalog()
+    return _catalog
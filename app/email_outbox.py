@@ -0,0 +1,273 @@
+"""
+Email outbox: request chỉ ghi 1 dòng email_outbox (cùng transaction với review),
+worker nền gửi theo lô qua 1 kết nối SMTP dùng lại lâu dài.
+
+- Gửi lỗi: thử lại với backoff lũy thừa (MAIL_RETRY_BASE * 2^(attempts-1), tối đa
+  MAIL_RETRY_MAX giây); quá MAIL_MAX_ATTEMPTS lần => status "dead".
+- Không kết nối được SMTP: dừng cả lô ngay (không tính là lần gửi lỗi của email
+  nào), MAIL_CONNECT_RETRY giây sau mới thử kết nối lại.
+- Cấu hình (.env): MAIL_ENABLED, MAIL_HOST, MAIL_PORT, MAIL_USER, MAIL_PASS,
+  MAIL_FROM, MAIL_TO, MAIL_SSL (1 = SMTP_SSL như Gmail 465, 0 = SMTP thường,
+  MAIL_STARTTLS=1 để nâng cấp TLS).
+- Chạy thử với SMTP giả lập local, ví dụ aiosmtpd:
+    python -m aiosmtpd -n -l localhost:8025
+    MAIL_ENABLED=1 MAIL_SSL=0 MAIL_HOST=localhost MAIL_PORT=8025 MAIL_TO=a@b.c
+  (tests/test_email_outbox.py chạy drain / retry / dead với aiosmtpd như vậy)
+"""
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+
+def mail_enabled() -> bool:
+    return os.getenv("MAIL_ENABLED", "0") == "1"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# =========================
+# ENQUEUE (gọi trong request)
+# =========================
+def enqueue_email(db: Session | AsyncSession, *, mail_to: str, subject: str, body: str) -> models.EmailOutbox:
+    """Thêm email vào outbox. Không commit: caller commit cùng nghiệp vụ."""
+    item = models.EmailOutbox(
+        mail_to=mail_to,
+        subject=subject[:255],
+        body=body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=utcnow(),
+    )
+    db.add(item)
+    return item
+
+
+def enqueue_review_email(
+    db: Session | AsyncSession,
+    *,
+    recipe_title: str,
+    recipe_id: int,
+    rating: int,
+    reviewer_name: str,
+    comment: str,
+):
+    """Email thông báo review mới (bỏ qua nếu tắt mail / thiếu MAIL_TO)."""
+    if not mail_enabled():
+        return None
+
+    mail_to = os.getenv("MAIL_TO", "")
+    if not mail_to:
+        print("MAIL CONFIG MISSING: check MAIL_TO in .env")
+        return None
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    subject = f"[Yuki Meal Planner] Review mới: {recipe_title} ({rating}★)"
+    body = f"""Bạn vừa nhận được 1 đánh giá mới.
+
+Món: {recipe_title}
+Recipe ID: {recipe_id}
+Số sao: {rating}/5
+Người đánh giá: {reviewer_name}
+Nhận xét: {comment or "(không có)"}
+Thời gian: {now}
+"""
+    return enqueue_email(db, mail_to=mail_to, subject=subject, body=body)
+
+
+# =========================
+# SMTP: 1 kết nối dùng lại
+# =========================
+CONNECT_RETRY_SECONDS = float(os.getenv("MAIL_CONNECT_RETRY", "30"))
+
+
+class SMTPUnavailable(Exception):
+    """Không kết nối / đăng nhập được SMTP (lỗi chung, không phải lỗi của 1 email)."""
+
+
+class SMTPSender:
+    def __init__(self):
+        self.host = os.getenv("MAIL_HOST", "smtp.gmail.com")
+        self.port = int(os.getenv("MAIL_PORT", "465"))
+        self.user = os.getenv("MAIL_USER", "")
+        self.password = os.getenv("MAIL_PASS", "")
+        self.mail_from = os.getenv("MAIL_FROM", self.user) or "noreply@localhost"
+        self.use_ssl = os.getenv("MAIL_SSL", "1") == "1"
+        self.starttls = os.getenv("MAIL_STARTTLS", "0") == "1"
+        self.timeout = float(os.getenv("MAIL_TIMEOUT", "10"))
+        self._smtp: smtplib.SMTP | None = None
+        self._retry_at = 0.0  # time.monotonic(): trước mốc này không thử kết nối lại
+
+    def available(self) -> bool:
+        return self._smtp is not None or time.monotonic() >= self._retry_at
+
+    def _connect(self) -> smtplib.SMTP:
+        if time.monotonic() < self._retry_at:
+            raise SMTPUnavailable("SMTP đang lỗi, chờ thử kết nối lại")
+        try:
+            if self.use_ssl:
+                smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                if self.starttls:
+                    smtp.starttls()
+            if self.user and self.password:
+                smtp.login(self.user, self.password)
+        except (smtplib.SMTPException, OSError) as e:
+            self._retry_at = time.monotonic() + CONNECT_RETRY_SECONDS
+            raise SMTPUnavailable(str(e)) from e
+        return smtp
+
+    def send(self, item: models.EmailOutbox) -> None:
+        msg = EmailMessage()
+        msg["Subject"] = item.subject
+        msg["From"] = self.mail_from
+        msg["To"] = item.mail_to
+        msg.set_content(item.body)
+
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # kết nối cũ bị server đóng (idle timeout...): nối lại 1 lần rồi gửi lại.
+            # Lỗi của riêng email (SMTPRecipientsRefused, SMTPDataError...) không bắt
+            # ở đây: kết nối vẫn dùng tiếp, email đi vào nhánh retry / dead.
+            self.close()
+            self._smtp = self._connect()
+            self._smtp.send_message(msg)
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+# =========================
+# DRAIN
+# =========================
+MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "6"))
+RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE", "30"))
+RETRY_MAX_SECONDS = float(os.getenv("MAIL_RETRY_MAX", "3600"))
+BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * (2 ** (attempts - 1)), RETRY_MAX_SECONDS))
+
+
+def drain_outbox(db: Session, sender: SMTPSender, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Gửi 1 lô email đến hạn. Trả về số email đã xử lý (gửi được hoặc lỗi).
+    Postgres: FOR UPDATE SKIP LOCKED để nhiều worker không gửi trùng.
+    SMTP không kết nối được => dừng lô, phần còn lại giữ nguyên cho lần sau.
+    """
+    if not sender.available():
+        return 0
+
+    q = (
+        db.query(models.EmailOutbox)
+        .filter(
+            models.EmailOutbox.status == "pending",
+            models.EmailOutbox.next_attempt_at <= utcnow(),
+        )
+        .order_by(models.EmailOutbox.id.asc())
+        .limit(batch_size)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        q = q.with_for_update(skip_locked=True)
+
+    batch = q.all()
+    processed = 0
+    for item in batch:
+        try:
+            sender.send(item)
+        except SMTPUnavailable as e:
+            # lỗi kết nối chung: không thử tiếp từng email (mỗi lần chờ MAIL_TIMEOUT)
+            print("MAIL SMTP UNAVAILABLE, dừng lô:", e)
+            break
+        except Exception as e:
+            item.attempts = (item.attempts or 0) + 1
+            item.last_error = str(e)[:2000]
+            if item.attempts >= MAX_ATTEMPTS:
+                item.status = "dead"
+                print(f"MAIL DEAD #{item.id}:", e)
+            else:
+                item.next_attempt_at = utcnow() + retry_delay(item.attempts)
+                print(f"MAIL ERROR #{item.id} (lần {item.attempts}):", e)
+        else:
+            item.status = "sent"
+            item.sent_at = utcnow()
+            item.last_error = None
+        processed += 1
+
+    # commit 1 lần cho cả lô (giữ lock SKIP LOCKED đến khi xử lý xong)
+    db.commit()
+    return processed
+
+
+# =========================
+# WORKER NỀN
+# =========================
+class OutboxWorker:
+    """Thread nền: drain outbox mỗi `interval` giây, hoặc ngay khi được notify()."""
+
+    def __init__(self, interval: float | None = None):
+        self.interval = interval if interval is not None else float(os.getenv("MAIL_POLL_INTERVAL", "5"))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        sender = SMTPSender()
+        try:
+            while not self._stop.is_set():
+                db = SessionLocal()
+                try:
+                    # còn đầy lô thì drain tiếp, không chờ
+                    while not self._stop.is_set() and drain_outbox(db, sender) >= BATCH_SIZE:
+                        pass
+                except Exception as e:
+                    db.rollback()
+                    print("OUTBOX WORKER ERROR:", e)
+                finally:
+                    db.close()
+
+                self._wake.wait(self.interval)
+                self._wake.clear()
+        finally:
+            sender.close()
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,109 @@
+"""
+Idempotency-Key cho các POST tạo dữ liệu (hiện tại: POST /api/shop/orders).
+
+- Client gửi header `Idempotency-Key: <uuid>` và dùng lại đúng key đó khi retry.
+- Lần đầu: nghiệp vụ + dòng idempotency_keys (kèm response) ghi trong CÙNG
+  transaction => có cả hai hoặc không có gì.
+- Lần sau cùng key: trả lại response đã lưu (header Idempotent-Replayed: true),
+  không chạy lại nghiệp vụ. Cùng key nhưng payload khác => 422.
+- 2 request cùng key chạy song song: request sau vướng primary key lúc commit
+  => caller rollback rồi gọi replay() lấy kết quả của request trước.
+- Key giữ IDEMPOTENCY_TTL_HOURS giờ (mặc định 24); purge_expired() chạy lúc startup.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+IDEMPOTENCY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _expired(row: models.IdempotencyKey, now: datetime | None = None) -> bool:
+    created = row.created_at
+    # SQLite trả datetime không kèm timezone (đã lưu theo UTC)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created + IDEMPOTENCY_TTL <= (now or utcnow())
+
+
+def normalize_key(key: str | None) -> str | None:
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{IDEMPOTENCY_HEADER} phải dài 1..{MAX_KEY_LENGTH} ký tự",
+        )
+    return key
+
+
+def request_hash(payload: BaseModel) -> str:
+    """sha256 của payload đã validate (key sắp xếp => thứ tự field không ảnh hưởng)."""
+    data = orjson.dumps(payload.model_dump(mode="json"), option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(data).hexdigest()
+
+
+async def replay(db: AsyncSession, scope: str, key: str, req_hash: str) -> Response | None:
+    """Response đã lưu cho key này, hoặc None nếu key chưa dùng (hoặc đã hết hạn)."""
+    row = await db.get(models.IdempotencyKey, (scope, key), populate_existing=True)
+    if row is None:
+        return None
+    if _expired(row):
+        # xóa ngay (flush) để lần ghi mới cùng key trong transaction này không trùng khóa
+        await db.delete(row)
+        await db.flush()
+        return None
+    if row.request_hash != req_hash:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{IDEMPOTENCY_HEADER} này đã được dùng cho 1 request khác",
+        )
+    return Response(
+        row.response,
+        status_code=row.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def remember(
+    db: AsyncSession, scope: str, key: str, req_hash: str, body: dict, status_code: int = 200
+) -> None:
+    """Lưu response cùng transaction với nghiệp vụ. Không commit."""
+    db.add(
+        models.IdempotencyKey(
+            scope=scope,
+            key=key,
+            request_hash=req_hash,
+            status_code=status_code,
+            response=orjson.dumps(body).decode(),
+            created_at=utcnow(),
+        )
+    )
+
+
+def purge_expired(db: Session) -> int:
+    """Xóa key quá hạn. Trả về số dòng đã xóa."""
+    result = db.execute(
+        delete(models.IdempotencyKey).where(
+            models.IdempotencyKey.created_at < utcnow() - IDEMPOTENCY_TTL
+        )
+    )
+    db.commit()
+    return result.rowcount or 0
@@ -0,0 +1,219 @@
+"""
+Danh mục ảnh trong bộ nhớ: file nào đang có trong static/img, static/uploads và
+ảnh nào đã có variant (static/variants/<ảnh>/full.jpg).
+
+- Quét 1 lần lúc startup; API (image_url, default_shop_image, make_image_url,
+  image_set) chỉ tra set => O(1), không stat file trên mỗi request.
+- Cập nhật:
+    + upload_store / images gọi add_file / add_variants / discard ngay khi ghi, xóa;
+    + thread ManifestWatcher theo dõi thay đổi từ ngoài (copy ảnh vào static/img,
+      `python -m app.images`, worker khác): dùng watchfiles nếu có, không thì
+      quét lại mỗi IMAGE_MANIFEST_RESCAN_SECONDS giây.
+- static/uploads dùng chung giữa các worker: tra không thấy thì stat 1 lần rồi
+  ghi nhớ cả kết quả có lẫn không (file vừa upload ở worker khác, watcher chưa
+  kịp báo). Kết quả "không có" bị xóa khi add_file / add_variants, watcher báo
+  thay đổi hoặc quét lại => ảnh upload cũ không có variant không stat mỗi request.
+"""
+import os
+import threading
+from pathlib import Path
+
+try:
+    from watchfiles import Change, watch
+except ImportError:  # không có watchfiles => quét lại định kỳ
+    Change = watch = None
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+VARIANTS_DIR = STATIC_DIR / "variants"
+SOURCE_DIRS = ("img", "uploads")
+# file đánh dấu bộ variant đã đủ (images.process_image ghi sau cùng)
+VARIANTS_MARKER = "full.jpg"
+
+MANIFEST_WATCH = os.getenv("IMAGE_MANIFEST_WATCH", "1") == "1"
+RESCAN_SECONDS = float(os.getenv("IMAGE_MANIFEST_RESCAN_SECONDS", "60"))
+MAX_MISSING = 10_000  # giới hạn số kết quả "không có" ghi nhớ
+
+
+def _is_source(rel: str) -> bool:
+    return rel.split("/", 1)[0] in SOURCE_DIRS
+
+
+def _hidden(name: str) -> bool:
+    # .tmp-<uuid> của upload đang ghi, .full.jpg.tmp của variant đang tạo
+    return name.startswith(".")
+
+
+def scan() -> tuple[set[str], set[str]]:
+    files: set[str] = set()
+    for d in SOURCE_DIRS:
+        root = STATIC_DIR / d
+        if root.is_dir():
+            for p in root.rglob("*"):
+                if not _hidden(p.name) and p.is_file():
+                    files.add(p.relative_to(STATIC_DIR).as_posix())
+
+    variants: set[str] = set()
+    if VARIANTS_DIR.is_dir():
+        for p in VARIANTS_DIR.rglob(VARIANTS_MARKER):
+            variants.add(p.parent.relative_to(VARIANTS_DIR).as_posix())
+    return files, variants
+
+
+class ImageManifest:
+    """Đường dẫn đều tương đối dưới static/, vd 'img/imgshop1.jpg', 'uploads/ab/<sha256>.jpg'."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files: set[str] = set()
+        self.variants: set[str] = set()
+        # đã stat mà không thấy (chỉ uploads)
+        self.missing_files: set[str] = set()
+        self.missing_variants: set[str] = set()
+
+    def rebuild(self) -> None:
+        files, variants = scan()
+        # thay cả set (atomic); request đang đọc vẫn thấy set cũ đầy đủ
+        with self._lock:
+            self.files = files
+            self.variants = variants
+            self.missing_files = set()
+            self.missing_variants = set()
+
+    def _probe(self, rel: str, path: Path, target: set[str], missing: set[str]) -> bool:
+        """Chỉ cho uploads: tra trượt thì kiểm tra đĩa 1 lần, ghi nhớ kết quả."""
+        if not rel.startswith("uploads/") or rel in missing:
+            return False
+        found = path.is_file()
+        with self._lock:
+            if found:
+                target.add(rel)
+            else:
+                if len(missing) >= MAX_MISSING:
+                    missing.clear()
+                missing.add(rel)
+        return found
+
+    def has_file(self, rel: str) -> bool:
+        return rel in self.files or self._probe(
+            rel, STATIC_DIR / rel, self.files, self.missing_files
+        )
+
+    def has_variants(self, rel: str) -> bool:
+        return rel in self.variants or self._probe(
+            rel, VARIANTS_DIR / rel / VARIANTS_MARKER, self.variants, self.missing_variants
+        )
+
+    def exists(self, url: str) -> bool:
+        """
+        URL '/static/img/...' hoặc '/static/uploads/...' có file không.
+        URL khác (http://, /static/css...) không nằm trong danh mục => coi như có.
+        """
+        if not url.startswith("/static/"):
+            return True
+        rel = url[len("/static/"):]
+        if not _is_source(rel):
+            return True
+        return self.has_file(rel)
+
+    def add_file(self, rel: str) -> None:
+        with self._lock:
+            self.files.add(rel)
+            self.missing_files.discard(rel)
+
+    def add_variants(self, rel: str) -> None:
+        with self._lock:
+            self.variants.add(rel)
+            self.missing_variants.discard(rel)
+
+    def discard(self, rel: str) -> None:
+        """Ảnh gốc bị xóa (kèm variant của nó)."""
+        with self._lock:
+            self.files.discard(rel)
+            self.variants.discard(rel)
+
+    def apply(self, changes) -> None:
+        """Áp dụng sự kiện của watchfiles: {(Change, '/abs/path'), ...}."""
+        for change, raw in changes:
+            path = Path(raw)
+            if _hidden(path.name):
+                continue
+            try:
+                rel = path.relative_to(STATIC_DIR).as_posix()
+            except ValueError:
+                continue
+
+            if rel.startswith("variants/"):
+                if path.name != VARIANTS_MARKER:
+                    continue
+                src = path.parent.relative_to(VARIANTS_DIR).as_posix()
+                if change == Change.deleted:
+                    with self._lock:
+                        self.variants.discard(src)
+                else:
+                    self.add_variants(src)
+            elif _is_source(rel):
+                if change == Change.deleted:
+                    with self._lock:
+                        self.files.discard(rel)
+                elif path.is_file():
+                    self.add_file(rel)
+                elif path.is_dir() and change == Change.added:
+                    # thư mục chép vào nguyên khối: không có sự kiện cho từng file
+                    self.rebuild()
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.files),
+            "variants": len(self.variants),
+            "missing": len(self.missing_files) + len(self.missing_variants),
+        }
+
+
+image_manifest = ImageManifest()
+
+
+# =========================
+# THEO DÕI THAY ĐỔI
+# =========================
+class ManifestWatcher:
+    """Thread nền giữ image_manifest khớp với đĩa."""
+
+    def __init__(self, manifest: ImageManifest = image_manifest):
+        self.manifest = manifest
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None or not MANIFEST_WATCH:
+            return
+        for d in (*SOURCE_DIRS, "variants"):
+            (STATIC_DIR / d).mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="image-manifest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        dirs = [STATIC_DIR / d for d in (*SOURCE_DIRS, "variants")]
+        if watch is not None:
+            try:
+                for changes in watch(*dirs, stop_event=self._stop, recursive=True):
+                    self.manifest.apply(changes)
+                return
+            except Exception as e:
+                # vd hết inotify watch: chuyển sang quét định kỳ
+                print("IMAGE MANIFEST WATCH ERROR:", e)
+
+        while not self._stop.wait(RESCAN_SECONDS):
+            try:
+                self.manifest.rebuild()
+            except OSError as e:
+                print("IMAGE MANIFEST RESCAN ERROR:", e)
+
+
+manifest_watcher = ManifestWatcher()
@@ -0,0 +1,191 @@
+"""
+Ảnh responsive: mỗi ảnh gốc trong static/ được resize thành vài bề ngang
+(thumb / card / full), mỗi cỡ lưu cả WebP và JPEG:
+
+    static/uploads/abc_mon.jpg
+    -> static/variants/uploads/abc_mon.jpg/{thumb,card,full}.{webp,jpg}
+
+- Upload mới: routes_recipes xử lý ngay sau khi ghi file, trong process pool
+  (Pillow tốn CPU, không chạy trên event loop).
+- Ảnh có sẵn (static/img, static/uploads cũ):
+      python -m app.images            # chỉ ảnh chưa có variant
+      python -m app.images --force    # tạo lại tất cả
+- API trả thêm image_set (URL từng cỡ + chuỗi srcset); ảnh chưa xử lý => None,
+  client dùng ảnh gốc như cũ.
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+from PIL import Image, ImageOps
+
+from .image_manifest import SOURCE_DIRS, STATIC_DIR, VARIANTS_DIR, image_manifest
+
+# tên -> bề ngang tối đa (px); ảnh nhỏ hơn thì giữ nguyên cỡ
+VARIANTS = {"thumb": 200, "card": 480, "full": 1280}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+SOURCE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def variant_dir(rel_path: str) -> Path:
+    """rel_path: đường dẫn dưới static/, vd 'uploads/abc_mon.jpg'."""
+    return VARIANTS_DIR / rel_path
+
+
+def static_rel_path(url: str | None) -> str | None:
+    """'/static/uploads/x.jpg' -> 'uploads/x.jpg' (None nếu không phải file trong static/)."""
+    if not url or not url.startswith("/static/"):
+        return None
+    rel = url[len("/static/"):]
+    if rel.startswith("variants/") or ".." in rel.split("/"):
+        return None
+    return rel
+
+
+# =========================
+# XỬ LÝ ẢNH (chạy trong process pool / CLI)
+# =========================
+def process_image(src: str | os.PathLike, rel_path: str, force: bool = False) -> bool:
+    """Tạo đủ variant cho 1 ảnh. Trả về False nếu file không phải ảnh đọc được."""
+    out_dir = variant_dir(rel_path)
+    # full.jpg ghi sau cùng => có file này nghĩa là bộ variant đã đủ
+    if not force and (out_dir / "full.jpg").exists():
+        return True
+
+    try:
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im)
+            im.load()
+    except Exception as e:
+        print(f"Bỏ qua ảnh {rel_path}: {e}")
+        return False
+
+    if im.mode not in ("RGB", "RGBA"):
+        has_alpha = im.mode in ("LA", "PA") or "transparency" in im.info
+        im = im.convert("RGBA" if has_alpha else "RGB")
+    # JPEG không có alpha: nền trắng
+    if im.mode == "RGBA":
+        flat = Image.new("RGB", im.size, (255, 255, 255))
+        flat.paste(im, mask=im.getchannel("A"))
+    else:
+        flat = im
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, width in VARIANTS.items():
+        for ext, (fmt, opts) in FORMATS.items():
+            base = im if fmt == "WEBP" else flat
+            if base.width > width:
+                height = max(1, round(base.height * width / base.width))
+                resized = base.resize((width, height), Image.LANCZOS)
+            else:
+                resized = base
+            # ghi file tạm rồi rename: request đọc song song không thấy file dở
+            tmp = out_dir / f".{name}.{ext}.tmp"
+            resized.save(tmp, fmt, **opts)
+            os.replace(tmp, out_dir / f"{name}.{ext}")
+    return True
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+async def process_upload(rel_path: str) -> bool:
+    """Tạo variant cho file vừa upload (rel_path dưới static/) mà không chặn event loop."""
+    loop = asyncio.get_running_loop()
+    ok = await loop.run_in_executor(
+        _get_pool(), process_image, str(STATIC_DIR / rel_path), rel_path
+    )
+    if ok:
+        image_manifest.add_variants(rel_path)
+    return ok
+
+
+def shutdown_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# =========================
+# URL CHO CLIENT
+# =========================
+def _variant_url(rel_path: str, name: str, ext: str) -> str:
+    # tên file upload có thể chứa dấu cách / tiếng Việt: srcset bắt buộc phải encode
+    return "/static/variants/" + quote(f"{rel_path}/{name}.{ext}")
+
+
+def image_set(url: str | None) -> dict | None:
+    """
+    {"thumb": {"webp", "jpeg"}, "card": {...}, "full": {...},
+     "srcset": {"webp": "... 200w, ... 480w, ...", "jpeg": "..."}}
+    hoặc None nếu ảnh chưa có variant.
+    """
+    rel = static_rel_path(url)
+    # tra image_manifest (set trong bộ nhớ) thay vì stat full.jpg mỗi lần
+    if rel is None or not image_manifest.has_variants(rel):
+        return None
+
+    data: dict = {}
+    srcset = {"webp": [], "jpeg": []}
+    for name, width in VARIANTS.items():
+        urls = {
+            "webp": _variant_url(rel, name, "webp"),
+            "jpeg": _variant_url(rel, name, "jpg"),
+        }
+        data[name] = urls
+        for key, u in urls.items():
+            srcset[key].append(f"{u} {width}w")
+    data["srcset"] = {k: ", ".join(v) for k, v in srcset.items()}
+    return data
+
+
+# =========================
+# CLI: xử lý ảnh có sẵn
+# =========================
+def iter_source_images():
+    for d in SOURCE_DIRS:
+        root = STATIC_DIR / d
+        if not root.is_dir():
+            continue
+        for p in sorted(root.rglob("*")):
+            if p.is_file() and p.suffix.lower() in SOURCE_EXTS and p.stat().st_size > 0:
+                yield p, p.relative_to(STATIC_DIR).as_posix()
+
+
+def process_existing(force: bool = False, workers: int = IMAGE_WORKERS) -> tuple[int, int]:
+    """Trả về (số ảnh xử lý được, số ảnh lỗi)."""
+    items = list(iter_source_images())
+    ok = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_image, str(p), rel, force) for p, rel in items]
+        for f in futures:
+            if f.result():
+                ok += 1
+            else:
+                failed += 1
+    return ok, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tạo ảnh thumb/card/full (WebP + JPEG) cho static/img, static/uploads")
+    parser.add_argument("--force", action="store_true", help="tạo lại cả ảnh đã có variant")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    ok, failed = process_existing(force=args.force, workers=args.workers)
+    print(f"images: {ok} ảnh đã có variant, {failed} file bỏ qua")
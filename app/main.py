@@ -2,9 +2,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 
 # =========================
 # LOAD .env (RẤT QUAN TRỌNG)
@@ -17,8 +16,26 @@ load_dotenv(ROOT_DIR / ".env")
 # =========================
 # DB + Models
 # =========================
-from .database import Base, engine  # noqa: E402
+from .database import Base, SessionLocal, async_engine, engine, pool_stats  # noqa: E402
 from . import models  # noqa: F401, E402
+from .recipe_search import backfill_search_docs, setup_search_index  # noqa: E402
+from .recipe_stats import rebuild_recipe_stats  # noqa: E402
+from .email_outbox import mail_enabled, outbox_worker  # noqa: E402
+from .nutrition import load_nutrient_table  # noqa: E402
+from .idempotency import purge_expired  # noqa: E402
+from .sales_stats import rebuild_sales_rollups  # noqa: E402
+from .default_recipes import reload_catalog  # noqa: E402
+from .images import shutdown_image_pool  # noqa: E402
+from .image_manifest import image_manifest, manifest_watcher  # noqa: E402
+from .assets import BUILD_DIR, PrecompressedStaticFiles, build_assets  # noqa: E402
+from .compression import CompressionMiddleware  # noqa: E402
+from .templating import render_page, templates  # noqa: E402
+from .response_cache import response_cache  # noqa: E402
+from .auth_utils import hash_pool_stats, shutdown_hash_pool  # noqa: E402
+from .rate_limit import limiter_stats  # noqa: E402
+from .tokens import revocation_sync, revocations  # noqa: E402
+from .metrics import METRICS_ENABLED, MetricsMiddleware, instrument_engine, render_metrics  # noqa: E402
+from . import profiling  # noqa: E402
 
 # =========================
 # Routers (API)
@@ -29,12 +46,26 @@ from .routes_default_recipes import router as default_recipes_router  # noqa: E4
 from .routes_student_planner import router as student_planner_router  # noqa: E402
 from .routes_gym_planner import router as gym_planner_router  # noqa: E402
 from .routes_shop import router as shop_router  # noqa: E402
-from .routes_planner import router as planner_router  # noqa: E402
+from .routes_planner import router as planner_router, setup_slot_unique_index  # noqa: E402
+from .routes_nutrition import router as nutrition_router  # noqa: E402
 
 # =========================
 # App
 # =========================
-app = FastAPI(title="CK Mang Nguon Mo")
+# orjson: encode nhanh hơn json chuẩn cho các list lớn (recipes, orders)
+app = FastAPI(title="CK Mang Nguon Mo", default_response_class=ORJSONResponse)
+# nén gzip/brotli theo Accept-Encoding (app/compression.py)
+app.add_middleware(CompressionMiddleware)
+if profiling.profiling_enabled():
+    # chỉ thêm khi có PROFILE_TOKEN / PROFILE_SAMPLE_RATE (app/profiling.py)
+    app.add_middleware(profiling.ProfilingMiddleware)
+    profiling.instrument_engine(async_engine.sync_engine)
+    profiling.instrument_engine(engine)
+if METRICS_ENABLED:
+    # thêm sau => bọc ngoài cùng: đo cả thời gian nén, kích thước byte thật gửi đi
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(async_engine.sync_engine, "api")
+    instrument_engine(engine, "background")
 
 STATIC_DIR = ROOT_DIR / "static"
 TEMPLATES_DIR = ROOT_DIR / "templates"
@@ -45,16 +76,61 @@ if not TEMPLATES_DIR.exists():
     raise RuntimeError(f"Templates directory not found: {TEMPLATES_DIR}")
 
 # Mount static
+# css/js có fingerprint + .gz/.br (app/assets.py); mount trước "/static" để được khớp trước
+BUILD_DIR.mkdir(exist_ok=True)
+app.mount("/static/build", PrecompressedStaticFiles(directory=str(BUILD_DIR)), name="static-build")
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
-# Templates
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
-
 
 @app.on_event("startup")
 def on_startup():
+    # fingerprint + nén sẵn css/js trước khi phục vụ trang nào
+    build_assets()
+    # công thức gợi ý từ app/data (tự nạp lại khi file đổi)
+    reload_catalog(force=True)
+    # quét static/img, static/uploads, static/variants 1 lần; watcher giữ cho khớp
+    image_manifest.rebuild()
+    manifest_watcher.start()
+
     Base.metadata.create_all(bind=engine)
 
+    # Index tìm kiếm công thức (GIN / FTS5) + bổ sung cho recipe cũ
+    setup_search_index(engine)
+    # meal_slots: gộp slot trùng của DB cũ + unique (date, meal_type) cho upsert
+    setup_slot_unique_index(engine)
+    db = SessionLocal()
+    try:
+        backfill_search_docs(db)
+        # recipe cũ chưa có recipe_stats thì tính 1 lần từ recipe_reviews
+        rebuild_recipe_stats(db, only_missing=True)
+        # bảng dinh dưỡng nguyên liệu -> ma trận NumPy trong bộ nhớ
+        load_nutrient_table(db)
+        # DB cũ có đơn nhưng chưa có rollup doanh số thì tính 1 lần
+        rebuild_sales_rollups(db, only_missing=True)
+        # Idempotency-Key quá IDEMPOTENCY_TTL_HOURS
+        purge_expired(db)
+        # token đã thu hồi: dọn dòng hết hạn, nạp phần còn lại vào bộ nhớ
+        revocations.sync(db, purge=True)
+    finally:
+        db.close()
+
+    # đồng bộ token bị thu hồi ở worker khác
+    revocation_sync.start()
+
+    # Worker gửi email từ outbox (chỉ khi bật mail)
+    if mail_enabled():
+        outbox_worker.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    outbox_worker.stop()
+    revocation_sync.stop()
+    manifest_watcher.stop()
+    shutdown_image_pool()
+    shutdown_hash_pool()
+    await async_engine.dispose()
+
 
 # Include API routers
 app.include_router(auth_router)
@@ -64,76 +140,78 @@ app.include_router(student_planner_router)
 app.include_router(gym_planner_router)
 app.include_router(shop_router)
 app.include_router(planner_router)
+app.include_router(nutrition_router)
 
 
 # =========================
 # Pages (SSR)
 # =========================
+# Các trang không phụ thuộc request: render 1 lần, trả từ bộ nhớ kèm ETag (app/templating.py)
 @app.get("/", response_class=HTMLResponse)
 def page_index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return render_page(request, "index.html")
 
 
 @app.get("/login", response_class=HTMLResponse)
 def page_login(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return render_page(request, "login.html")
 
 
 @app.get("/register", response_class=HTMLResponse)
 def page_register(request: Request):
-    return templates.TemplateResponse("register.html", {"request": request})
+    return render_page(request, "register.html")
 
 
 # --- QUÊN MẬT KHẨU ---
 # Route cũ
 @app.get("/forgot", response_class=HTMLResponse)
 def page_forgot(request: Request):
-    return templates.TemplateResponse("forgot.html", {"request": request})
+    return render_page(request, "forgot.html")
 
 
 # ✅ Route đúng theo link bạn bấm/log: /forgot-password
 @app.get("/forgot-password", response_class=HTMLResponse)
 def page_forgot_password(request: Request):
-    return templates.TemplateResponse("forgot.html", {"request": request})
+    return render_page(request, "forgot.html")
 
 
 @app.get("/meal-planner", response_class=HTMLResponse)
 def page_meal_planner(request: Request):
-    return templates.TemplateResponse("meal_planner.html", {"request": request})
+    return render_page(request, "meal_planner.html")
 
 
 @app.get("/shopping-list", response_class=HTMLResponse)
 def page_shopping_list(request: Request):
-    return templates.TemplateResponse("shopping_list.html", {"request": request})
+    return render_page(request, "shopping_list.html")
 
 
 @app.get("/order-history", response_class=HTMLResponse)
 def page_order_history(request: Request):
-    return templates.TemplateResponse("order_history.html", {"request": request})
+    return render_page(request, "order_history.html")
 
 
 # ✅ TRANG DINH DƯỠNG
 @app.get("/nutrition", response_class=HTMLResponse)
 def page_nutrition(request: Request):
-    return templates.TemplateResponse("nutrition.html", {"request": request})
+    return render_page(request, "nutrition.html")
 
 
 # ✅ RECIPES LIST
 @app.get("/recipes", response_class=HTMLResponse)
 def page_recipes_list(request: Request):
-    return templates.TemplateResponse("recipes_list.html", {"request": request})
+    return render_page(request, "recipes_list.html")
 
 
 # ✅ ADD RECIPE (GIỮ ROUTE CŨ)
 @app.get("/recipes/add", response_class=HTMLResponse)
 def page_recipe_add(request: Request):
-    return templates.TemplateResponse("recipe_add.html", {"request": request})
+    return render_page(request, "recipe_add.html")
 
 
 # ✅ ADD RECIPE (ALIAS ĐÚNG VỚI LINK FRONTEND: /recipes/new)
 @app.get("/recipes/new", response_class=HTMLResponse)
 def page_recipe_new(request: Request):
-    return templates.TemplateResponse("recipe_add.html", {"request": request})
+    return render_page(request, "recipe_add.html")
 
 
 @app.get("/recipes/edit/{recipe_id}", response_class=HTMLResponse)
@@ -152,6 +230,35 @@ def page_recipe_edit(request: Request, recipe_id: int):
     )
 
 
+# =========================
+# Health: số liệu connection pool, response cache, hash pool; /metrics cho Prometheus
+# =========================
+@app.get("/api/health/db-pool", include_in_schema=False)
+def health_db_pool():
+    return pool_stats()
+
+
+@app.get("/api/health/cache", include_in_schema=False)
+def health_cache():
+    return response_cache.stats()
+
+
+@app.get("/api/health/auth", include_in_schema=False)
+def health_auth():
+    return {
+        "hash_pool": hash_pool_stats(),
+        "rate_limits": limiter_stats(),
+        "revoked_tokens": len(revocations),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # =========================
 # Favicon (đỡ 404) - optional
 # =========================
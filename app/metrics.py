@@ -0,0 +1,259 @@
+"""
+Số liệu dạng Prometheus (text exposition) cho GET /metrics.
+
+- HTTP: latency histogram + số request + kích thước response theo (method, route),
+  số request đang xử lý. route = path template ("/api/recipes/{recipe_id}"),
+  không phải path thật => số label không phình theo id.
+- DB: event before/after_cursor_execute trên cả 2 engine đo từng câu SQL.
+  Trong 1 request (contextvar) cộng dồn số query + tổng thời gian DB rồi ghi
+  histogram theo route => N+1 hiện rõ trên dashboard (db_queries_per_request).
+- Câu SQL chậm hơn SLOW_QUERY_MS in ra log kèm route (0 = tắt).
+- Không cần prometheus_client; mỗi worker có bộ đếm riêng (Prometheus scrape
+  từng worker hoặc chạy 1 worker / container).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_MAX_CHARS = 500  # cắt bớt câu SQL dài khi in log
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+# =========================
+# KIỂU SỐ LIỆU
+# =========================
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        # labels -> [đếm theo bucket (không cộng dồn)..., +Inf], sum
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_fmt(float(bound))}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+# =========================
+# REGISTRY
+# =========================
+ROUTE_LABELS = ("method", "route")
+
+http_requests = Counter(
+    "http_requests_total", "Số request HTTP đã xử lý", ("method", "route", "status")
+)
+http_latency = Histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request (tới khi gửi xong body)",
+    LATENCY_BUCKETS, ROUTE_LABELS,
+)
+http_response_size = Histogram(
+    "http_response_size_bytes", "Kích thước body response (sau nén)", SIZE_BUCKETS, ROUTE_LABELS
+)
+http_in_flight = Gauge("http_requests_in_flight", "Số request đang xử lý")
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "Số câu SQL trong 1 request", QUERY_COUNT_BUCKETS, ROUTE_LABELS
+)
+db_time_per_request = Histogram(
+    "db_time_per_request_seconds", "Tổng thời gian chạy SQL trong 1 request",
+    LATENCY_BUCKETS, ROUTE_LABELS,
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Thời gian từng câu SQL", LATENCY_BUCKETS, ("engine",)
+)
+db_slow_queries = Counter(
+    "db_slow_queries_total", "Số câu SQL chậm hơn SLOW_QUERY_MS", ("engine",)
+)
+
+REGISTRY = (
+    http_requests,
+    http_latency,
+    http_response_size,
+    http_in_flight,
+    db_queries_per_request,
+    db_time_per_request,
+    db_query_duration,
+    db_slow_queries,
+)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# DB: ĐẾM QUERY THEO REQUEST
+# =========================
+class RequestDBStats:
+    __slots__ = ("scope", "queries", "seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_db: ContextVar[RequestDBStats | None] = ContextVar("request_db", default=None)
+
+
+def instrument_engine(engine, label: str) -> None:
+    """Gắn event đo SQL cho 1 engine (sync Engine; engine async thì truyền .sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_duration.observe(elapsed, (label,))
+
+        stats = _request_db.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+
+        if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+            db_slow_queries.inc((label,))
+            where = f"{stats.scope['method']} {route_label(stats.scope)}" if stats is not None else label
+            sql = " ".join(statement.split())[:SLOW_QUERY_MAX_CHARS]
+            print(f"SLOW QUERY {elapsed * 1000:.1f} ms [{where}]: {sql}")
+
+    # câu SQL lỗi không gọi after_cursor_execute => bỏ mốc thời gian của nó
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+def route_label(scope) -> str:
+    """Path template của route đã khớp; mount (/static) => path mount."""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware thuần: đo cả response streaming tới chunk cuối."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        size = 0
+        stats = RequestDBStats(scope)
+        token = _request_db.set(stats)
+
+        async def wrapped_send(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            _request_db.reset(token)
+
+            labels = (scope["method"], route_label(scope))
+            http_requests.inc(labels + (str(status_code),))
+            http_latency.observe(elapsed, labels)
+            http_response_size.observe(size, labels)
+            db_queries_per_request.observe(stats.queries, labels)
+            db_time_per_request.observe(stats.seconds, labels)
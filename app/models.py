@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func, Date
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, func, Date, Index, Float
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -26,6 +26,54 @@ class Recipe(Base):
     # ✅ thêm liên kết review
     reviews = relationship("RecipeReview", back_populates="recipe", cascade="all, delete-orphan")
 
+    # ✅ tổng điểm / số review tính sẵn (xem app/recipe_stats.py)
+    stats = relationship(
+        "RecipeStats",
+        back_populates="recipe",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
+
+    # ✅ dinh dưỡng tính sẵn từ ingredients (xem app/nutrition.py)
+    nutrition = relationship(
+        "RecipeNutrition",
+        back_populates="recipe",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
+
+    # ✅ văn bản tìm kiếm đã bỏ dấu (xem app/recipe_search.py)
+    search_doc = relationship(
+        "RecipeSearch",
+        back_populates="recipe",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
+
+
+# ✅ BẢNG THỐNG KÊ ĐÁNH GIÁ (denormalized từ recipe_reviews)
+# avg_rating = rating_sum / review_count, cập nhật cùng transaction với review
+class RecipeStats(Base):
+    __tablename__ = "recipe_stats"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    review_count = Column(Integer, nullable=False, default=0)
+
+    recipe = relationship("Recipe", back_populates="stats")
+
+
+# ✅ BẢNG TÌM KIẾM: title/ingredients đã bỏ dấu + lowercase
+# Postgres: GIN index trên tsvector, SQLite: bảng FTS5 recipe_search_fts
+class RecipeSearch(Base):
+    __tablename__ = "recipe_search"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    title = Column(Text, nullable=False, default="")
+    ingredients = Column(Text, nullable=False, default="")
+
+    recipe = relationship("Recipe", back_populates="search_doc")
+
 
 # ✅ BẢNG ĐÁNH GIÁ CÔNG THỨC
 class RecipeReview(Base):
@@ -45,6 +93,10 @@ class RecipeReview(Base):
 # ✅ KHỚP 100% với DB hiện tại của bạn
 class MealSlot(Base):
     __tablename__ = "meal_slots"
+    # mỗi (ngày, bữa) chỉ 1 dòng: đích của INSERT ... ON CONFLICT (xem routes_planner)
+    __table_args__ = (
+        Index("ux_meal_slots_date_meal_type", "date", "meal_type", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False, index=True)
@@ -77,16 +129,21 @@ class Order(Base):
     customer_name = Column(String(200), nullable=True)
     note = Column(String(255), nullable=True)
     total_price = Column(Integer, nullable=False, default=0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
-    items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+    items = relationship(
+        "OrderItem",
+        back_populates="order",
+        cascade="all, delete-orphan",
+        order_by="OrderItem.id",
+    )
 
 
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"))
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
 
     product_name = Column(String(200), nullable=False)
@@ -94,3 +151,107 @@ class OrderItem(Base):
     quantity = Column(Integer, nullable=False)
 
     order = relationship("Order", back_populates="items")
+
+
+# ✅ DOANH SỐ THEO NGÀY (rollup): create_order / delete_order cộng trừ trong cùng
+# transaction, /api/shop/stats chỉ đọc 2 bảng này (xem app/sales_stats.py)
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+
+    day = Column(Date, primary_key=True)  # ngày theo SALES_UTC_OFFSET_HOURS
+    order_count = Column(Integer, nullable=False, default=0)
+    units = Column(BigInteger, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)
+
+
+class ProductDailySales(Base):
+    __tablename__ = "product_daily_sales"
+
+    day = Column(Date, primary_key=True)
+    # không FK: sản phẩm bị xóa vẫn giữ lịch sử bán
+    product_id = Column(Integer, primary_key=True, index=True)
+    product_name = Column(String(200), nullable=False)  # tên lúc bán gần nhất
+    order_count = Column(Integer, nullable=False, default=0)  # số đơn có sản phẩm này
+    units = Column(BigInteger, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)
+
+
+# ✅ HÀNG ĐỢI EMAIL (outbox): ghi cùng transaction với nghiệp vụ,
+# worker nền gửi dần (xem app/email_outbox.py)
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mail_to = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+
+    status = Column(String(20), nullable=False, default="pending")  # pending | sent | dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
+
+
+# ✅ IDEMPOTENCY-KEY: POST lặp lại (client retry, bấm 2 lần) trả lại kết quả lần đầu
+# (xem app/idempotency.py)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String(50), primary_key=True)  # vd "shop.create_order"
+    key = Column(String(255), primary_key=True)  # header Idempotency-Key
+    request_hash = Column(String(64), nullable=False)  # sha256 payload: cùng key khác nội dung => 422
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)  # body JSON đã trả
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+# ✅ TOKEN ĐÃ THU HỒI (logout, refresh token đã dùng). Giữ tới khi token hết hạn;
+# mỗi process giữ bản sao trong bộ nhớ (xem app/tokens.py)
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+# ✅ BẢNG DINH DƯỠNG NGUYÊN LIỆU (giá trị trên 100g)
+class IngredientNutrient(Base):
+    __tablename__ = "ingredient_nutrients"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(120), unique=True, nullable=False)
+    aliases = Column(Text, nullable=True)  # tên khác, cách nhau bởi dấu phẩy
+    default_grams = Column(Float, nullable=False, default=100)  # khi không ghi lượng
+    piece_grams = Column(Float, nullable=False, default=50)  # 1 quả / củ / cây / miếng...
+
+    calories = Column(Float, nullable=False, default=0)  # kcal
+    protein = Column(Float, nullable=False, default=0)  # g
+    carbs = Column(Float, nullable=False, default=0)  # g
+    fat = Column(Float, nullable=False, default=0)  # g
+    fiber = Column(Float, nullable=False, default=0)  # g
+    sugar = Column(Float, nullable=False, default=0)  # g
+    sodium = Column(Float, nullable=False, default=0)  # mg
+
+
+# ✅ DINH DƯỠNG MỖI CÔNG THỨC (cache, tính lại khi ingredients đổi)
+class RecipeNutrition(Base):
+    __tablename__ = "recipe_nutrition"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    calories = Column(Float, nullable=False, default=0)
+    protein = Column(Float, nullable=False, default=0)
+    carbs = Column(Float, nullable=False, default=0)
+    fat = Column(Float, nullable=False, default=0)
+    fiber = Column(Float, nullable=False, default=0)
+    sugar = Column(Float, nullable=False, default=0)
+    sodium = Column(Float, nullable=False, default=0)
+    unmatched = Column(Text, nullable=True)  # nguyên liệu không nhận ra, cách nhau bởi ";"
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    recipe = relationship("Recipe", back_populates="nutrition")
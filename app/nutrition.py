@@ -0,0 +1,358 @@
+"""
+Tính dinh dưỡng công thức phía server.
+
+- Bảng ingredient_nutrients (giá trị / 100g) được nạp 1 lần thành ma trận NumPy
+  N (số nguyên liệu x 7 chỉ số, đơn vị / gram).
+- Recipe.ingredients ("Cá hồi 200g; Hành lá; 2 muỗng canh nước mắm") được tách
+  thành (nguyên liệu, số gram). Nhiều công thức => ma trận A (công thức x nguyên
+  liệu), kết quả cả lô = A @ N.
+- Kết quả mỗi Recipe được cache trong bảng recipe_nutrition; update_recipe xóa
+  dòng cache, lần đọc sau tính lại.
+- Tổng theo ngày cho meal planner: 1 câu GROUP BY trên meal_slots JOIN
+  recipe_nutrition (sum_slot_nutrition).
+"""
+import re
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .default_ingredients import RENAMED_INGREDIENTS, default_ingredients
+from .recipe_search import fold_text
+
+NUTRIENT_KEYS = ("calories", "protein", "carbs", "fat", "fiber", "sugar", "sodium")
+
+# đơn vị quy ra gram (ml coi như g)
+UNIT_GRAMS = {
+    "kg": 1000,
+    "g": 1,
+    "gr": 1,
+    "gram": 1,
+    "mg": 0.001,
+    "ml": 1,
+    "l": 1000,
+    "lit": 1000,
+    "muong canh": 15,
+    "thia canh": 15,
+    "tbsp": 15,
+    "muong ca phe": 5,
+    "thia ca phe": 5,
+    "muong cafe": 5,
+    "tsp": 5,
+    "chen": 200,
+    "bat": 200,
+    "cup": 240,
+    "ly": 250,
+}
+# đơn vị "cái": dùng piece_grams của từng nguyên liệu
+PIECE_UNITS = {"qua", "trai", "cu", "cay", "nhanh", "tep", "la", "lat", "mieng", "con", "goi", "hop"}
+
+_UNITS_RE = "|".join(
+    re.escape(u) for u in sorted([*UNIT_GRAMS, *PIECE_UNITS], key=len, reverse=True)
+)
+QTY_RE = re.compile(rf"(\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?)\s*({_UNITS_RE})?\b")
+SPLIT_RE = re.compile(r"[;\n]|,(?!\d)")
+MAX_NGRAM = 4
+
+
+def parse_number(s: str) -> float:
+    s = s.replace(",", ".").replace(" ", "")
+    if "/" in s:
+        a, b = s.split("/", 1)
+        return float(a) / float(b) if float(b) else 0.0
+    return float(s)
+
+
+@dataclass
+class ParsedIngredient:
+    index: int
+    grams: float
+
+
+class NutrientTable:
+    """Ma trận dinh dưỡng + index tên (đã bỏ dấu) -> dòng."""
+
+    def __init__(self, rows, strict: bool = False):
+        self.names = [r["name"] for r in rows]
+        # / 100 => giá trị trên 1 gram
+        self.matrix = (
+            np.array([[float(r[k] or 0) for k in NUTRIENT_KEYS] for r in rows], dtype=np.float64)
+            .reshape(len(rows), len(NUTRIENT_KEYS))
+            / 100.0
+        )
+        self.default_grams = np.array([float(r["default_grams"] or 100) for r in rows])
+        self.piece_grams = np.array([float(r["piece_grams"] or 50) for r in rows])
+
+        # tên / alias sau khi bỏ dấu có thể trùng giữa 2 nguyên liệu ("bơ" / "bò"
+        # đều thành "bo"): không âm thầm chọn 1 dòng mà bỏ key đó + cảnh báo
+        # (strict=True => ValueError, dùng khi kiểm tra dữ liệu seed)
+        owners: dict[tuple[str, ...], set[int]] = {}
+        for i, r in enumerate(rows):
+            names = [r["name"], *(r.get("aliases") or "").split(",")]
+            for n in names:
+                key = tuple(fold_text(n).split())
+                if key and len(key) <= MAX_NGRAM:
+                    owners.setdefault(key, set()).add(i)
+
+        self.alias_index: dict[tuple[str, ...], int] = {}
+        self.ambiguous: dict[tuple[str, ...], list[str]] = {}
+        for key, idx in owners.items():
+            if len(idx) == 1:
+                self.alias_index[key] = idx.pop()
+            else:
+                self.ambiguous[key] = sorted(self.names[i] for i in idx)
+
+        if self.ambiguous:
+            detail = "; ".join(f"'{' '.join(k)}': {', '.join(v)}" for k, v in self.ambiguous.items())
+            if strict:
+                raise ValueError(f"Alias nguyên liệu trùng nhau sau khi bỏ dấu: {detail}")
+            print("NUTRITION ALIAS COLLISION (bỏ qua các key này):", detail)
+
+    def match(self, tokens: list[str]) -> int | None:
+        """Khớp n-gram dài nhất trước ('thit bo' trước 'bo')."""
+        for n in range(min(MAX_NGRAM, len(tokens)), 0, -1):
+            for i in range(len(tokens) - n + 1):
+                idx = self.alias_index.get(tuple(tokens[i:i + n]))
+                if idx is not None:
+                    return idx
+        return None
+
+    def parse(self, ingredients: str | None) -> tuple[list[ParsedIngredient], list[str]]:
+        parsed: list[ParsedIngredient] = []
+        unmatched: list[str] = []
+
+        for raw in SPLIT_RE.split(ingredients or ""):
+            line = fold_text(raw)
+            if not line:
+                continue
+
+            m = QTY_RE.search(line)
+            qty, unit = None, None
+            if m:
+                qty, unit = parse_number(m.group(1)), m.group(2)
+                line = (line[: m.start()] + " " + line[m.end():]).strip()
+
+            idx = self.match(re.findall(r"[a-z]+", line))
+            if idx is None:
+                unmatched.append(raw.strip())
+                continue
+
+            if qty is None:
+                grams = self.default_grams[idx]
+            elif unit in UNIT_GRAMS:
+                grams = qty * UNIT_GRAMS[unit]
+            elif unit in PIECE_UNITS or qty <= 10:
+                # "Trứng 2" => 2 quả; số lớn không đơn vị => gram
+                grams = qty * self.piece_grams[idx]
+            else:
+                grams = qty
+            parsed.append(ParsedIngredient(idx, float(grams)))
+
+        return parsed, unmatched
+
+    def compute(self, texts: list[str | None]) -> tuple[np.ndarray, list[list[str]]]:
+        """Tính cả lô: (len(texts) x 7) = A @ N."""
+        amounts = np.zeros((len(texts), len(self.names)), dtype=np.float64)
+        unmatched_all = []
+        for row, text in enumerate(texts):
+            parsed, unmatched = self.parse(text)
+            for p in parsed:
+                amounts[row, p.index] += p.grams
+            unmatched_all.append(unmatched)
+        return amounts @ self.matrix, unmatched_all
+
+
+_table: NutrientTable | None = None
+# cache cho default recipes (không có trong DB): (id, ingredients) -> kết quả
+_default_cache: dict[tuple[int, str], dict] = {}
+
+
+def get_table() -> NutrientTable:
+    global _table
+    if _table is None:
+        _table = NutrientTable(default_ingredients)
+    return _table
+
+
+def load_nutrient_table(db: Session) -> int:
+    """Seed bảng nếu trống rồi nạp vào bộ nhớ (gọi lúc startup). Trả về số nguyên liệu."""
+    global _table
+
+    if db.query(models.IngredientNutrient.id).first() is None:
+        db.add_all(models.IngredientNutrient(**row) for row in default_ingredients)
+        db.commit()
+    else:
+        # dòng seed đã đổi tên (tránh trùng alias): cập nhật tên + alias theo seed
+        seed = {row["name"]: row for row in default_ingredients}
+        renamed = (
+            db.query(models.IngredientNutrient)
+            .filter(models.IngredientNutrient.name.in_(RENAMED_INGREDIENTS))
+            .all()
+        )
+        for r in renamed:
+            new = seed[RENAMED_INGREDIENTS[r.name]]
+            r.name, r.aliases = new["name"], new["aliases"]
+        if renamed:
+            # dinh dưỡng đã cache tính theo bảng alias cũ => tính lại khi cần
+            db.query(models.RecipeNutrition).delete()
+            db.commit()
+
+    rows = db.query(models.IngredientNutrient).order_by(models.IngredientNutrient.id).all()
+    _table = NutrientTable(
+        [
+            {c: getattr(r, c) for c in ("name", "aliases", "default_grams", "piece_grams", *NUTRIENT_KEYS)}
+            for r in rows
+        ]
+    )
+    _default_cache.clear()
+    return len(rows)
+
+
+def to_dict(values, unmatched: list[str]) -> dict:
+    data = {k: round(float(v), 1) for k, v in zip(NUTRIENT_KEYS, values)}
+    data["unmatched"] = unmatched
+    return data
+
+
+def row_to_dict(n: models.RecipeNutrition) -> dict:
+    data = {k: round(float(getattr(n, k) or 0), 1) for k in NUTRIENT_KEYS}
+    data["unmatched"] = [x for x in (n.unmatched or "").split(";") if x]
+    return data
+
+
+async def get_recipes_nutrition(db: AsyncSession, recipe_ids: list[int]) -> dict[int, dict]:
+    """
+    {recipe_id: dinh dưỡng} cho các recipe trong DB.
+    Đọc cache recipe_nutrition (1 query), phần thiếu tính cả lô bằng NumPy rồi ghi lại.
+    """
+    if not recipe_ids:
+        return {}
+
+    rows = (
+        await db.execute(
+            select(models.Recipe.id, models.Recipe.ingredients, models.RecipeNutrition)
+            .outerjoin(models.RecipeNutrition, models.RecipeNutrition.recipe_id == models.Recipe.id)
+            .where(models.Recipe.id.in_(set(recipe_ids)))
+        )
+    ).all()
+
+    result: dict[int, dict] = {}
+    missing = []
+    for rid, ingredients, cached in rows:
+        if cached is not None:
+            result[rid] = row_to_dict(cached)
+        else:
+            missing.append((rid, ingredients))
+
+    if missing:
+        values, unmatched = get_table().compute([ing for _, ing in missing])
+        for (rid, _), vals, um in zip(missing, values, unmatched):
+            db.add(
+                models.RecipeNutrition(
+                    recipe_id=rid,
+                    unmatched=";".join(um),
+                    **{k: float(v) for k, v in zip(NUTRIENT_KEYS, vals)},
+                )
+            )
+            result[rid] = to_dict(vals, um)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # request khác vừa ghi cùng recipe: kết quả giống nhau, bỏ qua
+            await db.rollback()
+
+    return result
+
+
+def get_default_recipes_nutrition(recipes: list[dict]) -> dict[int, dict]:
+    """Dinh dưỡng cho default recipes (dữ liệu tĩnh, cache trong bộ nhớ)."""
+    result: dict[int, dict] = {}
+    missing = []
+    for r in recipes:
+        key = (r["id"], r.get("ingredients") or "")
+        if key in _default_cache:
+            result[r["id"]] = _default_cache[key]
+        else:
+            missing.append(key)
+
+    if missing:
+        values, unmatched = get_table().compute([ing for _, ing in missing])
+        for key, vals, um in zip(missing, values, unmatched):
+            _default_cache[key] = result[key[0]] = to_dict(vals, um)
+    return result
+
+
+async def _sum_slots_by_date(db: AsyncSession, start, end):
+    N = models.RecipeNutrition
+    S = models.MealSlot
+    return (
+        await db.execute(
+            select(
+                S.date,
+                func.count(S.id).label("meals"),
+                # slot có recipe nhưng chưa có dòng recipe_nutrition
+                (func.count(S.id) - func.count(N.recipe_id)).label("missing"),
+                *(func.coalesce(func.sum(getattr(N, k)), 0).label(k) for k in NUTRIENT_KEYS),
+            )
+            .join(models.Recipe, models.Recipe.id == S.recipe_id)
+            .outerjoin(N, N.recipe_id == S.recipe_id)
+            .where(S.date >= start, S.date <= end)
+            .group_by(S.date)
+        )
+    ).all()
+
+
+async def sum_slot_nutrition(db: AsyncSession, start, end) -> dict[str, dict]:
+    """
+    {ngày ISO: tổng dinh dưỡng + số bữa} cho các slot trong [start, end].
+    Bình thường chỉ 1 query; nếu có recipe chưa được tính thì tính bù
+    (get_recipes_nutrition) rồi tổng lại 1 lần nữa. Ngày không có bữa nào
+    không xuất hiện trong kết quả.
+    """
+    rows = await _sum_slots_by_date(db, start, end)
+
+    if any(r.missing for r in rows):
+        S = models.MealSlot
+        ids = (
+            await db.scalars(
+                select(S.recipe_id)
+                .outerjoin(models.RecipeNutrition, models.RecipeNutrition.recipe_id == S.recipe_id)
+                .where(
+                    S.date >= start,
+                    S.date <= end,
+                    S.recipe_id.is_not(None),
+                    models.RecipeNutrition.recipe_id.is_(None),
+                )
+                .distinct()
+            )
+        ).all()
+        await get_recipes_nutrition(db, list(ids))
+        rows = await _sum_slots_by_date(db, start, end)
+
+    result: dict[str, dict] = {}
+    for r in rows:
+        data = {k: round(float(getattr(r, k) or 0), 1) for k in NUTRIENT_KEYS}
+        data["meals"] = int(r.meals)
+        result[r.date.isoformat()] = data
+    return result
+
+
+def add_totals(items) -> dict:
+    """Cộng nhiều dict kết quả (vd tổng các ngày => tổng tuần)."""
+    total = {k: 0.0 for k in NUTRIENT_KEYS}
+    total["meals"] = 0
+    for item in items:
+        for k in total:
+            total[k] += item.get(k, 0)
+    return {k: (v if k == "meals" else round(v, 1)) for k, v in total.items()}
+
+
+async def invalidate_recipe_nutrition(db: AsyncSession, recipe_id: int) -> None:
+    """Xóa cache dinh dưỡng của recipe (gọi khi ingredients có thể đã đổi)."""
+    await db.execute(
+        delete(models.RecipeNutrition).where(models.RecipeNutrition.recipe_id == recipe_id)
+    )
@@ -0,0 +1,193 @@
+"""
+Xuất toàn bộ đơn hàng cho kế toán: GET /api/shop/orders/export?format=csv|jsonl|parquet
+
+- Mỗi dòng = 1 dòng hàng (orders JOIN order_items); đơn không có item vẫn ra 1
+  dòng với cột item để trống.
+- Đọc bằng server-side cursor (AsyncSession.stream + yield_per): mỗi lần chỉ
+  giữ 1 lô EXPORT_BATCH dòng trong bộ nhớ, dù lịch sử có bao nhiêu đơn.
+- CSV / JSONL: mỗi lô encode thành 1 chunk của StreamingResponse.
+- Parquet: mỗi lô ghi thành 1 row group, byte ghi xong được gửi ngay; footer
+  gửi cuối cùng. Cần pyarrow (không bắt buộc: thiếu thì format=parquet trả 501).
+"""
+import csv
+import io
+import os
+from datetime import datetime
+
+import anyio
+import orjson
+from sqlalchemy import select
+
+from .database import AsyncSessionLocal
+from .models import Order, OrderItem
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # không có pyarrow => không xuất được parquet
+    pa = pq = None
+
+EXPORT_BATCH = int(os.getenv("ORDERS_EXPORT_BATCH", "2000"))
+
+COLUMNS = (
+    "order_id",
+    "created_at",
+    "customer_name",
+    "note",
+    "order_total",
+    "item_id",
+    "product_id",
+    "product_name",
+    "unit_price",
+    "quantity",
+    "line_total",
+)
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+def export_query(start: datetime | None, end: datetime | None):
+    q = (
+        select(
+            Order.id,
+            Order.created_at,
+            Order.customer_name,
+            Order.note,
+            Order.total_price,
+            OrderItem.id,
+            OrderItem.product_id,
+            OrderItem.product_name,
+            OrderItem.unit_price,
+            OrderItem.quantity,
+        )
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .order_by(Order.id, OrderItem.id)
+    )
+    if start is not None:
+        q = q.where(Order.created_at >= start)
+    if end is not None:
+        q = q.where(Order.created_at < end)
+    return q
+
+
+def _row(r) -> tuple:
+    (order_id, created_at, customer, note, total, item_id, product_id, name, price, qty) = r
+    line_total = price * qty if price is not None and qty is not None else None
+    return (order_id, created_at, customer, note, total, item_id, product_id, name, price, qty, line_total)
+
+
+async def iter_batches(start: datetime | None, end: datetime | None):
+    """Các lô dòng (tuple theo COLUMNS). Session riêng: stream chạy sau khi route trả về."""
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            export_query(start, end).execution_options(yield_per=EXPORT_BATCH)
+        )
+        async for partition in result.partitions():
+            yield [_row(r) for r in partition]
+
+
+# =========================
+# CSV / JSONL
+# =========================
+async def iter_csv(start: datetime | None, end: datetime | None):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM: Excel mới nhận đúng tiếng Việt trong file UTF-8
+    buf.write("\ufeff")
+    writer.writerow(COLUMNS)
+
+    async for batch in iter_batches(start, end):
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+async def iter_jsonl(start: datetime | None, end: datetime | None):
+    async for batch in iter_batches(start, end):
+        yield b"".join(
+            orjson.dumps(dict(zip(COLUMNS, r)), option=orjson.OPT_APPEND_NEWLINE) for r in batch
+        )
+
+
+# =========================
+# PARQUET
+# =========================
+class _ChunkSink(io.RawIOBase):
+    """File-like cho ParquetWriter: giữ byte vừa ghi để gửi đi rồi bỏ."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_schema():
+    return pa.schema(
+        [
+            ("order_id", pa.int64()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+            ("customer_name", pa.string()),
+            ("note", pa.string()),
+            ("order_total", pa.int64()),
+            ("item_id", pa.int64()),
+            ("product_id", pa.int64()),
+            ("product_name", pa.string()),
+            ("unit_price", pa.int64()),
+            ("quantity", pa.int64()),
+            ("line_total", pa.int64()),
+        ]
+    )
+
+
+async def iter_parquet(start: datetime | None, end: datetime | None):
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def write_batch(batch: list[tuple]) -> bytes:
+        columns = list(zip(*batch))
+        table = pa.Table.from_arrays(
+            [pa.array(col, type=f.type) for col, f in zip(columns, schema)], schema=schema
+        )
+        writer.write_table(table, row_group_size=len(batch))
+        return sink.drain()
+
+    async for batch in iter_batches(start, end):
+        # nén + encode tốn CPU: chạy ngoài event loop
+        data = await anyio.to_thread.run_sync(write_batch, batch)
+        if data:
+            yield data
+
+    # footer (schema + vị trí các row group)
+    writer.close()
+    yield sink.drain()
+
+
+EXPORTERS = {"csv": iter_csv, "jsonl": iter_jsonl, "parquet": iter_parquet}
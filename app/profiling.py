@@ -0,0 +1,186 @@
+"""
+Profile request theo yêu cầu / lấy mẫu, ghi file speedscope (https://www.speedscope.app).
+
+- Header X-Profile: <PROFILE_TOKEN> => profile đúng request đó (vd khi
+  list_recipes / planner_week chậm trên production).
+- PROFILE_SAMPLE_RATE (0..1): profile ngẫu nhiên 1 phần request.
+- Profiler thống kê (pyinstrument, async_mode): chỉ tính thời gian của task
+  đang xử lý request, thời gian chờ await (DB, mạng) hiện thành frame riêng.
+  Route `def` chạy trong threadpool => chỉ thấy phần await của event loop.
+- File PROFILE_DIR/<thời gian>-<method>-<route>.speedscope.json gồm 2 profile:
+  "request" (call stack) và "SQL" (từng câu SQL + thời gian, cùng trục thời gian).
+  Response có header X-Profile-File = tên file.
+- Tắt (mặc định: không token, sample rate 0) => không thêm middleware, không
+  gắn event SQL: không tốn gì. Mỗi process profile tối đa 1 request cùng lúc.
+- pyinstrument không bắt buộc: thiếu thì chỉ in cảnh báo lúc khởi động.
+"""
+import json
+import os
+import random
+import re
+import secrets
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+import anyio
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+
+from .metrics import route_label
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # không có pyinstrument => không profile được
+    Profiler = SpeedscopeRenderer = None
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(ROOT_DIR / "profiles")))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))  # giữ N file mới nhất
+PROFILE_HEADER = "x-profile"
+
+
+def profiling_requested() -> bool:
+    return bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+
+def profiling_enabled() -> bool:
+    if not profiling_requested():
+        return False
+    if Profiler is None:
+        print("PROFILE_TOKEN / PROFILE_SAMPLE_RATE đã đặt nhưng chưa cài pyinstrument: bỏ qua profiling")
+        return False
+    return True
+
+
+# =========================
+# SQL TRONG REQUEST ĐANG PROFILE
+# =========================
+# (bắt đầu, kết thúc, câu SQL), thời gian perf_counter
+_profile_sql: ContextVar[list | None] = ContextVar("profile_sql", default=None)
+
+
+def instrument_engine(engine) -> None:
+    """Ghi lại câu SQL của request đang profile (sync Engine / async_engine.sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _profile_sql.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        statements = _profile_sql.get()
+        if statements is not None and conn.info.get("profile_start"):
+            statements.append((conn.info["profile_start"].pop(), time.perf_counter(), statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("profile_start"):
+            conn.info["profile_start"].pop()
+
+
+# =========================
+# FILE SPEEDSCOPE
+# =========================
+def sql_profile(statements: list, started: float, duration: float, frames: list) -> dict:
+    """Profile 'evented' của speedscope: mỗi câu SQL là 1 frame mở / đóng."""
+    index: dict[str, int] = {}
+    events = []
+    for begin, end, statement in sorted(statements):
+        name = " ".join(statement.split())
+        if name not in index:
+            index[name] = len(frames)
+            frames.append({"name": name})
+        events.append({"type": "O", "frame": index[name], "at": begin - started})
+        events.append({"type": "C", "frame": index[name], "at": end - started})
+    return {
+        "type": "evented",
+        "name": f"SQL ({len(statements)} câu, {sum(e - b for b, e, _ in statements) * 1000:.1f} ms)",
+        "unit": "seconds",
+        "startValue": 0,
+        "endValue": duration,
+        "events": events,
+    }
+
+
+def write_profile(path: Path, session, title: str, statements: list, started: float, duration: float) -> None:
+    data = json.loads(SpeedscopeRenderer().render(session))
+    data["name"] = title
+    data["profiles"][0]["name"] = "request"
+    data["profiles"].append(sql_profile(statements, started, duration, data["shared"]["frames"]))
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+    # dọn file cũ
+    files = sorted(PROFILE_DIR.glob("*.speedscope.json"))
+    for old in files[: max(len(files) - PROFILE_KEEP, 0)]:
+        old.unlink(missing_ok=True)
+
+
+def profile_filename(method: str, path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return f"{stamp}-{method}-{slug}.speedscope.json"
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+class ProfilingMiddleware:
+    """ASGI middleware thuần; chỉ được thêm vào app khi profiling_enabled()."""
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = False
+
+    def should_profile(self, scope) -> bool:
+        if self._busy:
+            return False
+        if PROFILE_TOKEN:
+            value = Headers(scope=scope).get(PROFILE_HEADER)
+            if value and secrets.compare_digest(value, PROFILE_TOKEN):
+                return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        filename = profile_filename(scope["method"], scope["path"])
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message.setdefault("headers", [])).append("X-Profile-File", filename)
+            await send(message)
+
+        statements: list = []
+        token = _profile_sql.set(statements)
+        profiler = Profiler(interval=PROFILE_INTERVAL_MS / 1000, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            session = profiler.stop()
+            duration = time.perf_counter() - started
+            _profile_sql.reset(token)
+            title = f"{scope['method']} {route_label(scope)} ({duration * 1000:.1f} ms)"
+            try:
+                # render + ghi file ngoài event loop
+                await anyio.to_thread.run_sync(
+                    write_profile, PROFILE_DIR / filename, session, title, statements, started, duration
+                )
+            except Exception as e:
+                print("PROFILE WRITE ERROR:", e)
+            finally:
+                self._busy = False
@@ -0,0 +1,100 @@
+"""
+Giới hạn tần suất theo token bucket (trong bộ nhớ process).
+
+- Mỗi key (vd "email:a@b.com", "ip:1.2.3.4") có 1 xô `burst` token, nạp lại
+  `rate_per_min` token / phút. Mỗi lần thử tốn 1 token; hết token => 429 kèm
+  Retry-After.
+- Số key giới hạn (LRU): IP giả mạo hàng loạt không làm phình bộ nhớ; key bị
+  đẩy ra coi như xô đầy (an toàn vì key đó lâu không gửi request).
+- Chạy nhiều worker thì mỗi worker 1 bộ đếm riêng: giới hạn thực tế = số worker x rate.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, rate_per_min: float, burst: int, max_keys: int = 100_000):
+        self.name = name
+        self.rate = rate_per_min / 60.0  # token / giây
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> (số token, thời điểm cập nhật)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self.rejected = 0
+
+    def take(self, key: str) -> float:
+        """Lấy 1 token. Trả về 0 nếu được phép, ngược lại số giây phải chờ."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                wait = (1 - tokens) / self.rate if self.rate > 0 else 60.0
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._buckets),
+            "rate_per_min": round(self.rate * 60, 3),
+            "burst": self.burst,
+            "rejected": self.rejected,
+        }
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def enforce(*checks: tuple[TokenBucketLimiter, str]) -> None:
+    """Lấy token ở mọi limiter; 1 cái hết => 429 (Retry-After = lâu nhất)."""
+    wait = max((limiter.take(key) for limiter, key in checks), default=0.0)
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Thử quá nhiều lần, vui lòng đợi rồi thử lại",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+# =========================
+# GIỚI HẠN CHO AUTH
+# =========================
+# sai mật khẩu / dò mật khẩu 1 tài khoản
+login_email_limiter = TokenBucketLimiter(
+    "login_email",
+    rate_per_min=float(os.getenv("LOGIN_RATE_PER_MIN_EMAIL", "5")),
+    burst=int(os.getenv("LOGIN_BURST_EMAIL", "5")),
+)
+# credential stuffing: 1 IP thử nhiều tài khoản
+login_ip_limiter = TokenBucketLimiter(
+    "login_ip",
+    rate_per_min=float(os.getenv("LOGIN_RATE_PER_MIN_IP", "30")),
+    burst=int(os.getenv("LOGIN_BURST_IP", "20")),
+)
+# register / reset-password cũng phải hash mật khẩu
+register_ip_limiter = TokenBucketLimiter(
+    "register_ip",
+    rate_per_min=float(os.getenv("REGISTER_RATE_PER_MIN_IP", "10")),
+    burst=int(os.getenv("REGISTER_BURST_IP", "10")),
+)
+
+
+def limiter_stats() -> dict:
+    return {
+        lim.name: lim.stats()
+        for lim in (login_email_limiter, login_ip_limiter, register_ip_limiter)
+    }
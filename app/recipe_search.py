@@ -0,0 +1,172 @@
+"""
+Tìm kiếm công thức phía server (full-text, không phân biệt dấu).
+
+- Mỗi Recipe có 1 dòng RecipeSearch chứa title/ingredients đã bỏ dấu
+  ("Cá hồi" -> "ca hoi"), cập nhật cùng transaction với recipe.
+- Postgres: GIN index trên biểu thức tsvector (title trọng số A, ingredients B),
+  xếp hạng bằng ts_rank.
+- SQLite: bảng FTS5 external-content `recipe_search_fts` đồng bộ bằng trigger,
+  xếp hạng bằng bm25.
+- DB khác / SQLite không có FTS5: fallback LIKE (chậm hơn nhưng vẫn đúng).
+"""
+import re
+import unicodedata
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+# title được ưu tiên hơn ingredients khi xếp hạng
+PG_TSVECTOR = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', ingredients), 'B')"
+)
+
+SQLITE_FTS_TABLE = "recipe_search_fts"
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        title, ingredients,
+        content='recipe_search', content_rowid='recipe_id',
+        tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS recipe_search_ai AFTER INSERT ON recipe_search BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, ingredients)
+        VALUES (new.recipe_id, new.title, new.ingredients);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS recipe_search_ad AFTER DELETE ON recipe_search BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, ingredients)
+        VALUES ('delete', old.recipe_id, old.title, old.ingredients);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS recipe_search_au AFTER UPDATE ON recipe_search BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, ingredients)
+        VALUES ('delete', old.recipe_id, old.title, old.ingredients);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, ingredients)
+        VALUES (new.recipe_id, new.title, new.ingredients);
+    END""",
+]
+
+# backend thực tế, xác định lúc startup: "postgresql" | "fts5" | "like"
+_backend = "like"
+
+
+def fold_text(s: str | None) -> str:
+    """Lowercase + bỏ dấu tiếng Việt: 'Cá Hồi, Đậu' -> 'ca hoi, dau'."""
+    s = (s or "").replace("đ", "d").replace("Đ", "D")
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.lower().split())
+
+
+def tokenize(s: str | None) -> list[str]:
+    return re.findall(r"[0-9a-z]+", fold_text(s))
+
+
+def index_recipe(recipe: models.Recipe) -> None:
+    """Gắn/cập nhật văn bản tìm kiếm cho recipe (flush cùng session của recipe)."""
+    title = fold_text(recipe.title)
+    ingredients = fold_text(recipe.ingredients)
+
+    if recipe.search_doc is None:
+        recipe.search_doc = models.RecipeSearch(title=title, ingredients=ingredients)
+    else:
+        recipe.search_doc.title = title
+        recipe.search_doc.ingredients = ingredients
+
+
+def backfill_search_docs(db: Session) -> int:
+    """Tạo RecipeSearch cho các recipe chưa có (dữ liệu cũ). Trả về số dòng tạo mới."""
+    missing = (
+        db.query(models.Recipe)
+        .outerjoin(models.RecipeSearch)
+        .filter(models.RecipeSearch.recipe_id.is_(None))
+        .all()
+    )
+    for r in missing:
+        index_recipe(r)
+    db.commit()
+    return len(missing)
+
+
+def setup_search_index(engine) -> str:
+    """Tạo index theo dialect (gọi sau create_all). Trả về backend đang dùng."""
+    global _backend
+
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_recipe_search_tsv "
+                    f"ON recipe_search USING GIN (({PG_TSVECTOR}))"
+                )
+            )
+            _backend = "postgresql"
+        elif dialect == "sqlite":
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :n"),
+                {"n": SQLITE_FTS_TABLE},
+            ).first()
+            try:
+                for stmt in SQLITE_FTS_DDL:
+                    conn.execute(text(stmt))
+                # bảng FTS mới tạo: index lại các dòng recipe_search đã có
+                if not existed:
+                    conn.execute(
+                        text(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+                    )
+                _backend = "fts5"
+            except Exception as e:
+                print("FTS5 không khả dụng, dùng LIKE:", e)
+                _backend = "like"
+        else:
+            _backend = "like"
+
+    return _backend
+
+
+async def search_recipe_ids(db: AsyncSession, q: str, limit: int, offset: int = 0) -> list[int]:
+    """Trả về recipe_id theo thứ tự liên quan giảm dần."""
+    tokens = tokenize(q)
+    if not tokens:
+        return []
+
+    if _backend == "postgresql":
+        # token chỉ gồm [0-9a-z] nên ghép tsquery an toàn; ':*' = khớp tiền tố
+        rows = await db.execute(
+            text(
+                f"""
+                SELECT s.recipe_id, ts_rank({PG_TSVECTOR}, q) AS rank
+                FROM recipe_search s, to_tsquery('simple', :tsq) q
+                WHERE ({PG_TSVECTOR}) @@ q
+                ORDER BY rank DESC, s.recipe_id DESC
+                LIMIT :limit OFFSET :offset
+                """
+            ),
+            {"tsq": " & ".join(f"{t}:*" for t in tokens), "limit": limit, "offset": offset},
+        )
+        return [int(r.recipe_id) for r in rows]
+
+    if _backend == "fts5":
+        rows = await db.execute(
+            text(
+                f"""
+                SELECT rowid AS recipe_id
+                FROM {SQLITE_FTS_TABLE}
+                WHERE {SQLITE_FTS_TABLE} MATCH :match
+                ORDER BY bm25({SQLITE_FTS_TABLE}, 10.0, 1.0), rowid DESC
+                LIMIT :limit OFFSET :offset
+                """
+            ),
+            {"match": " AND ".join(f'"{t}"*' for t in tokens), "limit": limit, "offset": offset},
+        )
+        return [int(r.recipe_id) for r in rows]
+
+    # fallback: mọi token phải xuất hiện ở title hoặc ingredients
+    S = models.RecipeSearch
+    qry = select(S.recipe_id)
+    for t in tokens:
+        qry = qry.where(or_(S.title.contains(t), S.ingredients.contains(t)))
+    rows = await db.scalars(qry.order_by(S.recipe_id.desc()).limit(limit).offset(offset))
+    return [int(rid) for rid in rows]
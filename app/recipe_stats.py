@@ -0,0 +1,109 @@
+"""
+Thống kê đánh giá tính sẵn cho mỗi công thức (bảng recipe_stats).
+
+- create_recipe tạo dòng (0, 0); create_review cộng dồn bằng 1 câu UPDATE
+  nguyên tử trong cùng transaction với review.
+- Xóa recipe: dòng stats bị xóa theo (cascade).
+- Endpoint đọc chỉ đọc recipe_stats, không GROUP BY recipe_reviews.
+
+Sửa / dựng lại từ recipe_reviews:
+    python -m app.recipe_stats            # dựng lại toàn bộ
+    python -m app.recipe_stats --missing  # chỉ tạo dòng còn thiếu
+"""
+import argparse
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def stats_to_dict(st: models.RecipeStats | None) -> dict:
+    count = int(st.review_count or 0) if st else 0
+    total = int(st.rating_sum or 0) if st else 0
+    return {
+        "avg_rating": round(total / count, 2) if count else 0.0,
+        "review_count": count,
+    }
+
+
+def init_stats(recipe: models.Recipe) -> None:
+    """Gắn dòng stats rỗng cho recipe mới (flush cùng recipe)."""
+    if recipe.stats is None:
+        recipe.stats = models.RecipeStats(rating_sum=0, review_count=0)
+
+
+async def add_review_to_stats(db: AsyncSession, recipe_id: int, rating: int) -> None:
+    """Cộng 1 review vào stats. Không commit: caller commit cùng review."""
+    S = models.RecipeStats
+    res = await db.execute(
+        update(S)
+        .where(S.recipe_id == recipe_id)
+        .values(rating_sum=S.rating_sum + rating, review_count=S.review_count + 1)
+    )
+    if res.rowcount == 0:
+        # recipe cũ chưa có dòng stats: tính lại từ recipe_reviews (đã gồm review mới)
+        await db.flush()
+        total, count = (
+            await db.execute(
+                select(
+                    func.coalesce(func.sum(models.RecipeReview.rating), 0),
+                    func.count(models.RecipeReview.id),
+                ).where(models.RecipeReview.recipe_id == recipe_id)
+            )
+        ).one()
+        db.add(S(recipe_id=recipe_id, rating_sum=int(total), review_count=int(count)))
+
+
+def rebuild_recipe_stats(db: Session, only_missing: bool = False) -> int:
+    """
+    Dựng lại recipe_stats từ recipe_reviews (1 query GROUP BY cho tất cả).
+    only_missing=True: chỉ tạo dòng cho recipe chưa có (dùng lúc startup).
+    Trả về số dòng đã ghi.
+    """
+    agg = {
+        int(row.recipe_id): (int(row.rating_sum or 0), int(row.review_count or 0))
+        for row in db.query(
+            models.RecipeReview.recipe_id.label("recipe_id"),
+            func.sum(models.RecipeReview.rating).label("rating_sum"),
+            func.count(models.RecipeReview.id).label("review_count"),
+        ).group_by(models.RecipeReview.recipe_id)
+    }
+
+    q = db.query(models.Recipe.id, models.RecipeStats).outerjoin(
+        models.RecipeStats, models.RecipeStats.recipe_id == models.Recipe.id
+    )
+    if only_missing:
+        q = q.filter(models.RecipeStats.recipe_id.is_(None))
+
+    written = 0
+    for recipe_id, st in q.all():
+        total, count = agg.get(recipe_id, (0, 0))
+        if st is None:
+            db.add(models.RecipeStats(recipe_id=recipe_id, rating_sum=total, review_count=count))
+        elif (st.rating_sum, st.review_count) != (total, count):
+            st.rating_sum = total
+            st.review_count = count
+        else:
+            continue
+        written += 1
+
+    db.commit()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dựng lại bảng recipe_stats từ recipe_reviews")
+    parser.add_argument("--missing", action="store_true", help="chỉ tạo dòng còn thiếu")
+    args = parser.parse_args()
+
+    from .database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        n = rebuild_recipe_stats(db, only_missing=args.missing)
+        print(f"recipe_stats: đã cập nhật {n} dòng")
+    finally:
+        db.close()
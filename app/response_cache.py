@@ -0,0 +1,197 @@
+"""
+Cache response JSON trong bộ nhớ process cho các API danh mục đọc nhiều, ít đổi
+(/api/recipes/, /api/shop/products, /api/student/recipes, /api/gym/recipes).
+
+- Key = path + query string (đã sắp xếp) => ?category=a&x=1 và ?x=1&category=a
+  dùng chung 1 entry. Giá trị là body JSON đã encode sẵn (hit không phải encode lại).
+- Giới hạn: TTL (RESPONSE_CACHE_TTL giây) + LRU (RESPONSE_CACHE_MAX_ENTRIES entry).
+- Write-through: mỗi entry gắn tag ("recipes", "products") và lưu version của
+  tag lúc bắt đầu đọc DB. Route ghi gọi invalidate(tag) sau commit => version
+  tăng, entry cũ coi như hết hạn ngay ở lần đọc kế tiếp.
+- Version tag nằm trong VersionBackend: mặc định LocalVersions (1 process).
+  Chạy nhiều worker thì thay bằng backend dùng chung (Redis INCR, bảng DB...)
+  qua set_version_backend() => 1 worker ghi, mọi worker đều bỏ cache cũ.
+  Interface là async (backend qua mạng không chặn event loop) và chỉ được gọi
+  ngoài lock của cache: mỗi request đọc version 1 lần rồi mới tra entry.
+- RESPONSE_CACHE_TTL=0 => tắt cache.
+"""
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+# tag dùng bởi route đọc / ghi
+RECIPES = "recipes"
+PRODUCTS = "products"
+
+
+# =========================
+# VERSION BACKEND (chia sẻ invalidation)
+# =========================
+class VersionBackend(ABC):
+    """
+    Giữ version của từng tag. Backend dùng chung giữa các worker chỉ cần cài 2
+    hàm async này (vd redis.asyncio: GET / INCR key "cache:v:<tag>"); thiếu hàm
+    nào thì lỗi ngay khi tạo backend.
+    """
+
+    @abstractmethod
+    async def version(self, tag: str) -> int: ...
+
+    @abstractmethod
+    async def bump(self, tag: str) -> int: ...
+
+
+class LocalVersions(VersionBackend):
+    """Version trong bộ nhớ: chỉ đúng khi chạy 1 process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: dict[str, int] = {}
+
+    async def version(self, tag: str) -> int:
+        return self._versions.get(tag, 0)
+
+    async def bump(self, tag: str) -> int:
+        with self._lock:
+            v = self._versions.get(tag, 0) + 1
+            self._versions[tag] = v
+            return v
+
+
+# =========================
+# TTL + LRU
+# =========================
+class ResponseCache:
+    def __init__(
+        self,
+        ttl: float = CACHE_TTL,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        versions: VersionBackend | None = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.versions = versions or LocalVersions()
+        self._lock = threading.Lock()
+        # key -> (hết hạn lúc, body, tag versions lúc tạo)
+        self._entries: OrderedDict[str, tuple[float, bytes, tuple]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # bị đẩy ra do vượt max_entries
+        self.expired = 0  # quá TTL
+        self.stale = 0  # tag đã bị invalidate
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    async def tag_versions(self, tags: Iterable[str]) -> tuple:
+        # gọi backend ngoài self._lock: backend chậm không chặn các lookup khác
+        return tuple([(t, await self.versions.version(t)) for t in tags])
+
+    def get(self, key: str, versions: tuple) -> bytes | None:
+        """versions: kết quả tag_versions() của request hiện tại."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires, body, _ = entry
+            if now >= expires:
+                self.expired += 1
+            elif entry[2] != versions:
+                self.stale += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, body: bytes, versions: tuple) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, body, versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def invalidate(self, *tags: str) -> None:
+        for t in tags:
+            await self.versions.bump(t)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "stale": self.stale,
+            "version_backend": type(self.versions).__name__,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def set_version_backend(backend: VersionBackend) -> None:
+    """Gọi lúc startup (trước khi nhận request) để dùng invalidation chung giữa các worker."""
+    response_cache.versions = backend
+    response_cache.clear()
+
+
+async def invalidate(*tags: str) -> None:
+    """Route ghi gọi SAU commit: await invalidate(tag)."""
+    await response_cache.invalidate(*tags)
+
+
+def cache_key(request: Request) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+async def cached_json(
+    request: Request,
+    tags: tuple[str, ...],
+    produce: Callable[[], Awaitable],
+) -> Response:
+    """
+    Trả body JSON từ cache, hoặc gọi produce() (đọc DB) rồi lưu lại.
+    Version tag được chụp TRƯỚC khi đọc DB: nếu có ghi chen giữa thì entry vừa
+    lưu đã cũ sẵn và bị bỏ ở lần đọc sau, không giữ dữ liệu cũ tới hết TTL.
+    """
+    if not response_cache.enabled:
+        return ORJSONResponse(jsonable_encoder(await produce()))
+
+    key = cache_key(request)
+    versions = await response_cache.tag_versions(tags)
+    body = response_cache.get(key, versions)
+    if body is not None:
+        return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+    response = ORJSONResponse(jsonable_encoder(await produce()), headers={"X-Cache": "MISS"})
+    response_cache.set(key, response.body, versions)
+    return response
@@ -1,10 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import models, schemas
-from .database import get_db
-from .auth_utils import hash_password, verify_password
+from .database import get_async_db
+from .auth_utils import HashPoolBusy, hash_password_async, verify_password_async
+from .tokens import (
+    TokenError,
+    TokenUser,
+    decode_token,
+    get_current_user,
+    issue_token_pair,
+    revoke,
+)
+from .rate_limit import (
+    client_ip,
+    enforce,
+    login_email_limiter,
+    login_ip_limiter,
+    register_ip_limiter,
+)
 
 # Biến router PHẢI tên là "router"
 router = APIRouter(
@@ -13,12 +29,32 @@ router = APIRouter(
 )
 
 
+async def get_user_by_email(db: AsyncSession, email: str) -> models.User | None:
+    return await db.scalar(select(models.User).where(models.User.email == email).limit(1))
+
+
+async def run_hash(coro):
+    """Hash / verify trong process pool (auth_utils); pool quá tải => 503."""
+    try:
+        return await coro
+    except HashPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hệ thống đang bận, vui lòng thử lại sau",
+            headers={"Retry-After": "1"},
+        )
+
+
 # =========================
 # AUTH: REGISTER / LOGIN
 # =========================
 @router.post("/register", response_model=schemas.UserOut)
-def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == user_in.email).first()
+async def register(
+    user_in: schemas.UserCreate, request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    enforce((register_ip_limiter, client_ip(request)))
+
+    existing = await get_user_by_email(db, user_in.email)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,35 +64,104 @@ def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     user = models.User(
         email=user_in.email,
         full_name=user_in.full_name,
-        hashed_password=hash_password(user_in.password),
+        # hash tốn CPU: chạy trong process pool riêng, không chặn event loop / threadpool
+        hashed_password=await run_hash(hash_password_async(user_in.password)),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return user
 
 
 @router.post("/login")
-def login(data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == data.email).first()
-    if not user or not verify_password(data.password, user.hashed_password):
+async def login(
+    data: schemas.UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    # chặn dò mật khẩu trước khi tốn CPU hash: theo email và theo IP
+    enforce(
+        (login_email_limiter, str(data.email).lower()),
+        (login_ip_limiter, client_ip(request)),
+    )
+
+    user = await get_user_by_email(db, data.email)
+    # không có user vẫn verify hash giả: thời gian phản hồi như nhau
+    ok, new_hash = await run_hash(
+        verify_password_async(data.password, user.hashed_password if user else None)
+    )
+    if not ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Sai email hoặc mật khẩu",
         )
 
-    # Trả JSON cho frontend lưu localStorage
+    if new_hash:
+        # hash cũ (ít vòng hơn PASSWORD_HASH_ROUNDS): lưu hash mới
+        user.hashed_password = new_hash
+        await db.commit()
+
+    # Trả JSON cho frontend lưu localStorage (+ token cho các API cần đăng nhập)
     return {
         "message": "Đăng nhập thành công",
         "user": {"id": user.id, "email": user.email, "full_name": user.full_name},
+        **issue_token_pair(user),
     }
 
 
+# =========================
+# TOKEN: REFRESH / LOGOUT / ME
+# =========================
+class RefreshIn(BaseModel):
+    refresh_token: str
+
+
+class LogoutIn(BaseModel):
+    refresh_token: str | None = None
+
+
+def token_user(claims: dict) -> models.User:
+    """User dựng từ claims (không query DB) để ký token mới."""
+    return models.User(id=int(claims["sub"]), email=claims.get("email"), full_name=claims.get("name"))
+
+
+@router.post("/refresh")
+async def refresh_token(data: RefreshIn, db: AsyncSession = Depends(get_async_db)):
+    """Đổi refresh token lấy cặp token mới; refresh token cũ bị thu hồi (dùng 1 lần)."""
+    try:
+        claims = decode_token(data.refresh_token, "refresh")
+    except TokenError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+
+    # đổi token nguyên tử: chỉ request insert được jti mới nhận cặp token mới
+    if not await revoke(db, claims):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token đã bị thu hồi")
+    return issue_token_pair(token_user(claims))
+
+
+@router.post("/logout")
+async def logout(
+    data: LogoutIn | None = None,
+    current: TokenUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await revoke(db, current.claims)
+    if data and data.refresh_token:
+        try:
+            await revoke(db, decode_token(data.refresh_token, "refresh"))
+        except TokenError:
+            pass  # refresh token đã hết hạn / thu hồi: không cần làm gì
+    return {"message": "Đã đăng xuất"}
+
+
+@router.get("/me")
+def me(current: TokenUser = Depends(get_current_user)):
+    # chỉ đọc từ access token, không query users
+    return {"id": current.id, "email": current.email, "full_name": current.full_name}
+
+
 # =========================
 # FORGOT PASSWORD (STEP 1)
 # =========================
 @router.post("/forgot-password")
-def forgot_password(email: str, db: Session = Depends(get_db)):
+async def forgot_password(email: str, db: AsyncSession = Depends(get_async_db)):
     """
     Demo: Nhận email qua query param:
     POST /api/auth/forgot-password?email=abc@gmail.com
@@ -68,7 +173,7 @@ def forgot_password(email: str, db: Session = Depends(get_db)):
     if not email:
         raise HTTPException(status_code=422, detail="Thiếu email")
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await get_user_by_email(db, email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -89,7 +194,9 @@ class ResetPasswordIn(BaseModel):
 
 
 @router.post("/reset-password")
-def reset_password(data: ResetPasswordIn, db: Session = Depends(get_db)):
+async def reset_password(
+    data: ResetPasswordIn, request: Request, db: AsyncSession = Depends(get_async_db)
+):
     """
     Đổi mật khẩu trực tiếp (demo).
     Frontend gửi JSON:
@@ -98,6 +205,11 @@ def reset_password(data: ResetPasswordIn, db: Session = Depends(get_db)):
       "new_password": "123456"
     }
     """
+    enforce(
+        (login_email_limiter, str(data.email).lower()),
+        (register_ip_limiter, client_ip(request)),
+    )
+
     new_password = (data.new_password or "").strip()
     if len(new_password) < 6:
         raise HTTPException(
@@ -105,15 +217,15 @@ def reset_password(data: ResetPasswordIn, db: Session = Depends(get_db)):
             detail="Mật khẩu mới phải có ít nhất 6 ký tự",
         )
 
-    user = db.query(models.User).filter(models.User.email == str(data.email)).first()
+    user = await get_user_by_email(db, str(data.email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Không tìm thấy tài khoản với email này",
         )
 
-    user.hashed_password = hash_password(new_password)
+    user.hashed_password = await run_hash(hash_password_async(new_password))
     db.add(user)
-    db.commit()
+    await db.commit()
 
     return {"message": "Đổi mật khẩu thành công (demo). Bạn có thể đăng nhập lại."}
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Query
-from .default_recipes import default_recipes
+from .default_recipes import get_catalog
 
 router = APIRouter(prefix="/default-recipes", tags=["Default Recipes"])
 
@@ -9,24 +9,13 @@ def get_default_recipes(
     search: str | None = Query(None),
     category: str | None = Query(None),
 ):
-    results = default_recipes
-
-    if search:
-        s = search.lower()
-        results = [
-            r for r in results
-            if s in r["title"].lower() or s in r["ingredients"].lower()
-        ]
-
-    if category:
-        results = [r for r in results if r["category"].lower() == category.lower()]
-
-    return results
+    # không phân biệt dấu: "ca hoi" khớp "Cá hồi" (index token dựng sẵn, xem default_recipes.py)
+    return get_catalog().search(search, category)
 
 
 @router.get("/{recipe_id}")
 def get_default_recipe(recipe_id: int):
-    recipe = next((r for r in default_recipes if r["id"] == recipe_id), None)
+    recipe = get_catalog().get(recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Không tìm thấy công thức")
     return recipe
@@ -2,14 +2,14 @@ from typing import List
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import get_db
-from . import models, schemas
+from .database import get_async_db
+from . import models, response_cache, schemas
+from .templating import templates
 
 router = APIRouter(tags=["gym-planner"])
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/gym/planner", response_class=HTMLResponse)
@@ -21,12 +21,17 @@ def gym_planner_page(request: Request):
 
 
 @router.get("/api/gym/recipes", response_model=List[schemas.RecipeOutWithSource])
-def get_gym_recipes(db: Session = Depends(get_db)):
-    recipes = db.query(models.Recipe).filter(models.Recipe.category == "healthy").all()
-
-    out: list[schemas.RecipeOutWithSource] = []
-    for r in recipes:
-        base = schemas.RecipeOut.model_validate(r, from_attributes=True).model_dump()
-        base["source"] = "gym"
-        out.append(schemas.RecipeOutWithSource(**base))
-    return out
+async def get_gym_recipes(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def produce():
+        recipes = (
+            await db.scalars(select(models.Recipe).where(models.Recipe.category == "healthy"))
+        ).all()
+
+        out: list[schemas.RecipeOutWithSource] = []
+        for r in recipes:
+            base = schemas.RecipeOut.model_validate(r, from_attributes=True).model_dump()
+            base["source"] = "gym"
+            out.append(schemas.RecipeOutWithSource(**base))
+        return out
+
+    return await response_cache.cached_json(request, (response_cache.RECIPES,), produce)
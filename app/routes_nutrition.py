@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import get_async_db
+from .default_recipes import get_catalog
+from .nutrition import get_default_recipes_nutrition, get_recipes_nutrition
+
+router = APIRouter(prefix="/api/nutrition", tags=["Nutrition"])
+
+MAX_BATCH = 500
+
+
+class NutritionBatchIn(BaseModel):
+    recipe_ids: list[int] = Field(default_factory=list, max_length=MAX_BATCH)
+    default_recipe_ids: list[int] = Field(default_factory=list, max_length=MAX_BATCH)
+
+
+@router.post("/batch")
+async def nutrition_batch(payload: NutritionBatchIn, db: AsyncSession = Depends(get_async_db)):
+    """
+    Tính dinh dưỡng (calories/protein/carbs/fat/fiber/sugar/sodium) cho nhiều món 1 lần.
+    Body: {"recipe_ids": [1, 2], "default_recipe_ids": [1]}
+    """
+    user = await get_recipes_nutrition(db, payload.recipe_ids)
+
+    defaults = get_default_recipes_nutrition(
+        get_catalog().get_many(dict.fromkeys(payload.default_recipe_ids))
+    )
+
+    results = [
+        {"source": "user", "id": rid, "nutrition": user[rid]}
+        for rid in payload.recipe_ids
+        if rid in user
+    ] + [
+        {"source": "default", "id": rid, "nutrition": defaults[rid]}
+        for rid in payload.default_recipe_ids
+        if rid in defaults
+    ]
+
+    return {
+        "results": results,
+        "not_found": {
+            "recipe_ids": [rid for rid in payload.recipe_ids if rid not in user],
+            "default_recipe_ids": [rid for rid in payload.default_recipe_ids if rid not in defaults],
+        },
+    }
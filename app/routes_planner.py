@@ -1,17 +1,29 @@
+import hashlib
+import json
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import func, inspect, or_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import get_db
+from .compression import etag_matches
+from .database import get_async_db
 from . import models
+from .nutrition import NUTRIENT_KEYS, add_totals, sum_slot_nutrition
 
 router = APIRouter(prefix="/planner", tags=["meal-planner"])
 
 MEAL_TYPES = ["breakfast", "lunch", "dinner"]
 
+MAX_RANGE_DAYS = 62  # /range: đủ cho view tháng (kể cả tuần đầu/cuối tràn sang)
+CATALOG_PAGE_SIZE = 100
+CATALOG_PAGE_SIZE_MAX = 500
+CATALOG_MAX_AGE = 60  # giây browser được dùng lại trang catalog không cần hỏi lại
+MAX_SLOTS_PER_BATCH = MAX_RANGE_DAYS * len(MEAL_TYPES)
+
 
 class SlotPayload(BaseModel):
     date: str
@@ -20,6 +32,10 @@ class SlotPayload(BaseModel):
     note: str | None = ""
 
 
+class SlotsPayload(BaseModel):
+    slots: List[SlotPayload] = Field(..., min_length=1, max_length=MAX_SLOTS_PER_BATCH)
+
+
 def get_week_range(start: Optional[date] = None) -> List[date]:
     if start is None:
         start = date.today()
@@ -27,27 +43,37 @@ def get_week_range(start: Optional[date] = None) -> List[date]:
     return [monday + timedelta(days=i) for i in range(7)]
 
 
-@router.get("/week")
-def planner_week(start: Optional[str] = None, db: Session = Depends(get_db)):
-    if start:
-        try:
-            start_date = date.fromisoformat(start)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Ngày bắt đầu không hợp lệ")
-    else:
-        start_date = date.today()
+def parse_day(value: str, detail: str = "Ngày không hợp lệ") -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=detail)
 
-    days = get_week_range(start_date)
 
-    slots = (
-        db.query(models.MealSlot)
-        .filter(models.MealSlot.date >= days[0], models.MealSlot.date <= days[-1])
-        .all()
-    )
+def recipe_source(category: str | None) -> str:
+    # cùng quy ước với /api/gym/recipes và /api/student/recipes
+    return "gym" if category == "healthy" else "student"
 
-    slots_map = {(s.date.isoformat(), s.meal_type): s for s in slots}
 
-    recipes = db.query(models.Recipe).all()
+async def load_plan(
+    db: AsyncSession, first: date, last: date, totals: bool = False, total_key: str = "week"
+) -> dict:
+    """
+    Slot trong [first, last] + chỉ những recipe được slot tham chiếu
+    (1 query MealSlot LEFT JOIN Recipe, chỉ lấy các cột cần).
+    """
+    S = models.MealSlot
+    R = models.Recipe
+    rows = (
+        await db.execute(
+            select(S.date, S.meal_type, S.recipe_id, S.note, R.title, R.category)
+            .outerjoin(R, R.id == S.recipe_id)
+            .where(S.date >= first, S.date <= last)
+        )
+    ).all()
+
+    days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    slots_map = {(r.date.isoformat(), r.meal_type): r for r in rows}
 
     ui_slots = []
     for d in days:
@@ -58,56 +84,238 @@ def planner_week(start: Optional[str] = None, db: Session = Depends(get_db)):
                 {
                     "date": d_iso,
                     "meal_type": mt,
-                    "recipe_id": slot.recipe_id if slot else None,
+                    # recipe đã bị xóa (join không khớp) => coi như ô trống
+                    "recipe_id": slot.recipe_id if slot and slot.title is not None else None,
                     "note": (slot.note if slot and slot.note else "") or "",
                 }
             )
 
-    ui_recipes = [{"id": r.id, "title": r.title, "category": r.category} for r in recipes]
+    ui_recipes = {
+        r.recipe_id: {
+            "id": r.recipe_id,
+            "title": r.title,
+            "category": r.category,
+            "source": recipe_source(r.category),
+        }
+        for r in rows
+        if r.recipe_id is not None and r.title is not None
+    }
 
-    return {
+    data = {
         "days": [d.isoformat() for d in days],
         "meal_types": MEAL_TYPES,
-        "recipes": ui_recipes,
+        "recipes": sorted(ui_recipes.values(), key=lambda r: r["id"]),
         "slots": ui_slots,
     }
 
+    if totals:
+        # tổng dinh dưỡng theo ngày + cả khoảng (?totals=true)
+        per_day = await sum_slot_nutrition(db, first, last)
+        empty = {**{k: 0.0 for k in NUTRIENT_KEYS}, "meals": 0}
+        data["totals"] = {
+            "days": {d.isoformat(): per_day.get(d.isoformat(), empty) for d in days},
+            total_key: add_totals(per_day.values()),
+        }
 
-@router.post("/slot")
-def save_slot(payload: SlotPayload, db: Session = Depends(get_db)):
-    try:
-        slot_date = date.fromisoformat(payload.date)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Ngày không hợp lệ")
-
-    if payload.meal_type not in MEAL_TYPES:
-        raise HTTPException(status_code=400, detail="Loại bữa ăn không hợp lệ")
-
-    slot = (
-        db.query(models.MealSlot)
-        .filter(models.MealSlot.date == slot_date, models.MealSlot.meal_type == payload.meal_type)
-        .first()
-    )
-
-    if slot is None:
-        slot = models.MealSlot(
-            date=slot_date,
-            meal_type=payload.meal_type,
-            recipe_id=payload.recipe_id,
-            note=payload.note or "",
+    return data
+
+
+@router.get("/week")
+async def planner_week(
+    start: Optional[str] = None,
+    totals: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    start_date = parse_day(start, "Ngày bắt đầu không hợp lệ") if start else date.today()
+    days = get_week_range(start_date)
+    return await load_plan(db, days[0], days[-1], totals=totals)
+
+
+@router.get("/range")
+async def planner_range(
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    totals: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Lịch trong khoảng tùy ý (vd 1 tháng): ?from=YYYY-MM-DD&to=YYYY-MM-DD."""
+    first = parse_day(date_from)
+    last = parse_day(date_to)
+    if last < first:
+        raise HTTPException(status_code=400, detail="'to' phải sau hoặc bằng 'from'")
+    if (last - first).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Tối đa {MAX_RANGE_DAYS} ngày mỗi lần")
+
+    data = await load_plan(db, first, last, totals=totals, total_key="range")
+    data["from"], data["to"] = first.isoformat(), last.isoformat()
+    return data
+
+
+@router.get("/catalog")
+async def planner_catalog(
+    request: Request,
+    response: Response,
+    source: Literal["student", "gym"] | None = None,
+    cursor: int | None = Query(None, ge=1),
+    limit: int = Query(CATALOG_PAGE_SIZE, ge=1, le=CATALOG_PAGE_SIZE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Danh sách món cho sidebar kéo-thả, phân trang keyset theo id.
+    Trả ETag theo nội dung trang: client gửi If-None-Match => 304 nếu không đổi.
+    """
+    R = models.Recipe
+    q = select(R.id, R.title, R.category).order_by(R.id)
+    if source == "gym":
+        q = q.where(R.category == "healthy")
+    elif source == "student":
+        # category NULL cũng là món sinh viên (giống recipe_source)
+        q = q.where(or_(R.category != "healthy", R.category.is_(None)))
+    if cursor is not None:
+        q = q.where(R.id > cursor)
+
+    rows = (await db.execute(q.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    data = {
+        "items": [
+            {"id": r.id, "title": r.title, "category": r.category, "source": recipe_source(r.category)}
+            for r in rows
+        ],
+        "next_cursor": rows[-1].id if has_more else None,
+    }
+
+    etag = '"%s"' % hashlib.sha1(
+        json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={CATALOG_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return data
+
+
+# =========================
+# LƯU SLOT (UPSERT)
+# =========================
+SLOT_UNIQUE_INDEX = "ux_meal_slots_date_meal_type"
+
+
+def setup_slot_unique_index(engine) -> None:
+    """
+    DB cũ (tạo trước khi có unique index): gộp các slot trùng (giữ dòng mới nhất)
+    rồi tạo index. Gọi lúc startup sau create_all; index đã có thì không làm gì
+    (không quét / xóa lại bảng mỗi lần khởi động).
+    """
+    with engine.begin() as conn:
+        indexes = inspect(conn).get_indexes("meal_slots")
+        if any(ix["name"] == SLOT_UNIQUE_INDEX for ix in indexes):
+            return
+
+        conn.execute(
+            text(
+                """
+                DELETE FROM meal_slots WHERE id NOT IN (
+                    SELECT max_id FROM (
+                        SELECT MAX(id) AS max_id FROM meal_slots GROUP BY date, meal_type
+                    ) keep
+                )
+                """
+            )
         )
-        db.add(slot)
-    else:
-        slot.recipe_id = payload.recipe_id
-        slot.note = payload.note or ""
+        conn.execute(
+            text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {SLOT_UNIQUE_INDEX} "
+                "ON meal_slots (date, meal_type)"
+            )
+        )
+
 
-    db.commit()
-    db.refresh(slot)
+def validate_slots(items: List[SlotPayload]) -> list[dict]:
+    """Kiểm tra + chuẩn hóa; cùng (ngày, bữa) xuất hiện nhiều lần thì lấy lần cuối."""
+    rows: dict[tuple[date, str], dict] = {}
+    for p in items:
+        slot_date = parse_day(p.date)
+        if p.meal_type not in MEAL_TYPES:
+            raise HTTPException(status_code=400, detail="Loại bữa ăn không hợp lệ")
+        rows[(slot_date, p.meal_type)] = {
+            "date": slot_date,
+            "meal_type": p.meal_type,
+            "recipe_id": p.recipe_id,
+            "note": p.note or "",
+        }
+    return list(rows.values())
 
+
+async def upsert_slots(db: AsyncSession, rows: list[dict]) -> dict[tuple[date, str], int]:
+    """
+    Ghi cả lô bằng 1 câu INSERT ... ON CONFLICT (date, meal_type) DO UPDATE. Không commit.
+    Trả về id của từng slot theo (date, meal_type).
+    """
+    S = models.MealSlot
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(S).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[S.date, S.meal_type],
+            set_={
+                "recipe_id": stmt.excluded.recipe_id,
+                "note": stmt.excluded.note,
+                "updated_at": func.now(),
+            },
+        ).returning(S.id, S.date, S.meal_type)
+        result = await db.execute(stmt)
+        return {(d, m): slot_id for slot_id, d, m in result}
+
+    # DB khác: không có upsert chung => SELECT rồi INSERT/UPDATE (unique index vẫn chặn trùng)
+    slots = []
+    for row in rows:
+        slot = (
+            await db.scalars(
+                select(S).where(S.date == row["date"], S.meal_type == row["meal_type"])
+            )
+        ).first()
+        if slot is None:
+            slot = S(**row)
+            db.add(slot)
+        else:
+            slot.recipe_id = row["recipe_id"]
+            slot.note = row["note"]
+            slot.updated_at = func.now()
+        slots.append(slot)
+    await db.flush()
+    return {(slot.date, slot.meal_type): slot.id for slot in slots}
+
+
+def slot_to_dict(row: dict, ids: dict[tuple[date, str], int]) -> dict:
     return {
-        "id": slot.id,
-        "date": slot.date.isoformat(),
-        "meal_type": slot.meal_type,
-        "recipe_id": slot.recipe_id,
-        "note": slot.note or "",
+        "id": ids.get((row["date"], row["meal_type"])),
+        "date": row["date"].isoformat(),
+        "meal_type": row["meal_type"],
+        "recipe_id": row["recipe_id"],
+        "note": row["note"],
     }
+
+
+@router.post("/slot")
+async def save_slot(payload: SlotPayload, db: AsyncSession = Depends(get_async_db)):
+    rows = validate_slots([payload])
+    ids = await upsert_slots(db, rows)
+    await db.commit()
+    return slot_to_dict(rows[0], ids)
+
+
+@router.post("/slots")
+async def save_slots(payload: SlotsPayload, db: AsyncSession = Depends(get_async_db)):
+    """
+    Lưu nhiều slot trong 1 transaction (chép / xóa cả tuần = 1 request).
+    recipe_id = null => ô trống.
+    """
+    rows = validate_slots(payload.slots)
+    ids = await upsert_slots(db, rows)
+    await db.commit()
+    return {"saved": len(rows), "slots": [slot_to_dict(r, ids) for r in rows]}
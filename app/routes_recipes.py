@@ -1,107 +1,80 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database import get_db
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from app.database import get_async_db
 from app import models
-
-import shutil
-import uuid
-import os
-
-# ✅ NEW: send mail
-import smtplib
-from email.message import EmailMessage
-from datetime import datetime
+from app.recipe_search import index_recipe, search_recipe_ids
+from app.recipe_stats import add_review_to_stats, init_stats, stats_to_dict
+from app.email_outbox import enqueue_review_email, outbox_worker
+from app.nutrition import invalidate_recipe_nutrition
+from app.image_manifest import image_manifest
+from app.images import image_set
+from app.upload_store import release, store_upload
+from app import response_cache
 
 router = APIRouter(prefix="/api/recipes", tags=["Recipes"])
 
-UPLOAD_DIR = "static/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 
 def make_image_url(filename: str | None):
     if not filename:
         return None
     # nếu lưu "/static/..." thì giữ nguyên
     if filename.startswith("/static/"):
-        return filename
+        url = filename
     # nếu lưu "static/..." thì thêm /
-    if filename.startswith("static/"):
-        return "/" + filename
-    # nếu lưu filename trần (uuid_filename) thì map vào uploads
-    return f"/static/uploads/{filename}"
+    elif filename.startswith("static/"):
+        url = "/" + filename
+    # nếu lưu filename trần (ab/<sha256>.jpg hoặc uuid_filename cũ) thì map vào uploads
+    else:
+        url = f"/static/uploads/{filename}"
+    # file ảnh đã mất => None (client hiện ảnh mặc định thay vì ảnh vỡ); tra manifest, không stat
+    return url if image_manifest.exists(url) else None
+
+
+async def get_recipe_or_404(db: AsyncSession, recipe_id: int, *options) -> models.Recipe:
+    r = await db.scalar(
+        select(models.Recipe).options(*options).where(models.Recipe.id == recipe_id)
+    )
+    if not r:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return r
 
 
-# ✅ NEW: send review email via Gmail SMTP
-def send_review_email(
-    *,
-    recipe_title: str,
-    recipe_id: int,
-    rating: int,
-    reviewer_name: str,
-    comment: str,
-):
-    # bật/tắt bằng env
-    if os.getenv("MAIL_ENABLED", "0") != "1":
-        return
-
-    host = os.getenv("MAIL_HOST", "smtp.gmail.com")
-    port = int(os.getenv("MAIL_PORT", "465"))
-    user = os.getenv("MAIL_USER", "")
-    password = os.getenv("MAIL_PASS", "")
-    mail_to = os.getenv("MAIL_TO", "")
-    mail_from = os.getenv("MAIL_FROM", user)
-
-    # thiếu config thì bỏ qua (không làm hỏng chức năng review)
-    if not (user and password and mail_to):
-        print("MAIL CONFIG MISSING: check MAIL_USER/MAIL_PASS/MAIL_TO in .env")
-        return
-
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    subject = f"[Yuki Meal Planner] Review mới: {recipe_title} ({rating}★)"
-    body = f"""Bạn vừa nhận được 1 đánh giá mới.
-
-Món: {recipe_title}
-Recipe ID: {recipe_id}
-Số sao: {rating}/5
-Người đánh giá: {reviewer_name}
-Nhận xét: {comment or "(không có)"}
-Thời gian: {now}
-"""
-
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = mail_from
-    msg["To"] = mail_to
-    msg.set_content(body)
-
-    # Gmail SSL 465
-    with smtplib.SMTP_SSL(host, port) as smtp:
-        smtp.login(user, password)
-        smtp.send_message(msg)
+def recipe_to_dict(r: models.Recipe) -> dict:
+    st = stats_to_dict(r.stats)
+    return {
+        "id": r.id,
+        "title": r.title,
+        "ingredients": r.ingredients,
+        "steps": r.steps,
+        "note": r.note,
+        "category": r.category,
+        "image": make_image_url(r.image),
+        "image_set": image_set(make_image_url(r.image)),
+        "avg_rating": st["avg_rating"],
+        "review_count": st["review_count"],
+    }
 
 
 # =========================================
 # CREATE
 # =========================================
 @router.post("/")
-def create_recipe(
+async def create_recipe(
     title: str = Form(...),
     ingredients: str = Form(...),
     steps: str = Form(...),
     note: str = Form(""),
     category: str = Form(""),
     image: UploadFile | None = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     saved_filename = None
 
     if image:
-        saved_filename = f"{uuid.uuid4().hex}_{image.filename}"
-        file_path = os.path.join(UPLOAD_DIR, saved_filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
+        # ảnh lưu theo SHA-256 (app/upload_store.py): upload trùng không tốn thêm đĩa
+        saved_filename = await store_upload(image)
 
     recipe = models.Recipe(
         title=title,
@@ -111,10 +84,12 @@ def create_recipe(
         category=category,
         image=saved_filename,
     )
+    index_recipe(recipe)
+    init_stats(recipe)
 
     db.add(recipe)
-    db.commit()
-    db.refresh(recipe)
+    await db.commit()
+    await response_cache.invalidate(response_cache.RECIPES)
 
     return {"message": "Created", "id": recipe.id}
 
@@ -123,87 +98,75 @@ def create_recipe(
 # READ ALL (kèm avg_rating + review_count)
 # =========================================
 @router.get("/")
-def list_recipes(db: Session = Depends(get_db), category: str | None = None):
-    q = db.query(models.Recipe)
-    if category:
-        q = q.filter(models.Recipe.category == category)
+async def list_recipes(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    category: str | None = None,
+):
+    async def produce():
+        q = select(models.Recipe).options(joinedload(models.Recipe.stats))
+        if category:
+            q = q.where(models.Recipe.category == category)
+
+        recipes = (await db.scalars(q)).all()
+        return [recipe_to_dict(r) for r in recipes]
+
+    # cache theo query (category); create/update/delete/review sẽ invalidate
+    return await response_cache.cached_json(request, (response_cache.RECIPES,), produce)
 
-    recipes = q.all()
-    ids = [r.id for r in recipes]
 
-    stats = {}
+# =========================================
+# SEARCH (full-text, không phân biệt dấu)
+# =========================================
+@router.get("/search")
+async def search_recipes(
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    GET /api/recipes/search?q=ca hoi&page=1&page_size=20
+    Khớp title + ingredients ("ca hoi" tìm được "Cá hồi"), xếp theo độ liên quan.
+    """
+    offset = (page - 1) * page_size
+    # lấy dư 1 id để biết còn trang sau
+    ids = await search_recipe_ids(db, q, limit=page_size + 1, offset=offset)
+    has_more = len(ids) > page_size
+    ids = ids[:page_size]
+
+    by_id = {}
     if ids:
-        rows = (
-            db.query(
-                models.RecipeReview.recipe_id.label("recipe_id"),
-                func.avg(models.RecipeReview.rating).label("avg_rating"),
-                func.count(models.RecipeReview.id).label("review_count"),
-            )
-            .filter(models.RecipeReview.recipe_id.in_(ids))
-            .group_by(models.RecipeReview.recipe_id)
-            .all()
+        rows = await db.scalars(
+            select(models.Recipe)
+            .options(joinedload(models.Recipe.stats))
+            .where(models.Recipe.id.in_(ids))
         )
-        for row in rows:
-            stats[int(row.recipe_id)] = {
-                "avg_rating": float(row.avg_rating or 0),
-                "review_count": int(row.review_count or 0),
-            }
+        by_id = {r.id: r for r in rows}
 
-    result = []
-    for r in recipes:
-        st = stats.get(r.id, {"avg_rating": 0.0, "review_count": 0})
-        result.append(
-            {
-                "id": r.id,
-                "title": r.title,
-                "ingredients": r.ingredients,
-                "steps": r.steps,
-                "note": r.note,
-                "category": r.category,
-                "image": make_image_url(r.image),
-                "avg_rating": round(float(st["avg_rating"]), 2),
-                "review_count": int(st["review_count"]),
-            }
-        )
-    return result
+    return {
+        "q": q,
+        "page": page,
+        "page_size": page_size,
+        "has_more": has_more,
+        "items": [recipe_to_dict(by_id[i]) for i in ids if i in by_id],
+    }
 
 
 # =========================================
 # READ ONE
 # =========================================
 @router.get("/{recipe_id}")
-def get_recipe(recipe_id: int, db: Session = Depends(get_db)):
-    r = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
-    if not r:
-        raise HTTPException(status_code=404, detail="Recipe not found")
-
-    st = (
-        db.query(
-            func.avg(models.RecipeReview.rating).label("avg_rating"),
-            func.count(models.RecipeReview.id).label("review_count"),
-        )
-        .filter(models.RecipeReview.recipe_id == recipe_id)
-        .first()
-    )
-
-    return {
-        "id": r.id,
-        "title": r.title,
-        "ingredients": r.ingredients,
-        "steps": r.steps,
-        "note": r.note,
-        "category": r.category,
-        "image": make_image_url(r.image),
-        "avg_rating": round(float(st.avg_rating or 0), 2),
-        "review_count": int(st.review_count or 0),
-    }
+async def get_recipe(recipe_id: int, db: AsyncSession = Depends(get_async_db)):
+    r = await get_recipe_or_404(db, recipe_id, joinedload(models.Recipe.stats))
+    return recipe_to_dict(r)
 
 
 # =========================================
 # UPDATE
 # =========================================
 @router.put("/{recipe_id}")
-def update_recipe(
+async def update_recipe(
     recipe_id: int,
     title: str = Form(...),
     ingredients: str = Form(...),
@@ -211,40 +174,51 @@ def update_recipe(
     note: str = Form(""),
     category: str = Form(""),
     image: UploadFile | None = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
-    if not recipe:
-        raise HTTPException(status_code=404, detail="Recipe not found")
+    recipe = await get_recipe_or_404(db, recipe_id, selectinload(models.Recipe.search_doc))
 
     recipe.title = title
     recipe.ingredients = ingredients
     recipe.steps = steps
     recipe.note = note
     recipe.category = category
+    index_recipe(recipe)
+    # ingredients có thể đã đổi => tính lại dinh dưỡng ở lần đọc sau
+    await invalidate_recipe_nutrition(db, recipe_id)
 
+    old_image = recipe.image
     if image:
-        new_filename = f"{uuid.uuid4().hex}_{image.filename}"
-        file_path = os.path.join(UPLOAD_DIR, new_filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        recipe.image = new_filename
+        recipe.image = await store_upload(image) or recipe.image
 
-    db.commit()
-    return {"message": "Updated", "image": make_image_url(recipe.image)}
+    await db.commit()
+    await response_cache.invalidate(response_cache.RECIPES)
+    if recipe.image != old_image:
+        await release(db, old_image)
+    url = make_image_url(recipe.image)
+    return {"message": "Updated", "image": url, "image_set": image_set(url)}
 
 
 # =========================================
 # DELETE
 # =========================================
 @router.delete("/{recipe_id}")
-def delete_recipe(recipe_id: int, db: Session = Depends(get_db)):
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
-    if not recipe:
-        raise HTTPException(status_code=404, detail="Recipe not found")
+async def delete_recipe(recipe_id: int, db: AsyncSession = Depends(get_async_db)):
+    # nạp sẵn các quan hệ cascade (AsyncSession không lazy-load được)
+    recipe = await get_recipe_or_404(
+        db,
+        recipe_id,
+        selectinload(models.Recipe.reviews),
+        selectinload(models.Recipe.stats),
+        selectinload(models.Recipe.search_doc),
+        selectinload(models.Recipe.nutrition),
+    )
 
-    db.delete(recipe)
-    db.commit()
+    old_image = recipe.image
+    await db.delete(recipe)
+    await db.commit()
+    await response_cache.invalidate(response_cache.RECIPES)
+    await release(db, old_image)
     return {"message": "Deleted"}
 
 
@@ -252,31 +226,23 @@ def delete_recipe(recipe_id: int, db: Session = Depends(get_db)):
 # REVIEWS: LIST
 # =========================================
 @router.get("/{recipe_id}/reviews")
-def list_reviews(recipe_id: int, db: Session = Depends(get_db)):
-    r = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
-    if not r:
-        raise HTTPException(status_code=404, detail="Recipe not found")
+async def list_reviews(recipe_id: int, db: AsyncSession = Depends(get_async_db)):
+    r = await get_recipe_or_404(db, recipe_id, joinedload(models.Recipe.stats))
 
     reviews = (
-        db.query(models.RecipeReview)
-        .filter(models.RecipeReview.recipe_id == recipe_id)
-        .order_by(models.RecipeReview.created_at.desc())
-        .all()
-    )
-
-    st = (
-        db.query(
-            func.avg(models.RecipeReview.rating).label("avg_rating"),
-            func.count(models.RecipeReview.id).label("review_count"),
+        await db.scalars(
+            select(models.RecipeReview)
+            .where(models.RecipeReview.recipe_id == recipe_id)
+            .order_by(models.RecipeReview.created_at.desc())
         )
-        .filter(models.RecipeReview.recipe_id == recipe_id)
-        .first()
-    )
+    ).all()
+
+    st = stats_to_dict(r.stats)
 
     return {
         "recipe_id": recipe_id,
-        "avg_rating": round(float(st.avg_rating or 0), 2),
-        "review_count": int(st.review_count or 0),
+        "avg_rating": st["avg_rating"],
+        "review_count": st["review_count"],
         "reviews": [
             {
                 "id": rv.id,
@@ -291,22 +257,20 @@ def list_reviews(recipe_id: int, db: Session = Depends(get_db)):
 
 
 # =========================================
-# REVIEWS: CREATE (✅ gửi mail thật)
+# REVIEWS: CREATE (✅ mail qua outbox)
 # =========================================
 @router.post("/{recipe_id}/reviews")
-def create_review(
+async def create_review(
     recipe_id: int,
     rating: int = Form(...),
     comment: str = Form(""),
     reviewer_name: str = Form("Ẩn danh"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if rating < 1 or rating > 5:
         raise HTTPException(status_code=400, detail="Rating must be 1..5")
 
-    r = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
-    if not r:
-        raise HTTPException(status_code=404, detail="Recipe not found")
+    r = await get_recipe_or_404(db, recipe_id)
 
     rv = models.RecipeReview(
         recipe_id=recipe_id,
@@ -316,19 +280,22 @@ def create_review(
     )
 
     db.add(rv)
-    db.commit()
-    db.refresh(rv)
-
-    # ✅ Gửi email (nếu lỗi mail vẫn trả OK cho user)
-    try:
-        send_review_email(
-            recipe_title=r.title,
-            recipe_id=recipe_id,
-            rating=rating,
-            reviewer_name=reviewer_name,
-            comment=comment,
-        )
-    except Exception as e:
-        print("MAIL ERROR:", e)
+    # cộng vào recipe_stats trong cùng transaction với review
+    await add_review_to_stats(db, recipe_id, rating)
+    # ✅ email vào outbox cùng transaction, worker nền gửi sau
+    enqueued = enqueue_review_email(
+        db,
+        recipe_title=r.title,
+        recipe_id=recipe_id,
+        rating=rating,
+        reviewer_name=reviewer_name,
+        comment=comment,
+    )
+    await db.commit()
+    # avg_rating / review_count trong danh sách đã đổi
+    await response_cache.invalidate(response_cache.RECIPES)
+
+    if enqueued is not None:
+        outbox_worker.notify()
 
     return {"message": "Review created", "id": rv.id}
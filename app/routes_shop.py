@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlalchemy.orm import Session
-from pathlib import Path
-
-from .database import get_db
+from datetime import date, datetime, time, timedelta
+from typing import List, Literal
+import json
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import response_cache
+from .idempotency import IDEMPOTENCY_HEADER, normalize_key, remember, replay, request_hash
+from .order_export import EXPORTERS, MEDIA_TYPES, parquet_available
+from .sales_stats import apply_order, parse_stats_range, sales_summary
+from .database import AsyncSessionLocal, get_async_db
+from .image_manifest import image_manifest
+from .images import image_set
 from .models import Product, Order, OrderItem
 
 router = APIRouter(prefix="/api/shop", tags=["Shop"])
 
-# CKMANGUONMO/static/img (vì __file__ = CKMANGUONMO/app/routes_shop.py)
-STATIC_IMG_DIR = Path(__file__).resolve().parent.parent / "static" / "img"
-
 
 def to_int(v, default=0) -> int:
     try:
@@ -24,6 +35,7 @@ def image_url(img: str | None):
       - '/static/...' => giữ nguyên
       - 'img/xxx.jpg' => '/static/img/xxx.jpg'
       - 'imgshop1.jpg' => '/static/img/imgshop1.jpg'
+    File trong static/img, static/uploads không còn => None (dùng ảnh mặc định).
     """
     if not img:
         return None
@@ -31,158 +43,336 @@ def image_url(img: str | None):
     img = str(img).strip()
 
     if img.startswith("/static/"):
+        url = img
+    elif img.startswith("img/"):
+        url = "/static/" + img
+    elif "/" not in img:
+        url = "/static/img/" + img
+    else:
         return img
 
-    if img.startswith("img/"):
-        return "/static/" + img
-
-    if "/" not in img:
-        return "/static/img/" + img
-
-    return img
+    # tra image_manifest trong bộ nhớ, không stat file
+    return url if image_manifest.exists(url) else None
 
 
 def default_shop_image(product_id: int) -> str | None:
     """
     Fallback theo id sản phẩm: imgshop1..imgshop6 (xoay vòng).
-    Tự dò đúng extension file đang có (jpg/png/...)
+    Tự dò đúng extension file đang có (jpg/png/...) trong image_manifest.
     """
     idx = ((product_id - 1) % 6) + 1
     for ext in ("jpg", "png", "jpeg", "webp"):
         fname = f"imgshop{idx}.{ext}"
-        if (STATIC_IMG_DIR / fname).exists():
+        if image_manifest.has_file(f"img/{fname}"):
             return f"/static/img/{fname}"
     return None
 
 
 @router.get("/products")
-def get_products(db: Session = Depends(get_db)):
-    rows = db.query(Product).order_by(Product.id.asc()).all()
+async def get_products(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def produce():
+        rows = (await db.scalars(select(Product).order_by(Product.id.asc()))).all()
+
+        data = []
+        for p in rows:
+            db_img = getattr(p, "image", None)  # có cũng được, không có cũng ok
+            img = image_url(db_img)
+
+            # ✅ nếu DB không có/đang sai => dùng imgshop1..6
+            if not img:
+                img = default_shop_image(p.id)
+
+            data.append(
+                {
+                    "id": p.id,
+                    "name": p.name,
+                    "price": to_int(getattr(p, "price", 0)),
+                    "unit": getattr(p, "unit", None),
+                    "badge": getattr(p, "badge", None),
+                    "image": img,  # ✅ luôn trả ra /static/img/...
+                    "image_set": image_set(img),  # thumb/card/full WebP+JPEG (None nếu chưa tạo)
+                }
+            )
+        return data
 
-    data = []
-    for p in rows:
-        db_img = getattr(p, "image", None)  # có cũng được, không có cũng ok
-        img = image_url(db_img)
+    # API chưa có route ghi product; route ghi sau này gọi await response_cache.invalidate(PRODUCTS)
+    return await response_cache.cached_json(request, (response_cache.PRODUCTS,), produce)
 
-        # ✅ nếu DB không có/đang sai => dùng imgshop1..6
-        if not img:
-            img = default_shop_image(p.id)
 
-        data.append(
-            {
-                "id": p.id,
-                "name": p.name,
-                "price": to_int(getattr(p, "price", 0)),
-                "unit": getattr(p, "unit", None),
-                "badge": getattr(p, "badge", None),
-                "image": img,  # ✅ luôn trả ra /static/img/...
-            }
-        )
-    return data
+MAX_ORDER_ITEMS = 200
+MAX_ITEM_QTY = 9999
+ORDER_SCOPE = "shop.create_order"  # scope của Idempotency-Key
+
+
+class OrderItemIn(BaseModel):
+    product_id: int = Field(..., gt=0)
+    qty: int = Field(..., gt=0, le=MAX_ITEM_QTY)
+
+
+class OrderIn(BaseModel):
+    customer_name: str | None = Field(None, max_length=200)
+    note: str | None = Field(None, max_length=255)
+    items: List[OrderItemIn] = Field(..., min_length=1, max_length=MAX_ORDER_ITEMS)
 
 
 @router.post("/orders")
-def create_order(payload: dict, db: Session = Depends(get_db)):
-    items = payload.get("items") or []
-    if not items:
-        raise HTTPException(status_code=400, detail="Giỏ hàng trống")
-
-    norm_items = []
-    for it in items:
-        pid = to_int(it.get("product_id"), 0)
-        qty = to_int(it.get("qty"), 0)
-        if pid <= 0 or qty <= 0:
-            raise HTTPException(status_code=400, detail="Dữ liệu sản phẩm không hợp lệ")
-        norm_items.append({"product_id": pid, "qty": qty})
-
-    product_ids = [i["product_id"] for i in norm_items]
-    products = db.query(Product).filter(Product.id.in_(product_ids)).all()
-    prod_map = {p.id: p for p in products}
+async def create_order(
+    payload: OrderIn,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_HEADER),
+):
+    """
+    Tạo đơn: 1 SELECT giá sản phẩm, 1 INSERT orders ... RETURNING id,
+    1 INSERT nhiều dòng cho order_items. Có header Idempotency-Key thì
+    retry cùng key trả lại đơn đã tạo (xem app/idempotency.py).
+    """
+    key = normalize_key(idempotency_key)
+    req_hash = request_hash(payload) if key else None
+    if key:
+        saved = await replay(db, ORDER_SCOPE, key, req_hash)
+        if saved is not None:
+            return saved
+
+    product_ids = list(dict.fromkeys(it.product_id for it in payload.items))
+    rows = await db.execute(
+        select(Product.id, Product.name, Product.price).where(Product.id.in_(product_ids))
+    )
+    prod_map = {r.id: r for r in rows}
 
     missing = [pid for pid in product_ids if pid not in prod_map]
     if missing:
         raise HTTPException(status_code=400, detail=f"Sản phẩm không tồn tại: {missing}")
 
-    total = 0
-    for it in norm_items:
-        p = prod_map[it["product_id"]]
-        total += it["qty"] * to_int(getattr(p, "price", 0))
+    total = sum(it.qty * to_int(prod_map[it.product_id].price) for it in payload.items)
 
     try:
-        order = Order(
-            customer_name=payload.get("customer_name") or "Khách lẻ",
-            note=payload.get("note") or "Đơn tạo từ /shopping-list",
-            total_price=total,
-        )
-        db.add(order)
-        db.flush()
-
-        # schema order_items: product_name, unit_price, quantity
-        for it in norm_items:
-            p = prod_map[it["product_id"]]
-            db.add(
-                OrderItem(
-                    order_id=order.id,
-                    product_id=p.id,
-                    product_name=p.name,
-                    unit_price=to_int(p.price),
-                    quantity=it["qty"],
+        order_id, created_at = (
+            await db.execute(
+                insert(Order)
+                .values(
+                    customer_name=payload.customer_name or "Khách lẻ",
+                    note=payload.note or "Đơn tạo từ /shopping-list",
+                    total_price=total,
                 )
+                .returning(Order.id, Order.created_at)
             )
+        ).one()
 
-        db.commit()
-        return {"order_id": order.id, "total_price": to_int(order.total_price)}
+        # schema order_items: product_name, unit_price, quantity
+        item_rows = [
+            {
+                "order_id": order_id,
+                "product_id": it.product_id,
+                "product_name": prod_map[it.product_id].name,
+                "unit_price": to_int(prod_map[it.product_id].price),
+                "quantity": it.qty,
+            }
+            for it in payload.items
+        ]
+        # list tham số => SQLAlchemy gộp thành 1 câu INSERT ... VALUES (...), (...)
+        await db.execute(insert(OrderItem), item_rows)
+        # doanh số theo ngày, cùng transaction với đơn
+        await apply_order(db, created_at, total, item_rows)
+
+        result = {"order_id": order_id, "total_price": total}
+        if key:
+            remember(db, ORDER_SCOPE, key, req_hash, result)
+        await db.commit()
+        return result
+
+    except IntegrityError:
+        await db.rollback()
+        # request khác cùng Idempotency-Key vừa commit trước => trả kết quả của nó
+        if key:
+            saved = await replay(db, ORDER_SCOPE, key, req_hash)
+            if saved is not None:
+                return saved
+        raise HTTPException(status_code=409, detail="Xung đột dữ liệu khi tạo đơn, vui lòng thử lại")
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/orders")
-def list_orders(db: Session = Depends(get_db)):
-    orders = db.query(Order).order_by(Order.id.desc()).all()
-    result = []
-
-    for o in orders:
-        items = (
-            db.query(OrderItem)
-            .filter(OrderItem.order_id == o.id)
-            .order_by(OrderItem.id.asc())
-            .all()
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+ORDERS_STREAM_BATCH = 500
+
+
+def parse_date_range(date_from: str | None, date_to: str | None):
+    """
+    Đổi '?from=YYYY-MM-DD&to=YYYY-MM-DD' thành khoảng datetime [start, end).
+    'to' tính trọn ngày (đến 00:00 ngày hôm sau).
+    """
+    try:
+        start = datetime.combine(date.fromisoformat(date_from), time.min) if date_from else None
+        end = (
+            datetime.combine(date.fromisoformat(date_to) + timedelta(days=1), time.min)
+            if date_to
+            else None
         )
-        result.append(
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ngày không hợp lệ (định dạng YYYY-MM-DD)")
+    return start, end
+
+
+def filter_orders(q, start: datetime | None, end: datetime | None):
+    if start is not None:
+        q = q.where(Order.created_at >= start)
+    if end is not None:
+        q = q.where(Order.created_at < end)
+    return q
+
+
+def serialize_order(o: Order) -> dict:
+    created_at = getattr(o, "created_at", None)
+    return {
+        "id": o.id,
+        "customer_name": getattr(o, "customer_name", None),
+        "note": getattr(o, "note", None),
+        "total_price": to_int(getattr(o, "total_price", 0)),
+        "created_at": created_at.isoformat() if created_at else None,
+        "items": [
             {
-                "id": o.id,
-                "customer_name": getattr(o, "customer_name", None),
-                "note": getattr(o, "note", None),
-                "total_price": to_int(getattr(o, "total_price", 0)),
-                "created_at": getattr(o, "created_at", None),
-                "items": [
-                    {
-                        "id": it.id,
-                        "product_id": it.product_id,
-                        "product_name": it.product_name,
-                        "unit_price": to_int(it.unit_price),
-                        "quantity": to_int(it.quantity),
-                    }
-                    for it in items
-                ],
+                "id": it.id,
+                "product_id": it.product_id,
+                "product_name": it.product_name,
+                "unit_price": to_int(it.unit_price),
+                "quantity": to_int(it.quantity),
             }
+            for it in o.items
+        ],
+    }
+
+
+async def iter_orders_ndjson(start: datetime | None, end: datetime | None):
+    """
+    Xuất toàn bộ đơn (mới -> cũ) theo từng lô keyset, mỗi dòng 1 đơn JSON.
+    Dùng session riêng vì session của Depends(get_async_db) đã đóng khi stream chạy.
+    """
+    async with AsyncSessionLocal() as db:
+        cursor = None
+        while True:
+            q = filter_orders(select(Order).options(selectinload(Order.items)), start, end)
+            if cursor is not None:
+                q = q.where(Order.id < cursor)
+            batch = (await db.scalars(q.order_by(Order.id.desc()).limit(ORDERS_STREAM_BATCH))).all()
+            if not batch:
+                break
+
+            yield "".join(
+                json.dumps(serialize_order(o), ensure_ascii=False) + "\n" for o in batch
+            )
+            cursor = batch[-1].id
+            # bỏ các object đã xuất để bộ nhớ không tăng theo lịch sử
+            db.expunge_all()
+
+
+@router.get("/orders")
+async def list_orders(
+    cursor: int | None = Query(None, description="Lấy các đơn có id < cursor"),
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
+    date_from: str | None = Query(None, alias="from"),
+    date_to: str | None = Query(None, alias="to"),
+    format: Literal["json", "ndjson"] = Query("json"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Lịch sử đơn hàng, phân trang keyset theo Order.id (mới -> cũ).
+      - JSON: {"orders": [...], "next_cursor": id | null}
+      - NDJSON (?format=ndjson): stream toàn bộ đơn khớp bộ lọc, bỏ qua cursor/limit
+    Items của cả trang được nạp bằng 1 query (selectinload), không N+1.
+    """
+    start, end = parse_date_range(date_from, date_to)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            iter_orders_ndjson(start, end),
+            media_type="application/x-ndjson",
         )
 
-    return result
+    q = filter_orders(select(Order).options(selectinload(Order.items)), start, end)
+    if cursor is not None:
+        q = q.where(Order.id < cursor)
+
+    # lấy dư 1 dòng để biết còn trang sau hay không
+    rows = (await db.scalars(q.order_by(Order.id.desc()).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "orders": [serialize_order(o) for o in rows],
+        "next_cursor": rows[-1].id if has_more else None,
+    }
+
+
+@router.get("/orders/export")
+async def export_orders(
+    format: Literal["csv", "jsonl", "parquet"] = Query("csv"),
+    date_from: str | None = Query(None, alias="from"),
+    date_to: str | None = Query(None, alias="to"),
+):
+    """
+    Xuất đơn + dòng hàng (1 dòng / order_item) cho kế toán, stream từ
+    server-side cursor: bộ nhớ không tăng theo số đơn (xem app/order_export.py).
+    """
+    start, end = parse_date_range(date_from, date_to)
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Server chưa cài pyarrow, không xuất được parquet")
+
+    filename = "orders"
+    if date_from or date_to:
+        filename += f"_{date_from or ''}_{date_to or ''}"
+    return StreamingResponse(
+        EXPORTERS[format](start, end),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
 
 
 @router.delete("/orders/{order_id}", status_code=204)
-def delete_order(order_id: int, db: Session = Depends(get_db)):
-    o = db.query(Order).filter(Order.id == order_id).first()
+async def delete_order(order_id: int, db: AsyncSession = Depends(get_async_db)):
+    o = await db.scalar(
+        select(Order).options(selectinload(Order.items)).where(Order.id == order_id)
+    )
     if not o:
         raise HTTPException(status_code=404, detail="Không tìm thấy đơn hàng")
 
     try:
-        db.delete(o)
-        db.commit()
+        await apply_order(
+            db,
+            o.created_at,
+            to_int(o.total_price),
+            [
+                {
+                    "product_id": it.product_id,
+                    "product_name": it.product_name,
+                    "unit_price": to_int(it.unit_price),
+                    "quantity": to_int(it.quantity),
+                }
+                for it in o.items
+            ],
+            sign=-1,
+        )
+        await db.delete(o)
+        await db.commit()
         return Response(status_code=204)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats")
+async def shop_stats(
+    date_from: str | None = Query(None, alias="from"),
+    date_to: str | None = Query(None, alias="to"),
+    group_by: Literal["day", "week", "month", "none"] = Query("day"),
+    top: int = Query(10, ge=0, le=100, description="số sản phẩm bán chạy (theo doanh thu)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Doanh thu, số đơn, số lượng bán + top sản phẩm trong [from, to] (mặc định
+    30 ngày gần nhất). Chỉ đọc bảng rollup (app/sales_stats.py), không quét orders.
+    """
+    start, end = parse_stats_range(date_from, date_to)
+    return await sales_summary(db, start, end, group_by, top)
@@ -0,0 +1,317 @@
+"""
+Doanh số tính sẵn theo ngày (bảng daily_sales, product_daily_sales).
+
+- create_order cộng đơn mới vào rollup, delete_order trừ ra, bằng 1 câu
+  INSERT ... ON CONFLICT DO UPDATE (x = x + excluded.x) trong cùng transaction
+  với đơn => rollup luôn khớp orders / order_items.
+- "Ngày" của đơn tính theo giờ Việt Nam (SALES_UTC_OFFSET_HOURS, mặc định 7),
+  không phụ thuộc timezone của DB.
+- GET /api/shop/stats chỉ đọc rollup: số dòng ~ số ngày (x số sản phẩm bán trong
+  ngày), không phụ thuộc số đơn.
+
+Sửa / dựng lại từ orders + order_items:
+    python -m app.sales_stats            # dựng lại toàn bộ
+    python -m app.sales_stats --missing  # chỉ khi rollup còn trống (như lúc startup)
+"""
+import argparse
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+SALES_TZ = timezone(timedelta(hours=float(os.getenv("SALES_UTC_OFFSET_HOURS", "7"))))
+STATS_DEFAULT_DAYS = 30
+REBUILD_BATCH = 5000
+
+SUM_COLUMNS = ("order_count", "units", "revenue")
+
+
+def sales_day(created_at: datetime | None) -> date:
+    """Ngày bán của đơn. created_at không kèm timezone (SQLite) là giờ UTC."""
+    if created_at is None:
+        return datetime.now(SALES_TZ).date()
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(SALES_TZ).date()
+
+
+def today() -> date:
+    return datetime.now(SALES_TZ).date()
+
+
+def order_rollup_rows(day: date, total: int, items: list[dict], sign: int = 1) -> tuple[dict, list[dict]]:
+    """
+    items: [{"product_id", "product_name", "unit_price", "quantity"}].
+    Trả về (dòng daily_sales, các dòng product_daily_sales) dạng delta; sign=-1 khi xóa đơn.
+    Cùng sản phẩm xuất hiện nhiều dòng trong 1 đơn được gộp (ON CONFLICT không
+    cho 1 câu INSERT đụng 1 khóa 2 lần).
+    """
+    products: dict[int, dict] = {}
+    for it in items:
+        pid = it["product_id"]
+        if pid is None:
+            continue
+        row = products.setdefault(
+            pid,
+            {
+                "day": day,
+                "product_id": pid,
+                "product_name": it["product_name"],
+                "order_count": sign,
+                "units": 0,
+                "revenue": 0,
+            },
+        )
+        row["units"] += sign * int(it["quantity"])
+        row["revenue"] += sign * int(it["quantity"]) * int(it["unit_price"])
+
+    daily = {
+        "day": day,
+        "order_count": sign,
+        "units": sign * sum(int(it["quantity"]) for it in items),
+        "revenue": sign * int(total),
+    }
+    return daily, list(products.values())
+
+
+async def _add_rows(db: AsyncSession, model, keys: tuple[str, ...], rows: list[dict]) -> None:
+    """Cộng delta vào rollup (tạo dòng nếu chưa có). Không commit."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(model).values(rows)
+        set_ = {c: getattr(model, c) + getattr(stmt.excluded, c) for c in SUM_COLUMNS}
+        if "product_name" in rows[0]:
+            set_["product_name"] = stmt.excluded.product_name
+        await db.execute(
+            stmt.on_conflict_do_update(index_elements=[getattr(model, k) for k in keys], set_=set_)
+        )
+        return
+
+    # DB khác: SELECT rồi INSERT / UPDATE
+    for row in rows:
+        obj = await db.get(model, tuple(row[k] for k in keys))
+        if obj is None:
+            db.add(model(**row))
+            continue
+        for c in SUM_COLUMNS:
+            setattr(obj, c, getattr(obj, c) + row[c])
+        if "product_name" in row:
+            obj.product_name = row["product_name"]
+    await db.flush()
+
+
+async def apply_order(
+    db: AsyncSession, created_at: datetime | None, total: int, items: list[dict], sign: int = 1
+) -> None:
+    """Cộng (sign=1) / trừ (sign=-1) 1 đơn vào rollup. Không commit: caller commit cùng đơn."""
+    day = sales_day(created_at)
+    daily, products = order_rollup_rows(day, total, items, sign)
+    await _add_rows(db, models.DailySales, ("day",), [daily])
+    await _add_rows(db, models.ProductDailySales, ("day", "product_id"), products)
+
+    if sign < 0:
+        # ngày / sản phẩm không còn đơn nào thì bỏ dòng
+        await db.execute(
+            delete(models.DailySales).where(
+                models.DailySales.day == day, models.DailySales.order_count <= 0
+            )
+        )
+        P = models.ProductDailySales
+        await db.execute(
+            delete(P).where(
+                P.day == day,
+                P.product_id.in_([p["product_id"] for p in products]),
+                P.order_count <= 0,
+            )
+        )
+
+
+# =========================
+# ĐỌC: /api/shop/stats
+# =========================
+def parse_stats_range(date_from: str | None, date_to: str | None) -> tuple[date, date]:
+    """'?from=&to=' (YYYY-MM-DD, tính cả 2 đầu). Mặc định: 30 ngày gần nhất."""
+    try:
+        end = date.fromisoformat(date_to) if date_to else today()
+        start = (
+            date.fromisoformat(date_from)
+            if date_from
+            else end - timedelta(days=STATS_DEFAULT_DAYS - 1)
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ngày không hợp lệ (định dạng YYYY-MM-DD)")
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' phải trước hoặc bằng 'to'")
+    return start, end
+
+
+def period_key(day: date, group_by: str) -> str:
+    if group_by == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()  # thứ Hai đầu tuần
+    if group_by == "month":
+        return day.strftime("%Y-%m")
+    return day.isoformat()
+
+
+def _totals(order_count: int, units: int, revenue: int) -> dict:
+    return {
+        "revenue": revenue,
+        "orders": order_count,
+        "units": units,
+        "avg_order_value": round(revenue / order_count) if order_count else 0,
+    }
+
+
+async def sales_summary(
+    db: AsyncSession, start: date, end: date, group_by: str = "day", top: int = 10
+) -> dict:
+    D = models.DailySales
+    P = models.ProductDailySales
+
+    days = (
+        await db.execute(
+            select(D.day, D.order_count, D.units, D.revenue)
+            .where(D.day >= start, D.day <= end)
+            .order_by(D.day)
+        )
+    ).all()
+
+    series: dict[str, list[int]] = {}
+    total = [0, 0, 0]
+    for row in days:
+        values = (int(row.order_count), int(row.units), int(row.revenue))
+        bucket = series.setdefault(period_key(row.day, group_by), [0, 0, 0])
+        for i, v in enumerate(values):
+            bucket[i] += v
+            total[i] += v
+
+    result = {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "group_by": group_by,
+        "totals": _totals(*total),
+        "series": (
+            [{"period": k, **_totals(*v)} for k, v in series.items()]
+            if group_by != "none"
+            else []
+        ),
+        "top_products": [],
+    }
+
+    if top > 0:
+        revenue = func.sum(P.revenue).label("revenue")
+        rows = (
+            await db.execute(
+                select(
+                    P.product_id,
+                    func.max(P.product_name).label("product_name"),
+                    func.sum(P.order_count).label("orders"),
+                    func.sum(P.units).label("units"),
+                    revenue,
+                )
+                .where(P.day >= start, P.day <= end)
+                .group_by(P.product_id)
+                .order_by(revenue.desc(), P.product_id)
+                .limit(top)
+            )
+        ).all()
+        result["top_products"] = [
+            {
+                "product_id": r.product_id,
+                "product_name": r.product_name,
+                "orders": int(r.orders),
+                "units": int(r.units),
+                "revenue": int(r.revenue),
+            }
+            for r in rows
+        ]
+    return result
+
+
+# =========================
+# DỰNG LẠI (startup / CLI, engine sync)
+# =========================
+def rebuild_sales_rollups(db: Session, only_missing: bool = False) -> int:
+    """
+    Tính lại toàn bộ rollup từ orders + order_items (đọc theo lô, không nạp
+    hết vào bộ nhớ). only_missing=True: chỉ chạy khi rollup trống mà đã có đơn
+    (DB cũ trước khi có rollup). Trả về số ngày đã ghi.
+    """
+    O, I = models.Order, models.OrderItem
+    if only_missing and (
+        db.scalar(select(func.count()).select_from(models.DailySales)) > 0
+        or db.scalar(select(func.count()).select_from(O)) == 0
+    ):
+        return 0
+
+    daily: dict[date, dict] = {}
+    for _, created_at, total in db.execute(
+        select(O.id, O.created_at, O.total_price).execution_options(yield_per=REBUILD_BATCH)
+    ):
+        day = sales_day(created_at)
+        row = daily.setdefault(day, {"day": day, "order_count": 0, "units": 0, "revenue": 0})
+        row["order_count"] += 1
+        row["revenue"] += int(total or 0)
+
+    products: dict[tuple[date, int], dict] = {}
+    seen: set[int] = set()  # sản phẩm đã đếm của đơn đang đọc
+    current_order = None
+    q = (
+        select(I.order_id, I.product_id, I.product_name, I.unit_price, I.quantity, O.created_at)
+        .join(O, O.id == I.order_id)
+        .order_by(I.order_id, I.id)
+        .execution_options(yield_per=REBUILD_BATCH)
+    )
+    for order_id, product_id, name, unit_price, quantity, created_at in db.execute(q):
+        day = sales_day(created_at)
+        daily[day]["units"] += int(quantity)
+        if product_id is None:
+            continue
+        if order_id != current_order:
+            current_order = order_id
+            seen.clear()
+        row = products.setdefault(
+            (day, product_id),
+            {"day": day, "product_id": product_id, "product_name": name, "order_count": 0, "units": 0, "revenue": 0},
+        )
+        row["product_name"] = name  # đọc theo thứ tự đơn => giữ tên mới nhất
+        if product_id not in seen:
+            seen.add(product_id)
+            row["order_count"] += 1
+        row["units"] += int(quantity)
+        row["revenue"] += int(quantity) * int(unit_price)
+
+    db.execute(delete(models.ProductDailySales))
+    db.execute(delete(models.DailySales))
+    if daily:
+        db.execute(insert(models.DailySales), list(daily.values()))
+    if products:
+        db.execute(insert(models.ProductDailySales), list(products.values()))
+    db.commit()
+    return len(daily)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dựng lại daily_sales / product_daily_sales từ orders")
+    parser.add_argument("--missing", action="store_true", help="chỉ chạy khi rollup còn trống")
+    args = parser.parse_args()
+
+    from .database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        n = rebuild_sales_rollups(db, only_missing=args.missing)
+        print(f"sales rollup: đã ghi {n} ngày")
+    finally:
+        db.close()
@@ -0,0 +1,96 @@
+"""
+Jinja dùng chung cho toàn app.
+
+- 1 Environment duy nhất (đường dẫn tuyệt đối, không phụ thuộc thư mục chạy),
+  template biên dịch được lưu bytecode cache trên đĩa => khởi động lại không
+  phải parse lại.
+- Trang không phụ thuộc request (/, /login, /recipes...) dùng render_page():
+  render 1 lần, giữ HTML trong bộ nhớ kèm ETag; request có If-None-Match khớp
+  => 304, không gửi lại body.
+- APP_ENV=dev: sửa file template là cache trang tự bỏ (so mtime), Jinja tự nạp lại.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from .assets import asset_url
+from .compression import etag_matches
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+DEV_MODE = os.getenv("APP_ENV", "production").lower() in ("dev", "development")
+JINJA_CACHE_DIR = Path(
+    os.getenv("JINJA_CACHE_DIR", Path(tempfile.gettempdir()) / "ckmanguonmo-jinja")
+)
+
+JINJA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+env = Environment(
+    loader=FileSystemLoader(str(TEMPLATES_DIR)),
+    autoescape=True,
+    bytecode_cache=FileSystemBytecodeCache(str(JINJA_CACHE_DIR)),
+    # production: không stat file template mỗi lần get_template
+    auto_reload=DEV_MODE,
+)
+env.globals["asset_url"] = asset_url
+
+templates = Jinja2Templates(env=env)
+
+# trang tĩnh: HTML có thể cache thoải mái, nhưng browser phải hỏi lại (ETag) mỗi lần
+PAGE_CACHE_CONTROL = "no-cache"
+
+
+class PageCache:
+    """(template, context) -> (html bytes, etag)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages: dict[tuple, tuple[bytes, str]] = {}
+        self._stamp: float | None = None
+
+    def _templates_stamp(self) -> float:
+        return max((p.stat().st_mtime for p in TEMPLATES_DIR.rglob("*.html")), default=0.0)
+
+    def get(self, name: str, context: dict) -> tuple[bytes, str]:
+        key = (name, tuple(sorted(context.items())))
+
+        if DEV_MODE:
+            stamp = self._templates_stamp()
+            if stamp != self._stamp:
+                self.clear()
+                self._stamp = stamp
+
+        page = self._pages.get(key)
+        if page is None:
+            body = env.get_template(name).render(**context).encode("utf-8")
+            page = (body, '"%s"' % hashlib.sha1(body).hexdigest()[:20])
+            with self._lock:
+                self._pages[key] = page
+        return page
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+
+
+page_cache = PageCache()
+
+
+def render_page(request: Request, name: str, **context) -> Response:
+    """
+    Trả trang từ cache. Chỉ dùng cho template không đọc `request` và context
+    có ít giá trị (context là 1 phần của key cache).
+    """
+    body, etag = page_cache.get(name, context)
+    headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL}
+
+    # so sánh yếu: trang > COMPRESS_MIN_SIZE được nén => ETag trả về là W/"..."
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(body, headers=headers)
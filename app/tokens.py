@@ -0,0 +1,326 @@
+"""
+Access / refresh token JWT ký HS256.
+
+- login trả access_token (ngắn hạn, ACCESS_TOKEN_MINUTES) + refresh_token
+  (REFRESH_TOKEN_DAYS). Claims mang đủ thông tin user (sub, email, name) =>
+  get_current_user chỉ verify chữ ký trong bộ nhớ, không query bảng users.
+- Key set: JWT_KEYS="kid1:secret1,kid2:secret2". Key đầu dùng để ký, mọi key
+  đều verify được (chọn theo header kid). Xoay key: thêm key mới lên đầu, giữ
+  key cũ tới khi refresh token cũ hết hạn rồi bỏ. Chỉ 1 key: JWT_SECRET.
+  Không cấu hình gì => key ngẫu nhiên mỗi lần chạy (chỉ hợp khi dev).
+- Thu hồi (logout, refresh token đã đổi): bảng revoked_tokens.
+    + access token: mỗi process giữ jti thu hồi trong bộ nhớ (RevocationList),
+      thread nền đồng bộ từ DB mỗi REVOCATION_SYNC_SECONDS giây => verify không
+      tốn round trip DB. Chỉ giữ tới khi token hết hạn (ACCESS_TOKEN_MINUTES) nên
+      số jti bị chặn theo số lần logout trong khoảng đó.
+    + refresh token: không giữ trong bộ nhớ; /refresh và logout INSERT jti vào
+      revoked_tokens (khóa chính) => dùng lại lần 2 thì INSERT lỗi => 401.
+"""
+import heapq
+import os
+import secrets
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import ExpiredSignatureError, JWTError, jwt
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+ALGORITHM = "HS256"
+ISSUER = "ckmanguonmo"
+ACCESS_TOKEN_TTL = timedelta(minutes=float(os.getenv("ACCESS_TOKEN_MINUTES", "15")))
+REFRESH_TOKEN_TTL = timedelta(days=float(os.getenv("REFRESH_TOKEN_DAYS", "14")))
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "15"))
+# đọc lùi 1 chút khi đồng bộ: bù transaction commit trễ / lệch giờ giữa các máy
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(dt: datetime) -> datetime:
+    # SQLite trả datetime không kèm timezone (đã lưu theo UTC)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class TokenError(Exception):
+    pass
+
+
+# =========================
+# KEY SET
+# =========================
+class KeySet:
+    def __init__(self, keys: dict[str, str]):
+        if not keys:
+            raise ValueError("key set rỗng")
+        self.keys = keys
+        self.signing_kid = next(iter(keys))
+
+    @property
+    def signing_key(self) -> str:
+        return self.keys[self.signing_kid]
+
+
+def load_keys() -> KeySet:
+    keys: dict[str, str] = {}
+    for part in os.getenv("JWT_KEYS", "").split(","):
+        if not part.strip():
+            continue
+        kid, sep, secret = part.strip().partition(":")
+        if not sep or not kid.strip() or not secret.strip():
+            raise ValueError("JWT_KEYS phải có dạng kid:secret,kid:secret")
+        keys[kid.strip()] = secret.strip()
+
+    if not keys and os.getenv("JWT_SECRET"):
+        keys["default"] = os.getenv("JWT_SECRET")
+    if not keys:
+        print("Chưa đặt JWT_KEYS / JWT_SECRET: dùng key ngẫu nhiên, token mất hiệu lực khi restart")
+        keys[f"dev-{secrets.token_hex(4)}"] = secrets.token_urlsafe(32)
+    return KeySet(keys)
+
+
+key_set = load_keys()
+
+
+def reload_keys() -> KeySet:
+    """Đọc lại JWT_KEYS (vd sau khi đổi biến môi trường khi xoay key)."""
+    global key_set
+    key_set = load_keys()
+    return key_set
+
+
+# =========================
+# THU HỒI
+# =========================
+class RevocationList:
+    """
+    jti access token đã thu hồi -> thời điểm hết hạn (epoch). Heap theo hạn để
+    dọn dần phần đã hết hạn, không quét lại cả dict.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked: dict[str, float] = {}
+        self._expiry: list[tuple[float, str]] = []
+        self._synced_at: datetime | None = None
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        exp = _aware(expires_at).timestamp()
+        if exp <= time.time():
+            return
+        with self._lock:
+            if jti not in self._revoked:
+                self._revoked[jti] = exp
+                heapq.heappush(self._expiry, (exp, jti))
+            self._prune_locked()
+
+    def _prune_locked(self) -> None:
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, jti = heapq.heappop(self._expiry)
+            self._revoked.pop(jti, None)
+
+    def _prune(self) -> None:
+        with self._lock:
+            self._prune_locked()
+
+    def sync(self, db: Session, purge: bool = False) -> int:
+        """Nạp jti thu hồi mới từ DB (worker khác logout). Trả về số dòng đọc được."""
+        R = models.RevokedToken
+        now = utcnow()
+        if purge:
+            db.execute(delete(R).where(R.expires_at < now))
+            db.commit()
+
+        # chỉ access token: hạn <= ACCESS_TOKEN_TTL (refresh token dài hạn được
+        # chặn bằng INSERT trong revoke(), không cần nạp vào bộ nhớ)
+        q = select(R.jti, R.expires_at).where(
+            R.expires_at > now, R.expires_at <= now + ACCESS_TOKEN_TTL
+        )
+        if self._synced_at is not None:
+            q = q.where(R.revoked_at > self._synced_at - SYNC_OVERLAP)
+        rows = db.execute(q).all()
+        for jti, expires_at in rows:
+            self.add(jti, expires_at)
+        self._synced_at = now
+        self._prune()
+        return len(rows)
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+revocations = RevocationList()
+
+
+async def revoke(db: AsyncSession, claims: dict) -> bool:
+    """
+    Thu hồi token (theo claims đã verify). Commit luôn.
+    INSERT nguyên tử theo khóa chính jti: False nếu token đã bị thu hồi trước đó
+    (worker khác / request song song) => refresh token chỉ dùng được đúng 1 lần.
+    Chỉ access token được ghi vào RevocationList trong bộ nhớ.
+    """
+    expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc)
+    try:
+        await db.execute(
+            insert(models.RevokedToken).values(
+                jti=claims["jti"], expires_at=expires_at, revoked_at=utcnow()
+            )
+        )
+        await db.commit()
+        inserted = True
+    except IntegrityError:
+        await db.rollback()
+        inserted = False
+    if claims.get("typ") == "access":
+        revocations.add(claims["jti"], expires_at)
+    return inserted
+
+
+class RevocationSync:
+    """Thread nền: revocations.sync() mỗi REVOCATION_SYNC_SECONDS giây."""
+
+    def __init__(self, interval: float = REVOCATION_SYNC_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-revocations", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                revocations.sync(db)
+            except Exception as e:
+                db.rollback()
+                print("TOKEN REVOCATION SYNC ERROR:", e)
+            finally:
+                db.close()
+
+
+revocation_sync = RevocationSync()
+
+
+# =========================
+# KÝ / VERIFY
+# =========================
+def issue_token(user: models.User, typ: str, ttl: timedelta) -> str:
+    now = utcnow()
+    claims = {
+        "iss": ISSUER,
+        "sub": str(user.id),
+        "email": user.email,
+        "name": user.full_name,
+        "typ": typ,
+        "jti": uuid.uuid4().hex,
+        "iat": int(now.timestamp()),
+        "exp": int((now + ttl).timestamp()),
+    }
+    return jwt.encode(
+        claims, key_set.signing_key, algorithm=ALGORITHM, headers={"kid": key_set.signing_kid}
+    )
+
+
+def issue_token_pair(user: models.User) -> dict:
+    return {
+        "access_token": issue_token(user, "access", ACCESS_TOKEN_TTL),
+        "refresh_token": issue_token(user, "refresh", REFRESH_TOKEN_TTL),
+        "token_type": "bearer",
+        "expires_in": int(ACCESS_TOKEN_TTL.total_seconds()),
+    }
+
+
+def decode_token(token: str, typ: str = "access") -> dict:
+    """
+    Verify chữ ký + hạn + loại + thu hồi (access token), hoàn toàn trong bộ nhớ.
+    Refresh token dùng lại bị chặn ở revoke(). Lỗi => TokenError.
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        raise TokenError("Token không hợp lệ")
+
+    secret = key_set.keys.get(header.get("kid"))
+    if secret is None or header.get("alg") != ALGORITHM:
+        raise TokenError("Token ký bằng key không còn hiệu lực")
+    try:
+        claims = jwt.decode(token, secret, algorithms=[ALGORITHM], issuer=ISSUER)
+    except ExpiredSignatureError:
+        raise TokenError("Token đã hết hạn")
+    except JWTError:
+        raise TokenError("Token không hợp lệ")
+
+    if claims.get("typ") != typ or not claims.get("jti"):
+        raise TokenError("Sai loại token")
+    if revocations.is_revoked(claims["jti"]):
+        raise TokenError("Token đã bị thu hồi")
+    return claims
+
+
+# =========================
+# DEPENDENCY
+# =========================
+@dataclass(frozen=True)
+class TokenUser:
+    id: int
+    email: str
+    full_name: str | None
+    jti: str
+    claims: dict
+
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+) -> TokenUser:
+    """User từ access token (header Authorization: Bearer ...), không query DB."""
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Chưa đăng nhập",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        claims = decode_token(credentials.credentials, "access")
+    except TokenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return TokenUser(
+        id=int(claims["sub"]),
+        email=claims.get("email"),
+        full_name=claims.get("name"),
+        jti=claims["jti"],
+        claims=claims,
+    )
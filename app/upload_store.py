@@ -0,0 +1,316 @@
+"""
+Kho ảnh upload đánh địa chỉ theo nội dung (content-addressed).
+
+- File lưu theo SHA-256 của nội dung: static/uploads/ab/abcdef....jpg
+  (2 ký tự đầu làm thư mục con). Recipe.image lưu "ab/abcdef....jpg".
+- Cùng 1 ảnh upload nhiều lần => chỉ 1 file trên đĩa.
+- Số tham chiếu = số Recipe có image trỏ tới file (đếm trực tiếp trong DB).
+  update/delete recipe gọi release(): hết tham chiếu thì xóa file + variant.
+- File upload cũ (uuid_tên-gốc) vẫn dùng được; `migrate` chuyển chúng vào kho.
+
+    python -m app.upload_store check            # kiểm tra toàn vẹn (hash, file thiếu, orphan)
+    python -m app.upload_store sweep [--dry-run] # xóa file không còn recipe nào dùng
+    python -m app.upload_store migrate          # chuyển file uuid_ cũ sang kho SHA-256
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import anyio
+from fastapi import UploadFile
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .image_manifest import image_manifest
+from .images import STATIC_DIR, process_upload, variant_dir
+
+UPLOAD_DIR = STATIC_DIR / "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# file mới hơn khoảng này không bị sweep/release xóa: upload đang chạy
+# (đã ghi file, recipe chưa commit) hoặc vừa được dùng lại (dedupe => touch)
+UPLOAD_GRACE_SECONDS = int(os.getenv("UPLOAD_GRACE_SECONDS", "3600"))
+
+BLOB_RE = re.compile(r"^[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]{1,8})?$")
+
+# nhận dạng định dạng ảnh từ vài byte đầu => cùng nội dung luôn ra cùng tên
+MAGIC_EXTS = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+)
+
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def sniff_ext(head: bytes, filename: str | None) -> str:
+    for magic, ext in MAGIC_EXTS:
+        if head.startswith(magic):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    suffix = Path(filename or "").suffix.lower()
+    return suffix if re.fullmatch(r"\.[a-z0-9]{1,8}", suffix) else ""
+
+
+def blob_name(digest: str, ext: str) -> str:
+    return f"{digest[:2]}/{digest}{ext}"
+
+
+def blob_path(name: str) -> Path:
+    return UPLOAD_DIR / name
+
+
+def is_blob(name: str | None) -> bool:
+    return bool(name and BLOB_RE.match(name))
+
+
+def upload_name(image: str | None) -> str | None:
+    """Recipe.image -> tên file dưới static/uploads (None nếu ảnh nằm chỗ khác)."""
+    if not image:
+        return None
+    for prefix in ("/static/uploads/", "static/uploads/"):
+        if image.startswith(prefix):
+            image = image[len(prefix):]
+            break
+    else:
+        if image.startswith(("/", "static/", "http://", "https://")):
+            return None
+    if not is_blob(image) and ("/" in image or "\\" in image):
+        return None
+    return image
+
+
+def _remove(name: str) -> None:
+    blob_path(name).unlink(missing_ok=True)
+    shutil.rmtree(variant_dir(f"uploads/{name}"), ignore_errors=True)
+    image_manifest.discard(f"uploads/{name}")
+
+
+def _recent(path: Path, now: float | None = None) -> bool:
+    try:
+        return (now or time.time()) - path.stat().st_mtime < UPLOAD_GRACE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+# =========================
+# GHI / GIẢI PHÓNG (API)
+# =========================
+async def store_upload(image: UploadFile) -> str | None:
+    """
+    Ghi file upload vào kho, băm SHA-256 trong lúc ghi. Trả về tên lưu vào
+    Recipe.image, hoặc None nếu file rỗng (form gửi ô file trống).
+    """
+    tmp = UPLOAD_DIR / f".tmp-{uuid.uuid4().hex}"
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    try:
+        async with await anyio.open_file(tmp, "wb") as buffer:
+            while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+                if not head:
+                    head = chunk[:16]
+                digest.update(chunk)
+                size += len(chunk)
+                await buffer.write(chunk)
+
+        if size == 0:
+            return None
+
+        name = blob_name(digest.hexdigest(), sniff_ext(head, image.filename))
+        target = blob_path(name)
+        if target.exists():
+            # đã có nội dung này: bỏ bản tạm, làm mới mtime để sweep không xóa nhầm
+            os.utime(target)
+            image_manifest.add_file(f"uploads/{name}")
+            return name
+
+        target.parent.mkdir(exist_ok=True)
+        os.replace(tmp, target)
+        image_manifest.add_file(f"uploads/{name}")
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    # file không phải ảnh => không có variant, client dùng file gốc
+    await process_upload(f"uploads/{name}")
+    return name
+
+
+async def count_refs(db: AsyncSession, name: str) -> int:
+    return await db.scalar(
+        select(func.count(models.Recipe.id)).where(models.Recipe.image == name)
+    )
+
+
+async def release(db: AsyncSession, name: str | None) -> bool:
+    """
+    Gọi SAU commit khi 1 recipe thôi dùng ảnh `name`. Xóa file + variant nếu
+    không còn recipe nào trỏ tới. Trả về True nếu đã xóa.
+    """
+    name = upload_name(name)
+    if name is None:
+        return False
+    path = blob_path(name)
+    if not path.is_file() or await count_refs(db, name) > 0 or _recent(path):
+        return False
+    await anyio.to_thread.run_sync(_remove, name)
+    return True
+
+
+# =========================
+# BẢO TRÌ (CLI, engine sync)
+# =========================
+def iter_upload_files():
+    """Mọi file trong static/uploads (blob + file cũ), dạng tên tương đối."""
+    for p in sorted(UPLOAD_DIR.rglob("*")):
+        if p.is_file() and not p.name.startswith(".tmp-"):
+            yield p.relative_to(UPLOAD_DIR).as_posix()
+
+
+def referenced_names(db: Session) -> set[str]:
+    """Tên file trong static/uploads đang được ít nhất 1 recipe dùng."""
+    names = set()
+    for (image,) in db.execute(
+        select(models.Recipe.image).where(models.Recipe.image.is_not(None)).distinct()
+    ):
+        name = upload_name(image)
+        if name:
+            names.add(name)
+    return names
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sweep(db: Session, dry_run: bool = False) -> list[str]:
+    """Xóa file không còn recipe nào tham chiếu (bỏ qua file mới hơn grace period)."""
+    refs = referenced_names(db)
+    now = time.time()
+    removed = []
+    for name in iter_upload_files():
+        if name in refs or _recent(blob_path(name), now):
+            continue
+        if not dry_run:
+            _remove(name)
+        removed.append(name)
+
+    if not dry_run:
+        # thư mục shard rỗng + file tạm bỏ dở
+        for p in UPLOAD_DIR.glob(".tmp-*"):
+            if not _recent(p, now):
+                p.unlink(missing_ok=True)
+        for d in UPLOAD_DIR.iterdir():
+            if d.is_dir() and not any(d.iterdir()):
+                d.rmdir()
+    return removed
+
+
+def check(db: Session) -> dict[str, list[str]]:
+    """Kiểm tra toàn vẹn. Trả về {loại lỗi: [tên file]} (rỗng = ổn)."""
+    refs = referenced_names(db)
+    files = set(iter_upload_files())
+    problems: dict[str, list[str]] = {
+        "hash_mismatch": [],
+        "empty": [],
+        "missing": [],
+        "orphan": [],
+        "legacy": [],
+    }
+
+    for name in sorted(files):
+        path = blob_path(name)
+        m = BLOB_RE.match(name)
+        if path.stat().st_size == 0:
+            problems["empty"].append(name)
+        elif m:
+            if file_sha256(path) != m.group(1):
+                problems["hash_mismatch"].append(name)
+        else:
+            problems["legacy"].append(name)
+        if name not in refs:
+            problems["orphan"].append(name)
+
+    problems["missing"] = sorted(refs - files)
+    return {k: v for k, v in problems.items() if v}
+
+
+def migrate(db: Session) -> int:
+    """Chuyển file uuid_ cũ vào kho SHA-256 và cập nhật Recipe.image. Trả về số recipe đổi."""
+    from .images import process_image
+
+    changed = 0
+    recipes = db.scalars(select(models.Recipe).where(models.Recipe.image.is_not(None))).all()
+    for r in recipes:
+        name = upload_name(r.image)
+        if name is None or is_blob(name):
+            continue
+        src = blob_path(name)
+        if not src.is_file() or src.stat().st_size == 0:
+            continue
+
+        with open(src, "rb") as f:
+            head = f.read(16)
+        new = blob_name(file_sha256(src), sniff_ext(head, name))
+        dst = blob_path(new)
+        if not dst.exists():
+            dst.parent.mkdir(exist_ok=True)
+            shutil.copy2(src, dst)
+            process_image(dst, f"uploads/{new}")
+
+        r.image = new
+        changed += 1
+    db.commit()
+    # file cũ giờ không còn tham chiếu: `sweep` sẽ dọn
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bảo trì kho ảnh upload (static/uploads)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("check", help="kiểm tra hash, file thiếu, file rỗng, orphan")
+    p_sweep = sub.add_parser("sweep", help="xóa file không còn recipe nào dùng")
+    p_sweep.add_argument("--dry-run", action="store_true", help="chỉ liệt kê, không xóa")
+    p_sweep.add_argument("--grace", type=int, default=None, help="giây (mặc định UPLOAD_GRACE_SECONDS)")
+    sub.add_parser("migrate", help="chuyển file uuid_ cũ sang kho SHA-256")
+    args = parser.parse_args()
+
+    from .database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.cmd == "check":
+            problems = check(db)
+            for kind, names in problems.items():
+                print(f"{kind}: {len(names)}")
+                for n in names:
+                    print(f"  {n}")
+            # legacy/orphan chỉ là cảnh báo; hash sai / file thiếu => exit code 1
+            raise SystemExit(1 if problems.get("hash_mismatch") or problems.get("missing") else 0)
+        elif args.cmd == "sweep":
+            if args.grace is not None:
+                UPLOAD_GRACE_SECONDS = args.grace
+            removed = sweep(db, dry_run=args.dry_run)
+            print(f"upload_store: {'sẽ xóa' if args.dry_run else 'đã xóa'} {len(removed)} file")
+            for n in removed:
+                print(f"  {n}")
+        elif args.cmd == "migrate":
+            n = migrate(db)
+            print(f"upload_store: đã chuyển {n} recipe sang kho SHA-256 (chạy sweep để dọn file cũ)")
+    finally:
+        db.close()
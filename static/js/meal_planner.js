@@ -1,10 +1,12 @@
 // static/js/meal_planner.js
 // Weekly meal planner: render grid 3 meals x 7 days, drag-drop recipes into cells, save to DB.
 // Endpoints expected:
-//   GET  /planner/week?start=YYYY-MM-DD   -> {days:[...7], slots:[{date, meal_type, recipe_id, note}]}
-//   POST /planner/slot                   -> accepts {date, meal_type, recipe_id, note} returns saved
-//   GET  /api/student/recipes            -> [{id,title,...}]
-//   GET  /api/gym/recipes                -> [{id,title,...}]
+//   GET  /planner/week?start=YYYY-MM-DD   -> {days:[...7], slots:[{date, meal_type, recipe_id, note}],
+//                                            recipes:[chỉ các món có trong slots]}
+//   POST /planner/slots                  -> accepts {slots:[{date, meal_type, recipe_id, note}]}
+//                                           (1 transaction, upsert; recipe_id null = xoá)
+//   GET  /planner/catalog?source=student|gym&cursor=&limit=
+//                                        -> {items:[{id,title,category,source}], next_cursor}
 
 (() => {
   const DAY_LABELS = [
@@ -28,6 +30,8 @@
   const btnPrev = document.getElementById("prev-week-btn");
   const btnToday = document.getElementById("today-week-btn");
   const btnNext = document.getElementById("next-week-btn");
+  const btnClearWeek = document.getElementById("clear-week-btn");
+  const btnCopyWeek = document.getElementById("copy-week-btn");
 
   const elStudent = document.getElementById("student-recipes");
   const elGym = document.getElementById("gym-recipes");
@@ -35,7 +39,7 @@
   // state
   let currentMonday = getMonday(new Date());
   let slotsMap = new Map(); // key: `${date}|${meal}` -> recipe_id
-  let recipesMap = new Map(); // recipe_id -> {id,title,source}
+  let recipesMap = new Map(); // recipe_id -> {id,title,category,source}
   let selectedDayISO = new Date().toISOString().slice(0, 10);
   window.__selectedDayISO = selectedDayISO;
 
@@ -122,23 +126,42 @@
     return div;
   }
 
-  async function loadRecipes() {
-    const [student, gym] = await Promise.all([
-      getJSON("/api/student/recipes"),
-      getJSON("/api/gym/recipes"),
-    ]);
+  // sidebar: tải từng trang catalog, nút "Xem thêm" lấy trang kế tiếp
+  async function loadCatalogPage(source, container, cursor = null) {
+    const params = new URLSearchParams({ source });
+    if (cursor) params.set("cursor", cursor);
+    const data = await getJSON(`/planner/catalog?${params}`);
 
-    recipesMap.clear();
-    elStudent.innerHTML = "";
-    elGym.innerHTML = "";
+    container.querySelector(".r-more")?.remove();
+    (data.items || []).forEach((r) => {
+      recipesMap.set(r.id, r);
+      container.appendChild(recipeCard(r));
+    });
 
-    student.forEach((r) => recipesMap.set(r.id, { ...r, source: "student" }));
-    gym.forEach((r) => recipesMap.set(r.id, { ...r, source: "gym" }));
+    if (data.next_cursor) {
+      const more = document.createElement("button");
+      more.className = "btn r-more";
+      more.textContent = "Xem thêm";
+      more.addEventListener("click", async () => {
+        more.disabled = true;
+        try {
+          await loadCatalogPage(source, container, data.next_cursor);
+        } catch (err) {
+          console.error(err);
+          more.disabled = false;
+        }
+      });
+      container.appendChild(more);
+    }
+  }
 
-    student.forEach((r) =>
-      elStudent.appendChild(recipeCard({ ...r, source: "student" }))
-    );
-    gym.forEach((r) => elGym.appendChild(recipeCard({ ...r, source: "gym" })));
+  async function loadRecipes() {
+    elStudent.innerHTML = "";
+    elGym.innerHTML = "";
+    await Promise.all([
+      loadCatalogPage("student", elStudent),
+      loadCatalogPage("gym", elGym),
+    ]);
   }
 
   // ---------------- calendar render ----------------
@@ -266,6 +289,9 @@
       `/planner/week?start=${encodeURIComponent(startISO)}`
     );
 
+    // món trong lịch có thể chưa nằm trong các trang catalog đã tải
+    (data.recipes || []).forEach((r) => recipesMap.set(r.id, r));
+
     slotsMap.clear();
     (data.slots || []).forEach((s) => {
       if (s.recipe_id) slotsMap.set(keySlot(s.date, s.meal_type), s.recipe_id);
@@ -275,19 +301,62 @@
     renderCalendar(data.days || []);
   }
 
-  async function saveSlot(dateISO, mealKey, recipeIdOrNull) {
-    const saved = await postJSON("/planner/slot", {
-      date: dateISO,
-      meal_type: mealKey,
-      recipe_id: recipeIdOrNull,
-      note: "",
+  // lưu nhiều ô trong 1 request: [{date, meal_type, recipe_id}]
+  async function saveSlots(changes) {
+    if (!changes.length) return;
+    const res = await postJSON("/planner/slots", {
+      slots: changes.map((c) => ({ ...c, note: c.note || "" })),
     });
 
-    if (saved.recipe_id) {
-      slotsMap.set(keySlot(saved.date, saved.meal_type), saved.recipe_id);
-    } else {
-      slotsMap.delete(keySlot(saved.date, saved.meal_type));
-    }
+    (res.slots || []).forEach((saved) => {
+      if (saved.recipe_id) {
+        slotsMap.set(keySlot(saved.date, saved.meal_type), saved.recipe_id);
+      } else {
+        slotsMap.delete(keySlot(saved.date, saved.meal_type));
+      }
+    });
+  }
+
+  async function saveSlot(dateISO, mealKey, recipeIdOrNull) {
+    await saveSlots([
+      { date: dateISO, meal_type: mealKey, recipe_id: recipeIdOrNull },
+    ]);
+  }
+
+  function weekDaysISO(monday) {
+    return Array.from({ length: 7 }, (_, i) => toISO(addDays(monday, i)));
+  }
+
+  async function clearWeek() {
+    const changes = [];
+    weekDaysISO(currentMonday).forEach((iso) =>
+      MEALS.forEach((m) => {
+        if (slotsMap.has(keySlot(iso, m.key))) {
+          changes.push({ date: iso, meal_type: m.key, recipe_id: null });
+        }
+      })
+    );
+    await saveSlots(changes);
+    await loadWeek(currentMonday);
+  }
+
+  // chép tuần đang xem sang tuần sau (ghi đè cả ô trống) rồi chuyển sang tuần đó
+  async function copyWeekToNext() {
+    const nextMonday = addDays(currentMonday, 7);
+    const nextDays = weekDaysISO(nextMonday);
+    const changes = [];
+    weekDaysISO(currentMonday).forEach((iso, idx) =>
+      MEALS.forEach((m) => {
+        changes.push({
+          date: nextDays[idx],
+          meal_type: m.key,
+          recipe_id: slotsMap.get(keySlot(iso, m.key)) || null,
+        });
+      })
+    );
+    await saveSlots(changes);
+    currentMonday = nextMonday;
+    await loadWeek(currentMonday);
   }
 
   // ---------------- nav buttons ----------------
@@ -304,6 +373,14 @@
       currentMonday = getMonday(new Date());
       await loadWeek(currentMonday);
     });
+    btnClearWeek?.addEventListener("click", async () => {
+      if (!confirm("Xoá toàn bộ món của tuần này?")) return;
+      await clearWeek();
+    });
+    btnCopyWeek?.addEventListener("click", async () => {
+      if (!confirm("Chép thực đơn tuần này sang tuần sau (ghi đè)?")) return;
+      await copyWeekToNext();
+    });
   }
 
   // ---------------- init ----------------
@@ -14,7 +14,6 @@ const sumGridEl = $("#sum-grid");
 const btnAdd = $("#btn-add-to-total");
 const btnCalc = $("#btn-calc-total");
 const btnClear = $("#btn-clear");
-const btnRandomize = $("#btn-randomize");
 
 // TDEE UI
 const sexEl = $("#sex");
@@ -54,21 +53,6 @@ function parseQuery() {
   };
 }
 
-function hashCode(str) {
-  let h = 0;
-  const s = String(str || "");
-  for (let i = 0; i < s.length; i++) h = (h * 31 + s.charCodeAt(i)) >>> 0;
-  return h;
-}
-
-function randFromSeed(seed) {
-  let x = seed >>> 0;
-  return () => {
-    x = (1664525 * x + 1013904223) >>> 0;
-    return x / 4294967296;
-  };
-}
-
 function clamp(n, min, max) {
   return Math.max(min, Math.min(max, n));
 }
@@ -112,53 +96,48 @@ function saveProfile(p) {
 }
 
 // -----------------------
-// Nutrition (MINH HOẠ)
+// Nutrition (tính phía server: POST /api/nutrition/batch)
 // -----------------------
-function makeMockNutrition(recipe, salt = 0) {
-  const title = String(recipe?.title || "");
-  const ing = String(recipe?.ingredients || "");
-  const key = `${title}|${ing}|${salt}`;
-
-  const seed = hashCode(key);
-  const r = randFromSeed(seed);
-
-  // calories + macro (1 phần)
-  const calories = Math.round(250 + r() * 500);     // 250..750
-  let protein = Math.round(10 + r() * 35);          // 10..45 g
-  let carbs   = Math.round(20 + r() * 70);          // 20..90 g
-  let fat     = Math.round(8 + r() * 30);           // 8..38 g
-
-  const fiber  = Math.round(2 + r() * 12);          // 2..14 g
-  const sugar  = Math.round(1 + r() * 18);          // 1..19 g
-  const sodium = Math.round(250 + r() * 1100);      // 250..1350 mg
-
-  // scale theo độ dài ingredients
-  const k = clamp(ing.length / 120, 0.6, 1.5);
-
-  // scale
-  const calScaled = Math.round(calories * k);
-  protein = Math.round(protein * k);
-  carbs   = Math.round(carbs * k);
-  fat     = Math.round(fat * k);
-
-  // chỉnh lại để macro calories không lệch quá nhiều so với calories (minh hoạ)
-  const macroCal = protein * 4 + carbs * 4 + fat * 9;
-  if (macroCal > 0) {
-    const ratio = calScaled / macroCal;
-    protein = Math.max(1, Math.round(protein * ratio));
-    carbs   = Math.max(1, Math.round(carbs * ratio));
-    fat     = Math.max(1, Math.round(fat * ratio));
-  }
+const EMPTY_NUTRI = { calories:0, protein:0, carbs:0, fat:0, fiber:0, sugar:0, sodium:0 };
+
+// items: [{ source: "user"|"default", id }] -> Map("source:id" -> nutrition)
+async function fetchNutritionBatch(items) {
+  const body = { recipe_ids: [], default_recipe_ids: [] };
+  (items || []).forEach((it) => {
+    const id = Number(it.id);
+    if (!Number.isInteger(id)) return;
+    if (it.source === "default") body.default_recipe_ids.push(id);
+    else body.recipe_ids.push(id);
+  });
 
-  return {
-    calories: calScaled,
-    protein,
-    carbs,
-    fat,
-    fiber: Math.round(fiber * k),
-    sugar: Math.round(sugar * k),
-    sodium: Math.round(sodium * k),
-  };
+  const out = new Map();
+  if (!body.recipe_ids.length && !body.default_recipe_ids.length) return out;
+
+  const res = await fetch("/api/nutrition/batch", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok) throw new Error("Không tính được dinh dưỡng.");
+  const data = await res.json();
+  (data.results || []).forEach((r) => out.set(`${r.source}:${r.id}`, r.nutrition));
+  return out;
+}
+
+// cập nhật số liệu cho các món đã chọn (1 request cho cả danh sách)
+async function refreshPicksNutrition() {
+  const picks = loadPicks();
+  if (!picks.length) return;
+  try {
+    const map = await fetchNutritionBatch(picks);
+    picks.forEach((p) => {
+      const n = map.get(`${p.source}:${p.id}`);
+      if (n) p.nutri = n;
+    });
+    savePicks(picks);
+  } catch (e) {
+    console.warn(e);
+  }
 }
 
 function nutritionRows(n) {
@@ -185,12 +164,10 @@ async function fetchRecipe({ source, id }) {
     return await res.json();
   }
 
-  const res = await fetch("/default-recipes/");
+  const res = await fetch(`/default-recipes/${encodeURIComponent(id)}`);
+  if (res.status === 404) throw new Error("Không tìm thấy món default theo id.");
   if (!res.ok) throw new Error("Không tải được món (default).");
-  const arr = await res.json();
-  const found = (arr || []).find((x) => String(x.id) === String(id));
-  if (!found) throw new Error("Không tìm thấy món default theo id.");
-  return found;
+  return await res.json();
 }
 
 // -----------------------
@@ -198,7 +175,6 @@ async function fetchRecipe({ source, id }) {
 // -----------------------
 let CURRENT = null;
 let CURRENT_NUTRI = null;
-let CURRENT_SALT = 0;
 
 function renderCurrent() {
   if (!CURRENT) return;
@@ -560,12 +536,6 @@ btnClear?.addEventListener("click", () => {
   renderEnergyCompare();
 });
 
-btnRandomize?.addEventListener("click", () => {
-  CURRENT_SALT += 1;
-  CURRENT_NUTRI = makeMockNutrition(CURRENT, CURRENT_SALT);
-  renderCurrent();
-});
-
 // TDEE
 btnCalcTdee?.addEventListener("click", () => {
   const p = getProfileFromUI();
@@ -607,12 +577,14 @@ document.addEventListener("DOMContentLoaded", async () => {
   try {
     const recipe = await fetchRecipe(q);
     CURRENT = { ...recipe, source: q.source, id: q.id };
-    CURRENT_NUTRI = makeMockNutrition(CURRENT, 0);
+    const map = await fetchNutritionBatch([CURRENT]);
+    CURRENT_NUTRI = map.get(`${q.source}:${q.id}`) || { ...EMPTY_NUTRI };
     renderCurrent();
   } catch (e) {
     currentEl.innerHTML = `<div class="mini" style="color:#ef4444;"><strong>Lỗi:</strong> ${escapeHtml(e.message || "Không tải được món.")}</div>`;
   }
 
+  await refreshPicksNutrition();
   renderPicks();
 
   const total = calcTotalFromPicks();
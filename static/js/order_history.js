@@ -32,9 +32,22 @@ function buildOrderText(order) {
   return lines.join("\n");
 }
 
-async function fetchOrders() {
-  const res = await fetch("/api/shop/orders");
-  if (!res.ok) return [];
+const PAGE_SIZE = 20;
+
+// Trạng thái phân trang (keyset theo id đơn)
+const ohState = {
+  orders: [],
+  nextCursor: null,
+  loading: false,
+};
+
+// Lấy 1 trang đơn hàng: { orders: [...], next_cursor: id | null }
+async function fetchOrdersPage(cursor) {
+  const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+  if (cursor != null) params.set("cursor", String(cursor));
+
+  const res = await fetch(`/api/shop/orders?${params}`);
+  if (!res.ok) return { orders: [], next_cursor: null };
   return await res.json();
 }
 
@@ -168,7 +181,8 @@ function renderOrders(orders) {
 
       try {
         await deleteOrder(o.id);
-        // Xóa card trên UI
+        // Xóa card trên UI (và khỏi danh sách đã tải)
+        ohState.orders = ohState.orders.filter((x) => x.id !== o.id);
         card.remove();
 
         // Nếu xóa hết đơn thì hiện empty
@@ -190,38 +204,57 @@ function renderOrders(orders) {
   });
 }
 
-function setupSearch(allOrders) {
+function currentQuery() {
   const input = document.getElementById("oh-search");
-  if (!input) return;
-
-  input.addEventListener("input", () => {
-    const q = input.value.trim().toLowerCase();
-    if (!q) {
-      renderOrders(allOrders);
-      return;
-    }
-    const filtered = allOrders.filter((o) => {
-      if (String(o.id).includes(q)) return true;
-      return (o.items || []).some((it) =>
-        (it.product_name || "").toLowerCase().includes(q)
-      );
-    });
-    renderOrders(filtered);
+  return input ? input.value.trim().toLowerCase() : "";
+}
+
+function filterOrders(orders, q) {
+  if (!q) return orders;
+  return orders.filter((o) => {
+    if (String(o.id).includes(q)) return true;
+    return (o.items || []).some((it) =>
+      (it.product_name || "").toLowerCase().includes(q)
+    );
   });
 }
 
+function refreshView() {
+  renderOrders(filterOrders(ohState.orders, currentQuery()));
+
+  const btnMore = document.getElementById("btn-load-more");
+  if (btnMore) {
+    btnMore.style.display = ohState.nextCursor != null ? "inline-block" : "none";
+    btnMore.disabled = ohState.loading;
+  }
+}
+
+// reset = true: tải lại từ trang đầu; false: nối thêm trang kế tiếp
+async function loadOrders(reset) {
+  if (ohState.loading) return;
+  if (!reset && ohState.nextCursor == null) return;
+
+  ohState.loading = true;
+  refreshView();
+  try {
+    const page = await fetchOrdersPage(reset ? null : ohState.nextCursor);
+    const orders = page.orders || [];
+    ohState.orders = reset ? orders : ohState.orders.concat(orders);
+    ohState.nextCursor = page.next_cursor ?? null;
+  } finally {
+    ohState.loading = false;
+    refreshView();
+  }
+}
+
 document.addEventListener("DOMContentLoaded", async () => {
   const btnRefresh = document.getElementById("btn-refresh");
+  const btnMore = document.getElementById("btn-load-more");
+  const input = document.getElementById("oh-search");
 
-  let orders = await fetchOrders();
-  renderOrders(orders);
-  setupSearch(orders);
+  if (input) input.addEventListener("input", refreshView);
+  if (btnRefresh) btnRefresh.addEventListener("click", () => loadOrders(true));
+  if (btnMore) btnMore.addEventListener("click", () => loadOrders(false));
 
-  if (btnRefresh) {
-    btnRefresh.addEventListener("click", async () => {
-      orders = await fetchOrders();
-      renderOrders(orders);
-      setupSearch(orders);
-    });
-  }
+  await loadOrders(true);
 });
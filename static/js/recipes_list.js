@@ -18,6 +18,12 @@ let defaultRecipes = [];
 let userRecipes = [];
 let dbTitleToId = new Map();
 
+// Kết quả tìm kiếm phía server (/api/recipes/search) cho công thức người dùng
+const SEARCH_PAGE_SIZE = 50;
+let userSearchTerm = "";
+let userSearchResults = [];
+let userSearchSeq = 0;
+
 const defaultListEl = document.getElementById("default-recipes-list");
 const userListEl = document.getElementById("user-recipes-list");
 const emptyUserText = document.getElementById("user-recipes-empty");
@@ -129,6 +135,14 @@ function normText(s = "") {
     .trim();
 }
 
+// bỏ dấu tiếng Việt (giống fold_text phía server): "Cá hồi" -> "ca hoi"
+function foldText(s = "") {
+  return normText(s)
+    .replace(/đ/g, "d")
+    .normalize("NFD")
+    .replace(/[\u0300-\u036f]/g, "");
+}
+
 // demo từ khóa: đủ dùng cho bài nộp
 const KW_MEAT = [
   "thịt",
@@ -230,38 +244,6 @@ function matchDiet(recipe) {
   return selected.every((key) => !!tags[key]);
 }
 
-// =======================
-// DEMO NUTRITION (để đẩy sang /nutrition)
-// =======================
-
-// hash đơn giản để số "ổn định" theo món (demo)
-function hashCode(str) {
-  const s = String(str || "");
-  let h = 0;
-  for (let i = 0; i < s.length; i++) h = (h * 31 + s.charCodeAt(i)) | 0;
-  return Math.abs(h);
-}
-
-/**
- * Tạo dinh dưỡng demo (kcal/protein/carbs/fat/fiber/sugar/sodium)
- * → bạn dùng để tính tổng ở nutrition.html
- */
-function makeMockNutrition(recipe) {
-  const base = hashCode(`${recipe?.title || ""}|${recipe?.ingredients || ""}`);
-  const rnd = (min, max) => min + (base % (max - min + 1));
-
-  // scale kiểu "mỗi món"
-  const calories = rnd(250, 750);
-  const protein = rnd(8, 45);
-  const carbs = rnd(20, 110);
-  const fat = rnd(6, 35);
-  const fiber = rnd(2, 18);
-  const sugar = rnd(1, 25);
-  const sodium = rnd(200, 1600);
-
-  return { calories, protein, carbs, fat, fiber, sugar, sodium };
-}
-
 // =======================
 // MODAL REVIEW
 // =======================
@@ -416,9 +398,18 @@ function createDefaultCard(recipe, index) {
   `;
 }
 
+// <picture> WebP + JPEG theo image_set của API (thumb/card/full); chưa có thì dùng ảnh gốc
+const CARD_IMG_SIZES = "(max-width: 640px) 100vw, 320px";
+
+function pictureSources(imageSet) {
+  if (!imageSet || !imageSet.srcset) return "";
+  return `<source type="image/webp" srcset="${imageSet.srcset.webp}" sizes="${CARD_IMG_SIZES}" />`;
+}
+
 function createUserCard(recipe, index) {
   const baseImg = buildImageUrl(recipe.image);
-  const imgUrl = baseImg || pickDefaultImage(index);
+  const imageSet = recipe.image_set;
+  const imgUrl = imageSet ? imageSet.card.jpeg : baseImg || pickDefaultImage(index);
 
   const title = escapeHtml(recipe.title || "Món ăn của bạn");
   const category = escapeHtml(recipe.category || "Khác");
@@ -428,11 +419,15 @@ function createUserCard(recipe, index) {
   return `
     <article class="recipe-card user-card">
       <div class="recipe-card-thumb">
-        <img src="${imgUrl}" alt="${title}"
-             loading="lazy"
-             onerror="this.onerror=null; this.src='${pickDefaultImage(
-               index
-             )}';" />
+        <picture>
+          ${pictureSources(imageSet)}
+          <img src="${imgUrl}" alt="${title}"
+               ${imageSet ? `srcset="${imageSet.srcset.jpeg}" sizes="${CARD_IMG_SIZES}"` : ""}
+               loading="lazy"
+               onerror="this.onerror=null; this.src='${pickDefaultImage(
+                 index
+               )}';" />
+        </picture>
         <span class="badge badge-user">Của bạn</span>
       </div>
       <div class="recipe-card-body">
@@ -470,20 +465,14 @@ function createUserCard(recipe, index) {
 // RENDER (áp dụng search + dietary)
 // =======================
 function filterBySearchAndDiet(list, searchTerm) {
-  const q = String(searchTerm || "")
-    .trim()
-    .toLowerCase();
+  const q = foldText(searchTerm);
 
   return (list || []).filter((r) => {
     // search
     const okSearch =
       !q ||
-      String(r.title || "")
-        .toLowerCase()
-        .includes(q) ||
-      String(r.ingredients || "")
-        .toLowerCase()
-        .includes(q);
+      foldText(r.title).includes(q) ||
+      foldText(r.ingredients).includes(q);
 
     if (!okSearch) return false;
 
@@ -513,7 +502,10 @@ function renderDefaultRecipes(searchTerm = "") {
 function renderUserRecipes(searchTerm = "") {
   if (!userListEl) return;
 
-  const filtered = filterBySearchAndDiet(userRecipes, searchTerm);
+  // có từ khoá: dùng kết quả đã được server lọc + xếp hạng, chỉ còn lọc diet
+  const filtered = String(searchTerm || "").trim()
+    ? filterBySearchAndDiet(userSearchResults, "")
+    : filterBySearchAndDiet(userRecipes, "");
 
   if (!filtered.length) {
     userListEl.innerHTML =
@@ -584,10 +576,43 @@ async function loadUserRecipes() {
 // =======================
 // SEARCH
 // =======================
-function applySearch() {
+async function searchUserRecipes(term) {
+  const seq = ++userSearchSeq;
+  const params = new URLSearchParams({
+    q: term,
+    page_size: String(SEARCH_PAGE_SIZE),
+  });
+
+  try {
+    const res = await fetch(`/api/recipes/search?${params}`);
+    if (!res.ok) throw new Error("Search failed");
+    const data = await res.json();
+    // bỏ kết quả của lần gõ cũ hơn
+    if (seq !== userSearchSeq) return false;
+    userSearchResults = attachDietTags(data.items || []);
+  } catch (err) {
+    console.error(err);
+    if (seq !== userSearchSeq) return false;
+    userSearchResults = [];
+  }
+  userSearchTerm = term;
+  return true;
+}
+
+async function applySearch() {
   updateDietCountUI();
-  const term = (searchInput && searchInput.value) || "";
+  const term = ((searchInput && searchInput.value) || "").trim();
   renderDefaultRecipes(term);
+
+  if (term && term !== userSearchTerm) {
+    if (userListEl) {
+      userListEl.innerHTML = '<p class="loading-text">Đang tìm kiếm...</p>';
+    }
+    const fresh = await searchUserRecipes(term);
+    if (!fresh) return;
+  }
+  if (!term) userSearchTerm = "";
+
   renderUserRecipes(term);
 }
 
@@ -636,6 +661,12 @@ async function fetchAndRefreshRecipeStats(recipeId) {
       userRecipes[uidx].avg_rating = avg;
       userRecipes[uidx].review_count = cnt;
     }
+    userSearchResults.forEach((x) => {
+      if (Number(x.id) === uid) {
+        x.avg_rating = avg;
+        x.review_count = cnt;
+      }
+    });
 
     const t = String(data.title || "")
       .trim()
@@ -663,7 +694,11 @@ function findRecipeBySourceAndId(source, id) {
   if (source === "default") {
     return defaultRecipes.find((r) => String(r.id) === String(id)) || null;
   }
-  return userRecipes.find((r) => String(r.id) === String(id)) || null;
+  return (
+    userRecipes.find((r) => String(r.id) === String(id)) ||
+    userSearchResults.find((r) => String(r.id) === String(id)) ||
+    null
+  );
 }
 
 function handleListClick(e) {
@@ -705,7 +740,7 @@ function handleListClick(e) {
       if (!recipeObj) return;
       recipeObj = { ...recipeObj, source: "default" };
     } else {
-      recipeObj = userRecipes.find((r) => String(r.id) === String(id));
+      recipeObj = findRecipeBySourceAndId("user", id);
       if (!recipeObj) return;
       recipeObj = { ...recipeObj, source: "user" };
     }
@@ -733,8 +768,6 @@ function handleListClick(e) {
       category: r.category || "",
       ingredients: r.ingredients || "",
       note: r.note || "",
-      // demo nutrition để trang nutrition tính tổng nhiều món
-      nutrition: makeMockNutrition(r),
       // demo dietary tags
       diet: r.diet || inferDietTags(r),
     };
@@ -9,10 +9,19 @@ async function fetchProducts() {
   return await res.json();
 }
 
-async function createOrderOnServer(payload) {
+function newIdempotencyKey() {
+  if (window.crypto?.randomUUID) return window.crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// idempotencyKey: giữ nguyên khi gửi lại cùng 1 giỏ => server không tạo đơn trùng
+async function createOrderOnServer(payload, idempotencyKey) {
   const res = await fetch("/api/shop/orders", {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: {
+      "Content-Type": "application/json",
+      "Idempotency-Key": idempotencyKey,
+    },
     body: JSON.stringify(payload),
   });
 
@@ -20,7 +29,9 @@ async function createOrderOnServer(payload) {
     let msg = "Tạo đơn thất bại";
     try {
       const data = await res.json();
-      msg = data?.detail || data?.message || msg;
+      // 422: detail là danh sách lỗi validate
+      const detail = Array.isArray(data?.detail) ? data.detail[0]?.msg : data?.detail;
+      msg = detail || data?.message || msg;
     } catch (_) {}
     throw new Error(msg);
   }
@@ -35,6 +46,8 @@ const state = {
   products: [],
   filtered: [],
   cart: [], // { id, name, price, qty }
+  checkoutSig: null, // giỏ hàng của lần "Mua ngay" gần nhất
+  checkoutKey: null, // Idempotency-Key tương ứng
 };
 
 // ===== UI (match shopping_list.html) =====
@@ -155,6 +168,8 @@ function refreshOrderPreview(extraWantedList = null) {
 }
 
 // ===== render products =====
+const SHOP_IMG_SIZES = "(max-width: 640px) 50vw, 240px";
+
 function renderProducts() {
   if (!productListEl) return;
 
@@ -164,9 +179,17 @@ function renderProducts() {
     card.className = "shop-card";
 
     const imgSrc = p.image || "/static/img/default_recipe.jpg";
+    // image_set: thumb/card/full WebP + JPEG (null nếu server chưa tạo variant)
+    const set = p.image_set;
+    const picture = set
+      ? `<picture>
+          <source type="image/webp" srcset="${set.srcset.webp}" sizes="${SHOP_IMG_SIZES}">
+          <img src="${set.card.jpeg}" srcset="${set.srcset.jpeg}" sizes="${SHOP_IMG_SIZES}" alt="${p.name}" loading="lazy">
+        </picture>`
+      : `<img src="${imgSrc}" alt="${p.name}">`;
 
     card.innerHTML = `
-      <img src="${imgSrc}" alt="${p.name}">
+      ${picture}
       <div class="shop-card-body">
         <div class="shop-card-header">
           <h3 class="shop-card-title">${p.name}</h3>
@@ -302,7 +325,14 @@ function setupCheckout() {
         })),
       };
 
-      const data = await createOrderOnServer(payload);
+      // cùng giỏ hàng => cùng key (bấm lại sau lỗi mạng không tạo đơn thứ 2)
+      const cartSig = JSON.stringify(payload.items);
+      if (state.checkoutSig !== cartSig) {
+        state.checkoutSig = cartSig;
+        state.checkoutKey = newIdempotencyKey();
+      }
+
+      const data = await createOrderOnServer(payload, state.checkoutKey);
 
       // show xác nhận trong textarea
       if (outputEl) {
@@ -315,6 +345,7 @@ function setupCheckout() {
 
       // clear cart
       state.cart = [];
+      state.checkoutSig = null;
       renderCart();
 
       alert(`✅ Mua thành công! Mã đơn: #${data.order_id}`);
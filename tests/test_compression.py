@@ -0,0 +1,32 @@
+from app.compression import etag_matches
+
+
+def test_etag_matches_weak_comparison():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+    assert not etag_matches("", '"abc"')
+
+
+def test_compressed_response_gets_weak_etag(client):
+    r = client.get("/static/css/style.css", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"].startswith('W/"')
+
+    again = client.get(
+        "/static/css/style.css",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]},
+    )
+    assert again.status_code == 304
+
+
+def test_range_response_is_not_compressed(client):
+    r = client.get(
+        "/static/css/style.css", headers={"Range": "bytes=0-99", "Accept-Encoding": "gzip"}
+    )
+    assert r.status_code == 206
+    assert "content-encoding" not in r.headers
+    assert len(r.content) == 100
@@ -0,0 +1,125 @@
+import socket
+from datetime import timedelta
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+from app import email_outbox, models  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.email_outbox import SMTPSender, drain_outbox, enqueue_email, utcnow  # noqa: E402
+
+
+class RecordingHandler:
+    """SMTP giả: nhận mọi email, từ chối người nhận bắt đầu bằng 'bad'."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bad"):
+            return "550 không có hộp thư này"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return "250 Message accepted"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    handler = RecordingHandler()
+    port = free_port()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setenv("MAIL_HOST", "127.0.0.1")
+    monkeypatch.setenv("MAIL_PORT", str(port))
+    monkeypatch.setenv("MAIL_SSL", "0")
+    monkeypatch.setenv("MAIL_USER", "")
+    monkeypatch.setenv("MAIL_PASS", "")
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.query(models.EmailOutbox).delete()
+    session.commit()
+    yield session
+    session.query(models.EmailOutbox).delete()
+    session.commit()
+    session.close()
+
+
+def test_drain_sends_batch_over_one_connection(smtp, db):
+    for i in range(3):
+        enqueue_email(db, mail_to=f"user{i}@example.com", subject=f"Mail {i}", body="xin chào")
+    db.commit()
+
+    sender = SMTPSender()
+    try:
+        assert drain_outbox(db, sender) == 3
+    finally:
+        sender.close()
+
+    assert len(smtp.messages) == 3
+    assert smtp.connections == 1
+    assert {o.status for o in db.query(models.EmailOutbox)} == {"sent"}
+
+
+def test_rejected_message_is_retried_then_dead(smtp, db, monkeypatch):
+    monkeypatch.setattr(email_outbox, "MAX_ATTEMPTS", 2)
+    bad = enqueue_email(db, mail_to="bad@example.com", subject="Lỗi", body="x")
+    enqueue_email(db, mail_to="ok@example.com", subject="Được", body="x")
+    db.commit()
+
+    sender = SMTPSender()
+    try:
+        assert drain_outbox(db, sender) == 2
+        db.refresh(bad)
+        assert bad.status == "pending"
+        assert bad.attempts == 1
+        assert bad.next_attempt_at is not None and bad.last_error
+
+        # đến hạn thử lại
+        bad.next_attempt_at = utcnow() - timedelta(seconds=1)
+        db.commit()
+        assert drain_outbox(db, sender) == 1
+        db.refresh(bad)
+        assert bad.status == "dead"
+        assert bad.attempts == 2
+    finally:
+        sender.close()
+
+    # email bị từ chối không làm rớt kết nối + gửi lại
+    assert smtp.connections == 1
+    assert len(smtp.messages) == 1
+
+
+def test_unreachable_smtp_leaves_batch_untouched(db, monkeypatch):
+    monkeypatch.setenv("MAIL_HOST", "127.0.0.1")
+    monkeypatch.setenv("MAIL_PORT", str(free_port()))
+    monkeypatch.setenv("MAIL_SSL", "0")
+    for i in range(3):
+        enqueue_email(db, mail_to=f"user{i}@example.com", subject="x", body="x")
+    db.commit()
+
+    sender = SMTPSender()
+    assert drain_outbox(db, sender) == 0
+    assert not sender.available()
+    assert [(o.status, o.attempts) for o in db.query(models.EmailOutbox)] == [("pending", 0)] * 3
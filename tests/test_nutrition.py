@@ -0,0 +1,46 @@
+import pytest
+
+from app.default_ingredients import default_ingredients
+from app.nutrition import MAX_NGRAM, NutrientTable, fold_text
+
+
+def test_every_folded_alias_maps_to_one_row():
+    owners: dict[tuple[str, ...], set[str]] = {}
+    for row in default_ingredients:
+        for name in [row["name"], *(row["aliases"] or "").split(",")]:
+            key = tuple(fold_text(name).split())
+            if key and len(key) <= MAX_NGRAM:
+                owners.setdefault(key, set()).add(row["name"])
+
+    collisions = {k: v for k, v in owners.items() if len(v) > 1}
+    assert collisions == {}
+    # strict: bảng seed dựng được mà không có key nhập nhằng
+    assert NutrientTable(default_ingredients, strict=True).ambiguous == {}
+
+
+def test_colliding_aliases_are_not_shadowed():
+    rows = [
+        {**default_ingredients[0], "name": "Thịt bò", "aliases": "bò"},
+        {**default_ingredients[0], "name": "Bơ", "aliases": ""},
+    ]
+    with pytest.raises(ValueError):
+        NutrientTable(rows, strict=True)
+
+    table = NutrientTable(rows)
+    assert ("bo",) in table.ambiguous
+    assert table.match(["bo"]) is None
+    assert table.match(["thit", "bo"]) == 0
+
+
+@pytest.mark.parametrize("line", ["50g bơ lạt", "2 muỗng canh bơ động vật", "bơ thực vật 20g", "butter 10g"])
+def test_butter_is_not_beef(line):
+    table = NutrientTable(default_ingredients, strict=True)
+    parsed, unmatched = table.parse(line)
+    assert not unmatched
+    assert table.names[parsed[0].index] == "Bơ lạt"
+
+
+def test_beef_still_matches():
+    table = NutrientTable(default_ingredients, strict=True)
+    parsed, _ = table.parse("200g bò")
+    assert table.names[parsed[0].index] == "Thịt bò"
@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize("encoding", ["gzip, br", "identity"])
+def test_page_conditional_request_gets_304(client, encoding):
+    r = client.get("/", headers={"Accept-Encoding": encoding})
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+
+    again = client.get("/", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+def test_page_changed_etag_gets_full_body(client):
+    r = client.get("/", headers={"If-None-Match": 'W/"khong-khop"'})
+    assert r.status_code == 200
+    assert r.content
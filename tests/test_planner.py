@@ -0,0 +1,16 @@
+def test_catalog_conditional_request_after_compressed_response(client):
+    r = client.get("/planner/catalog", headers={"Accept-Encoding": "gzip, br"})
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+
+    again = client.get(
+        "/planner/catalog", headers={"Accept-Encoding": "gzip, br", "If-None-Match": etag}
+    )
+    assert again.status_code == 304
+
+
+def test_catalog_if_none_match_list(client):
+    etag = client.get("/planner/catalog").headers["etag"]
+    r = client.get("/planner/catalog", headers={"If-None-Match": f'"cu", W/{etag}'})
+    assert r.status_code == 304
+    assert client.get("/planner/catalog", headers={"If-None-Match": "*"}).status_code == 304
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app import response_cache
+from app.response_cache import LocalVersions, ResponseCache, VersionBackend
+
+
+def test_backend_must_implement_interface():
+    class HalfBackend(VersionBackend):
+        async def version(self, tag):
+            return 0
+
+    with pytest.raises(TypeError):
+        HalfBackend()
+
+
+def test_backend_is_not_called_under_cache_lock():
+    cache = ResponseCache(ttl=60, max_entries=10)
+
+    class CheckingBackend(LocalVersions):
+        async def version(self, tag):
+            assert not cache._lock.locked()
+            await asyncio.sleep(0)  # backend qua mạng: nhường event loop
+            return await super().version(tag)
+
+    cache.versions = CheckingBackend()
+
+    async def run():
+        versions = await cache.tag_versions(("recipes",))
+        assert cache.get("k", versions) is None
+        cache.set("k", b"[]", versions)
+        assert cache.get("k", await cache.tag_versions(("recipes",))) == b"[]"
+
+        await cache.invalidate("recipes")
+        assert cache.get("k", await cache.tag_versions(("recipes",))) is None
+
+    asyncio.run(run())
+
+
+def test_cached_route_hit_and_invalidate(client):
+    assert client.get("/api/recipes/").headers["x-cache"] == "MISS"
+    assert client.get("/api/recipes/").headers["x-cache"] == "HIT"
+
+    asyncio.run(response_cache.invalidate(response_cache.RECIPES))
+    assert client.get("/api/recipes/").headers["x-cache"] == "MISS"
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from app.tokens import RevocationList, revocations, utcnow
+
+
+def login(client, email="token@example.com"):
+    client.post(
+        "/api/auth/register", json={"email": email, "full_name": "Token", "password": "secret123"}
+    )
+    r = client.post("/api/auth/login", json={"email": email, "password": "secret123"})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_refresh_token_is_single_use_across_workers(client):
+    tokens = login(client)
+    assert client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+
+    # worker khác chưa đồng bộ: bộ nhớ trống, DB vẫn chặn
+    revocations._revoked.clear()
+    r = client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert r.status_code == 401
+    assert "access_token" not in r.json()
+
+
+def test_only_access_tokens_are_kept_in_memory(client):
+    tokens = login(client, "token2@example.com")
+    before = len(revocations)
+    client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert len(revocations) == before
+
+    headers = {"Authorization": "Bearer " + tokens["access_token"]}
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert len(revocations) == before + 1
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_revocation_list_drops_expired_entries():
+    rl = RevocationList()
+    rl.add("old", utcnow() - timedelta(seconds=1))
+    rl.add("live", utcnow() + timedelta(minutes=5))
+    assert not rl.is_revoked("old")
+    assert rl.is_revoked("live")
+    assert len(rl) == 1